@@ -0,0 +1,214 @@
+'''
+This module has the background monitor
+that keeps the collectors status updated.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* sqlalchemy
+'''
+
+# Import system libs
+import time
+import asyncio
+from collections import deque
+
+# Import custom libs
+from . import schemas
+from . import probe
+from ..env import Enviroment as Env
+from ..database import SessionManager
+from ..crud import Tcollector
+
+#######################################
+
+class CollectorMonitor:
+    ''' Probe every collector on its own `update_period` and keep the last
+    status plus a bounded history of each port in memory, so status
+    requests never wait for the network.\n
+    '''
+
+    def __init__(self):
+        self._status = {}
+        '''`_status` (dict): Last `schemas.connectionStatus` by collector id.'''
+        self._history = {}
+        '''`_history` (dict): A `deque` of `schemas.probeSample` by collector id and port.'''
+        self._tasks = {}
+        '''`_tasks` (dict): The probing task by collector id.'''
+        self._configs = {}
+        '''`_configs` (dict): The `schemas.collector` each task is probing.'''
+        self._listeners = set()
+        '''`_listeners` (set): Queues that receive every status change.'''
+        self._loop = None
+        self._sync_event = None
+        self._supervisor = None
+        self._limit = None
+
+    # --------------------
+    async def start(self):
+        ''' Start monitoring the collectors in database. Collectors
+        created or removed later are picked up by `request_sync` or
+        every `CONF_MONITOR_SYNC_PERIOD` seconds.\n
+        '''
+        if (Env.MONITOR_ENABLED!='1' or self._supervisor is not None):
+            return
+        self._loop = asyncio.get_running_loop()
+        self._sync_event = asyncio.Event()
+        self._limit = asyncio.Semaphore(int(Env.PROBE_CONCURRENCY))
+        self._supervisor = asyncio.ensure_future(self._supervise())
+    # --------------------
+
+    # --------------------
+    async def stop(self):
+        ''' Stop all probing tasks.\n
+        '''
+        tasks = list(self._tasks.values())
+        if (self._supervisor is not None):
+            tasks.append(self._supervisor)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = {}
+        self._configs = {}
+        self._supervisor = None
+    # --------------------
+
+    # --------------------
+    def request_sync(self):
+        ''' Ask the monitor to reload the collectors list now. It is safe
+        to call from the route threads.\n
+        '''
+        if (self._loop is not None):
+            self._loop.call_soon_threadsafe(self._sync_event.set)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def _load_collectors():
+        ''' Read the collectors from database.\n
+        return `cols` (dict): `schemas.collector` by id.\n
+        '''
+        with SessionManager() as db:
+            cols = { c.id:Tcollector._parse_collector(c) for c in Tcollector.get_all(db) }
+        return(cols)
+    # --------------------
+
+    # --------------------
+    async def _supervise(self):
+        ''' Keep one probing task for each collector in database.\n
+        '''
+        while True:
+            # Clear before loading, so a sync requested meanwhile is not lost
+            self._sync_event.clear()
+            try:
+                cols = await asyncio.to_thread(self._load_collectors)
+            except Exception as exc:
+                print(f'Collector monitor: {exc}')
+                cols = None
+
+            if (cols is not None):
+                # Forget removed collectors
+                for id in set(self._tasks.keys()) - set(cols.keys()):
+                    self._tasks.pop(id).cancel()
+                    self._configs.pop(id, None)
+                    self._status.pop(id, None)
+                    self._history.pop(id, None)
+                # Start new collectors and restart the modified or stopped ones
+                for id, col in cols.items():
+                    if (self._configs.get(id)==col and not self._tasks[id].done()):
+                        continue
+                    if id in self._tasks:
+                        self._tasks[id].cancel()
+                    self._configs[id] = col
+                    self._tasks[id] = asyncio.ensure_future(self._watch(col))
+
+            try:
+                await asyncio.wait_for(self._sync_event.wait(), float(Env.MONITOR_SYNC_PERIOD))
+            except asyncio.TimeoutError:
+                pass
+    # --------------------
+
+    # --------------------
+    async def _watch(self, col:schemas.collector):
+        ''' Probe a collector forever on its `update_period`.\n
+        `col` (schemas.collector): The collector to probe.\n
+        '''
+        period = col.update_period if col.update_period else float(Env.DEFAULTS['Collector']['update_period'])
+        history_size = int(Env.MONITOR_HISTORY_SIZE)
+        while True:
+            try:
+                _, stat = await probe.probe_collector(col, self._limit)
+                now = time.time()
+
+                # Save the samples
+                history = self._history.setdefault(col.id, {})
+                for name, (ok, rtt) in stat.items():
+                    history.setdefault(name, deque(maxlen=history_size)).append(
+                        schemas.probeSample(time=now, accessible=ok, rtt=rtt))
+
+                # Update the snapshot and tell the listeners on changes
+                status = schemas.connectionStatus(**{ name:ok for name,(ok,_) in stat.items() })
+                if (self._status.get(col.id)!=status):
+                    self._status[col.id] = status
+                    self._notify(schemas.collectorStatus(**col.__dict__, status=status))
+            except Exception as exc:
+                # A failed probe must not stop watching the collector
+                print(f'Collector monitor: {col.name}: {exc}')
+
+            await asyncio.sleep(period)
+    # --------------------
+
+    # --------------------
+    def _notify(self, status:schemas.collectorStatus):
+        ''' Send a status change to every listener. Slow listeners lose
+        the changes that do not fit in their queue.\n
+        `status` (schemas.collectorStatus): The new status.\n
+        '''
+        for queue in self._listeners:
+            if not queue.full():
+                queue.put_nowait(status)
+    # --------------------
+
+    # --------------------
+    def subscribe(self):
+        ''' Register a listener for status changes.\n
+        return `queue` (asyncio.Queue): Queue that receives the
+        `schemas.collectorStatus` changes.\n
+        '''
+        queue = asyncio.Queue(maxsize=100)
+        self._listeners.add(queue)
+        return(queue)
+    # --------------------
+
+    # --------------------
+    def unsubscribe(self, queue:asyncio.Queue):
+        ''' Remove a listener.\n
+        `queue` (asyncio.Queue): The queue returned by `subscribe`.\n
+        '''
+        self._listeners.discard(queue)
+    # --------------------
+
+    # --------------------
+    def get_status(self, id:int):
+        ''' Get the last known status of a collector.\n
+        `id` (int): The Collector ID.\n
+        return `status` (schemas.connectionStatus): The status, `None` if the
+        collector was not probed yet.\n
+        '''
+        return(self._status.get(id))
+    # --------------------
+
+    # --------------------
+    def get_history(self, id:int):
+        ''' Get the probe history of a collector.\n
+        `id` (int): The Collector ID.\n
+        return `history` (schemas.collectorHistory): Samples of each port,
+        oldest first. `None` if the collector was not probed yet.\n
+        '''
+        if id not in self._history:
+            return(None)
+        samples = { name:list(self._history[id].get(name,[])) for name in probe.PROBED_PORTS }
+        history = schemas.collectorHistory(id=id, **samples)
+        return(history)
+    # --------------------
+
+monitor = CollectorMonitor()
+'''`monitor` (CollectorMonitor): The application collectors monitor.'''
@@ -0,0 +1,104 @@
+'''
+This module has the asynchronous engine
+that probes the collector ports.\n
+Copyright (c) 2017 Aimirim STI.\n
+'''
+
+# Import system libs
+import time
+import asyncio
+from typing import List
+
+# Import custom libs
+from ..env import Enviroment as Env
+
+#######################################
+
+PROBED_PORTS = ['ssh', 'opcua', 'health']
+'''`PROBED_PORTS` (list): Collector ports checked on status requests.'''
+
+# --------------------
+async def probe_port(ip:str, port:int, timeout:float):
+    ''' Test the connection to an IP/Port pair.\n
+    `ip` (str): The IP address.\n
+    `port` (int): The port number.\n
+    `timeout` (float): Seconds to wait for the connection.\n
+    return `accessible` (bool): A flag to indicate that the IP/Port pair exist.\n
+    return `rtt` (float): Milliseconds to connect, `None` if not accessible.\n
+    '''
+    start = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+    except (OSError, ValueError, asyncio.TimeoutError):
+        return(False, None)
+
+    rtt = (time.perf_counter()-start)*1000
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+
+    return(True, rtt)
+# --------------------
+
+# --------------------
+async def probe_collector(col, limit:asyncio.Semaphore):
+    ''' Probe all ports of a collector at the same time.\n
+    `col` (models.Collector): The collector to probe.\n
+    `limit` (asyncio.Semaphore): Bound on simultaneous connections.\n
+    return `col` (models.Collector): The probed collector.\n
+    return `stat` (dict): `(accessible, rtt)` of each port in `PROBED_PORTS`.\n
+    '''
+    timeout = col.timeout if col.timeout else float(Env.PROBE_TIMEOUT)
+
+    async def _bounded(port:int):
+        async with limit:
+            return(await probe_port(col.ip, port, timeout))
+
+    results = await asyncio.gather(*[
+        _bounded(getattr(col,f'{name}_port')) for name in PROBED_PORTS ])
+    stat = dict(zip(PROBED_PORTS, results))
+
+    return(col, stat)
+# --------------------
+
+# --------------------
+async def iter_probe_collectors(col_list:List, concurrency:int=None):
+    ''' Probe all collectors concurrently and yield each one as soon
+    as all its ports are checked.\n
+    `col_list` (list): The `models.Collector` items to probe.\n
+    `concurrency` (int): Maximum simultaneous connections. Defaults to
+    `Enviroment.PROBE_CONCURRENCY`.\n
+    return `col`, `stat`: Generator of `probe_collector` results, in
+    completion order.\n
+    '''
+    if concurrency is None:
+        concurrency = int(Env.PROBE_CONCURRENCY)
+    limit = asyncio.Semaphore(concurrency)
+
+    tasks = [ asyncio.ensure_future(probe_collector(col, limit)) for col in col_list ]
+    try:
+        for done in asyncio.as_completed(tasks):
+            yield(await done)
+    finally:
+        # The client may stop listening before the end
+        for task in tasks:
+            task.cancel()
+# --------------------
+
+# --------------------
+async def probe_collectors(col_list:List, concurrency:int=None):
+    ''' Probe all collectors concurrently.\n
+    `col_list` (list): The `models.Collector` items to probe.\n
+    `concurrency` (int): Maximum simultaneous connections.\n
+    return `results` (list): `(col, stat)` pairs in the same order as `col_list`.\n
+    '''
+    if concurrency is None:
+        concurrency = int(Env.PROBE_CONCURRENCY)
+    limit = asyncio.Semaphore(concurrency)
+
+    results = await asyncio.gather(*[ probe_collector(col, limit) for col in col_list ])
+
+    return(results)
+# --------------------
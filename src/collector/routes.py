@@ -8,14 +8,18 @@ Copyright (c) 2017 Aimirim STI.\n
 '''
 
 # Import system libs
-from fastapi import Depends, HTTPException
+import asyncio
+from fastapi import Depends, HTTPException, Request, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
-from paramiko import SSHClient, AutoAddPolicy
-import socket
 
 # Import custom libs
 from . import schemas
-from ..database import get_db
+from . import probe
+from .monitor import monitor
+from ..database import get_db, SessionManager
+from ..ssh_pool import pool
+from ..env import Enviroment as Env
+from ..streaming import wants_ndjson, ndjson_response, ndjson_async_response
 from ..crud import Tcollector
 from ..user_auth import routes as usr_routes
 from ..fboot_gen import routes as fb_routes
@@ -56,11 +60,11 @@ def get_collector(id:int, db:Session=Depends(get_db), usr:str=Depends(usr_routes
 # --------------------
 
 # --------------------
-def update_collector(id:int,collector:schemas.collectorCreate, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+def update_collector(id:int,collector:schemas.collectorUpdate, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Update the collector entry in the database.\n
     `id` (int): The Collector ID.\n
-    `collector` (schemas.collector): The Collector to update. If the password is leff blank it
-    will not update.\n
+    `collector` (schemas.collectorUpdate): The Collector to update. If the password is leff blank it
+    will not update, nor `auto_deploy` if it is not given.\n
     return `parsed_col` (JSONResponse): Updated data of `schemas.collector` automatically parsed into
     a HTTP_OK response.\n
     '''
@@ -73,12 +77,11 @@ def update_collector(id:int,collector:schemas.collectorCreate, db:Session=Depend
     if (val_col is None or old_col is None):
         m_name = f"Collector data"
         raise HTTPException(status_code=404, detail=f"Error updating {m_name}.")
+    monitor.request_sync()
 
     prom_conf = fb_routes._update_prometheus_conf(parsed_old,val_col)
-    try:
-        fb_routes._write_prometheus_file(val_col,prom_conf)
-    except:
-        raise HTTPException(status_code=404, detail=f"Error updating Collector from Prometheus file.")
+    # The write is left to the background, so the request does not wait for it
+    fb_routes._write_prometheus_file(val_col,prom_conf,wait=False)
 
     return(parsed_col)
 # --------------------
@@ -97,21 +100,25 @@ def new_collector(collector:schemas.collectorCreate, db:Session=Depends(get_db),
         raise HTTPException(status_code=404, detail=f"Error Creating {m_name}.")
 
     parsed_col = Tcollector._parse_collector(val_col)
+    monitor.request_sync()
     prom_conf = fb_routes._update_prometheus_conf(parsed_col,val_col)
-    try:
-        fb_routes._write_prometheus_file(val_col,prom_conf)
-    except:
-        raise HTTPException(status_code=404, detail=f"Error updating Collector from Prometheus file.")
+    # The write is left to the background, so the request does not wait for it
+    fb_routes._write_prometheus_file(val_col,prom_conf,wait=False)
 
     return(parsed_col)
 # --------------------
 
 # --------------------
-def get_all_collectors(db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+def get_all_collectors(request:Request, stream:bool=False, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Get all collector entries in database.\n
+    `stream` (bool): Send the entries as NDJSON while they are read from database.
+    The same happens if the `Accept` header asks for `application/x-ndjson`.\n
     return `parsed_col` (JSONResponse): The saved `schemas.collector` automatically parsed into
     a HTTP_OK response.\n
     '''
+    if wants_ndjson(request, stream):
+        return(ndjson_response(Tcollector.iter_all(db, int(Env.STREAM_CHUNK_SIZE))))
+
     col_list = Tcollector.get_all(db)
     
     if (col_list is None):
@@ -137,98 +144,162 @@ def check_collector_access(id:int, db:Session=Depends(get_db), usr:str=Depends(u
         m_name = f"Collector"
         raise HTTPException(status_code=404, detail=f"Error searching for {m_name}.")
 
-    ssh = SSHClient()
-    ssh.set_missing_host_key_policy(AutoAddPolicy())
-    
+    # Authenticate again, the password may have changed on the gateway
     try:
-        ssh.connect(col.ip, username=col.ssh_user, password=col.ssh_pass, port=col.ssh_port, timeout=2)
+        timeout = col.timeout if col.timeout else float(Env.PROBE_TIMEOUT)
+        pool.invalidate(col.ip, col.ssh_port, col.ssh_user)
+        client = pool.acquire(col.ip, col.ssh_port, col.ssh_user, col.ssh_pass, timeout)
+        pool.release(col.ip, col.ssh_port, col.ssh_user, client)
         col = Tcollector.validate(db,id,valid=True)
     except Exception as ex:
         col = Tcollector.validate(db,id,valid=False)
         print(str(ex))
-    
-    ssh.close()
 
     parsed_col = Tcollector._parse_collector(col)
     return(parsed_col)
 # --------------------
 
 # --------------------
-def _test_ip_port(ip:str,port:int):
-    ''' Test the connection to an IP/Port pair.\n
-    `ip` (str): The IP address\n
-    `port` (port): The port number\n
-    return `acessible` (bool): A flag to indicate that the IP/Port pair exist.\n
+def _parse_status(col, stat:dict):
+    ''' Join the collector information with its probe results.\n
+    `col` (models.Collector): Collector table item.\n
+    `stat` (dict): Probe results from `probe.probe_collector`.\n
+    return `status` (schemas.collectorStatus): Parsed collector status.\n
     '''
-    accessible = False
-    try:
-        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        test_socket.settimeout(0.2)
-        test_socket.connect((ip, port))
-        test_socket.close()
-        accessible = True
-    except Exception as ex:
-        print(str(ex))
-        accessible = False
-    
-    return(accessible)
+    status = schemas.collectorStatus(
+        **Tcollector._parse_collector(col).__dict__,
+        status=schemas.connectionStatus(**{ name:ok for name,(ok,_) in stat.items() })
+    )
+    return(status)
 # --------------------
 
 # --------------------
-def check_collector_status(id:int, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
-    ''' Get overall connection status of the collector.\n
+async def check_collector_status(id:int, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Get overall connection status of the collector. The answer comes from
+    the background monitor, the ports are only probed here if the collector
+    was not checked yet.\n
     `id` (int): The Collector ID.\n
     return `status` (JSONResponse): The saved `schemas.collectorStatus` automatically parsed into
     a HTTP_OK response.\n
     '''
-    col = Tcollector.get_by_id(db,id)
+    # Query in a thread, a locked database must not stall the event loop
+    col = await asyncio.to_thread(Tcollector.get_by_id, db, id)
     if (col is None):
         m_name = f"Collector"
         raise HTTPException(status_code=404, detail=f"Error searching for {m_name}.")
 
-    stat = {
-        'ssh': _test_ip_port(col.ip,col.ssh_port),
-        'opcua': _test_ip_port(col.ip,col.opcua_port),
-        'health': _test_ip_port(col.ip,col.health_port),
-    }
+    last = monitor.get_status(id)
+    if (last is not None):
+        status = schemas.collectorStatus(**Tcollector._parse_collector(col).__dict__, status=last)
+        return(status)
 
-    status = schemas.collectorStatus(
-        **Tcollector._parse_collector(col).__dict__,
-        status=schemas.connectionStatus(**stat)
-    )
+    results = await probe.probe_collectors([col])
+
+    status = _parse_status(*results[0])
     return(status)
 # --------------------
 
 # --------------------
-def check_collectors_status(db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
-    ''' Get overall connection status of the collector.\n
-    `id` (int): The Collector ID.\n
+async def check_collectors_status(request:Request, stream:bool=False, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Get overall connection status of all collectors. The answer comes from
+    the background monitor, only the collectors not checked yet are probed here,
+    concurrently and bounded by `CONF_PROBE_CONCURRENCY`.\n
+    `stream` (bool): Send each collector status as NDJSON as soon as it is
+    known. The same happens if the `Accept` header asks for `application/x-ndjson`.\n
     return `status` (JSONResponse): The saved `schemas.collectorStatus` automatically parsed into
     a HTTP_OK response.\n
     '''
-    col_list = Tcollector.get_all(db)
+    # Query in a thread, a locked database must not stall the event loop
+    col_list = await asyncio.to_thread(Tcollector.get_all, db)
     if (col_list is None):
         m_name = f"Collectors"
         raise HTTPException(status_code=404, detail=f"Error searching for {m_name}.")
 
-    status = []
+    known = {}
+    missing = []
     for col in col_list:
-        stat = {
-            'ssh': _test_ip_port(col.ip,col.ssh_port),
-            'opcua': _test_ip_port(col.ip,col.opcua_port),
-            'health': _test_ip_port(col.ip,col.health_port),
-        }
-
-        status.append( 
-            schemas.collectorStatus(
-                **Tcollector._parse_collector(col).__dict__,
-                status=schemas.connectionStatus(**stat)
-            )
-        )
-    
+        last = monitor.get_status(col.id)
+        if (last is None):
+            missing.append(col)
+        else:
+            known[col.id] = schemas.collectorStatus(**Tcollector._parse_collector(col).__dict__, status=last)
+
+    if wants_ndjson(request, stream):
+        async def _statuses():
+            for status in known.values():
+                yield status
+            async for col, stat in probe.iter_probe_collectors(missing):
+                yield _parse_status(col, stat)
+        return(ndjson_async_response(_statuses()))
+
+    results = await probe.probe_collectors(missing)
+    known.update({ col.id:_parse_status(col, stat) for col, stat in results })
+
+    status = [ known[col.id] for col in col_list ]
     return(status)
 # --------------------
 
+# --------------------
+def get_collector_history(id:int, usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Get the recent probe samples of the collector ports, kept by the
+    background monitor. The amount of samples is set by `CONF_MONITOR_HISTORY_SIZE`.\n
+    `id` (int): The Collector ID.\n
+    return `history` (JSONResponse): The `schemas.collectorHistory` automatically parsed into
+    a HTTP_OK response.\n
+    '''
+    history = monitor.get_history(id)
+
+    if (history is None):
+        m_name = f"Collector history"
+        raise HTTPException(status_code=404, detail=f"Error searching for {m_name}.")
+
+    return(history)
+# --------------------
+
+# --------------------
+def _get_monitored_statuses():
+    ''' Read the collectors and join them with the monitor snapshot.\n
+    return `status` (list): The `schemas.collectorStatus` of the collectors
+    already probed.\n
+    '''
+    with SessionManager() as db:
+        col_list = Tcollector.get_all(db)
+        status = []
+        for col in col_list:
+            last = monitor.get_status(col.id)
+            if (last is not None):
+                status.append(schemas.collectorStatus(**Tcollector._parse_collector(col).__dict__, status=last))
+    return(status)
+# --------------------
+
+# --------------------
+async def collectors_status_ws(websocket:WebSocket, token:str):
+    ''' Push the collectors status through a websocket. The current status of
+    every collector is sent on connection, then each change as it is detected
+    by the background monitor.\n
+    `token` (str): The access token, passed as a query parameter since
+    browsers can not set headers on websockets.\n
+    '''
+    try:
+        usr_routes._check_valid_token(token)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    queue = monitor.subscribe()
+    try:
+        for status in await asyncio.to_thread(_get_monitored_statuses):
+            await websocket.send_text(status.json())
+        while True:
+            status = await queue.get()
+            await websocket.send_text(status.json())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        monitor.unsubscribe(queue)
+# --------------------
+
 # --------------------
 def del_collector(id:int, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Delete the specified entry from database.\n
@@ -244,12 +315,11 @@ def del_collector(id:int, db:Session=Depends(get_db), usr:str=Depends(usr_routes
     ans = Tcollector.delete_collector(db,id)
 
     if (ans[id]):
+        monitor.request_sync()
         parsed_col = Tcollector._parse_collector(col)
         prom_conf = fb_routes._delete_prometheus_conf(col)
-        try:
-            fb_routes._write_prometheus_file(col,prom_conf)
-        except:
-            raise HTTPException(status_code=404, detail=f"Error removing Collector from Prometheus file.")
+        # The write is left to the background, so the request does not wait for it
+        fb_routes._write_prometheus_file(col,prom_conf,wait=False)
 
     return(ans)
 # --------------------
\ No newline at end of file
@@ -8,6 +8,7 @@ Copyright (c) 2017 Aimirim STI.\n
 
 # Import system libs
 from pydantic import BaseModel
+from typing import List, Union
 
 #######################################
 
@@ -21,10 +22,14 @@ class collectorInfo(BaseModel):
     health_port: int
     update_period: int
     timeout: int
+    auto_deploy: bool = False
 
 class collectorCreate(collectorInfo):
     ssh_pass: str
 
+class collectorUpdate(collectorCreate):
+    auto_deploy: Union[bool,None] = None
+
 class collector(collectorInfo):
     id: int
     valid: bool
@@ -35,4 +40,15 @@ class connectionStatus(BaseModel):
     health: bool
 
 class collectorStatus(collector):
-    status: connectionStatus
\ No newline at end of file
+    status: connectionStatus
+
+class probeSample(BaseModel):
+    time: float
+    accessible: bool
+    rtt: Union[float,None]
+
+class collectorHistory(BaseModel):
+    id: int
+    ssh: List[probeSample]
+    opcua: List[probeSample]
+    health: List[probeSample]
@@ -3,4 +3,5 @@
 from .user import Tuser
 from .datasource import Tdatasource
 from .datapoint import Tdatapoint
-from .collector import Tcollector
\ No newline at end of file
+from .collector import Tcollector
+from .export import Texport
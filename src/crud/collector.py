@@ -12,8 +12,10 @@ from sqlalchemy.orm import Session
 # Import custom libs
 from ..env import Enviroment as Env
 from .. import models
+from ..ssh_pool import pool
 from ..collector import schemas
 from .datasource import Tdatasource
+from .export import Texport
 
 
 #######################################
@@ -67,7 +69,8 @@ class Tcollector:
             health_port=col_data.health_port,
             valid=False,
             update_period=col_data.update_period,
-            timeout=col_data.timeout)
+            timeout=col_data.timeout,
+            auto_deploy=col_data.auto_deploy)
         db.add(db_col)
         db.commit()
         db.refresh(db_col)
@@ -95,7 +98,8 @@ class Tcollector:
             health_port=db_col.health_port,
             valid=db_col.valid,
             update_period=db_col.update_period,
-            timeout=db_col.timeout
+            timeout=db_col.timeout,
+            auto_deploy=db_col.auto_deploy
         )
 
         return(col)
@@ -113,6 +117,20 @@ class Tcollector:
         return(qry.all())
     # --------------------
 
+    # --------------------
+    @staticmethod
+    def iter_all(db:Session, chunk_size:int):
+        ''' Iterate over all collectors loading them from database in chunks.\n
+        `db` (Session): Database session instance.\n
+        `chunk_size` (int): Number of rows fetched at once.\n
+        return `col` (schemas.collector): Generator of parsed collectors.\n
+        '''
+        qry = db.query(models.Collector)
+
+        for db_col in qry.yield_per(chunk_size):
+            yield Tcollector._parse_collector(db_col)
+    # --------------------
+
     # --------------------
     @staticmethod
     def get_by_id(db:Session, id:int):
@@ -129,14 +147,16 @@ class Tcollector:
 
     # --------------------
     @staticmethod
-    def update(db: Session, id:int ,col_data: schemas.collectorCreate):
+    def update(db: Session, id:int ,col_data: schemas.collectorUpdate):
         ''' Update the entry in the database.\n
         `db` (Session): Database session instance.\n
-        `col_data` (schemas.collector): Existing collector information. A blank
-        password string means no update on that field.\n
+        `col_data` (schemas.collectorUpdate): Existing collector information. A blank
+        password string or a missing `auto_deploy` means no update on that field.\n
         return `db_col` (models.Collector): The updated collector data.\n
         '''
         db_col = Tcollector.get_by_id(db,id)
+        # The pooled connection may use the old address or password
+        pool.invalidate(db_col.ip, db_col.ssh_port, db_col.ssh_user)
 
         db_col.ip=col_data.ip
         db_col.name=col_data.name
@@ -150,6 +170,8 @@ class Tcollector:
         db_col.valid=False
         db_col.update_period=col_data.update_period
         db_col.timeout=col_data.timeout
+        if (col_data.auto_deploy is not None):
+            db_col.auto_deploy=col_data.auto_deploy
 
         db.commit()
 
@@ -188,9 +210,13 @@ class Tcollector:
         if (col is not None):
             for ds in col.datasources:
                 Tdatasource.delete_datasource(db,ds.name)
+            digests = Texport.delete_exports(db,id)
+            pool.invalidate(col.ip, col.ssh_port, col.ssh_user)
             # Remove from database
             db.delete(col)
             db.commit()
+            # Files shared with other collectors are kept
+            Texport.remove_unused_files(db,digests)
             
             col_answer[id] = True
         else:
@@ -7,13 +7,17 @@ Copyright (c) 2017 Aimirim STI.\n
 '''
 
 # Import system libs
-from sqlalchemy.orm import Session
+import json
+from typing import List, Union
+from sqlalchemy import bindparam, column, func, select, text
+from sqlalchemy.orm import Session, joinedload
 
 # Import custom libs
 from .. import models
 from ..env import Enviroment as Env
 from ..plc_datapoint import schemas
 from ..plc_datasource import schemas as ds_schemas
+from .pagination import keyset_page
 
 
 #######################################
@@ -21,6 +25,21 @@ from ..plc_datasource import schemas as ds_schemas
 class Tdatapoint:
     ''' Class with CRUD methods to access the DataPoint table.\n
     '''
+
+    SORT_COLUMNS = {
+        'name':       models.DataPoint.name,
+        'datasource': models.DataPoint.datasource_name,
+        'active':     models.DataPoint.active,
+        'pending':    models.DataPoint.pending,
+    }
+    '''`SORT_COLUMNS` (dict): Columns available to sort paginated results.'''
+
+    SEARCH_WEIGHTS = (10.0, 2.0, 5.0, 5.0, 3.0)
+    '''`SEARCH_WEIGHTS` (tuple): Rank weight of name, description, address,
+    tag_name and datasource_name on text search.'''
+
+    BULK_CHUNK_SIZE = 500
+    '''`BULK_CHUNK_SIZE` (int): Number of names searched at once on bulk operations.'''
     
     # --------------------
     @staticmethod
@@ -71,6 +90,19 @@ class Tdatapoint:
         return(ds)
     # --------------------
 
+    # --------------------
+    @staticmethod
+    def _query_datapoints(db:Session):
+        ''' Declare a query on the DataPoint table that loads the protocol
+        specific implementation and it's datasource in a single statement.\n
+        `db` (Session): Database access session.\n
+        return `dbq` (Query): The declared query.\n
+        '''
+        dbq = db.query(models.DataPoint).options(joinedload(models.DataPoint.datasource))
+
+        return(dbq)
+    # --------------------
+
     # --------------------
     @staticmethod
     def _get_datapoint_implementation(db:Session, p_name:str, dp_name:str):
@@ -160,6 +192,158 @@ class Tdatapoint:
         return(dp_created)
     # --------------------
 
+    # --------------------
+    @staticmethod
+    def _access_columns(data_cls):
+        ''' List the implementation specific columns of a datapoint class.\n
+        `data_cls` (models.DataPoint): The datapoint implementation class.\n
+        return `cols` (set): The access column names.\n
+        '''
+        base = set(models.DataPoint.__mapper__.column_attrs.keys())
+        cols = set(data_cls.__mapper__.column_attrs.keys()) - base
+
+        return(cols)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def _find_existing_names(db:Session, table_cls, names:List[str]):
+        ''' Search which names are already in a table.\n
+        `db` (Session): Database access session.\n
+        `table_cls` (models.Base): Table class with a `name` primary key.\n
+        `names` (list): Names to search for.\n
+        return `found` (set): The names that exist.\n
+        '''
+        found = set()
+        for i in range(0, len(names), Tdatapoint.BULK_CHUNK_SIZE):
+            chunk = names[i:i+Tdatapoint.BULK_CHUNK_SIZE]
+            qry = db.query(table_cls.name).filter(table_cls.name.in_(chunk))
+            found.update( row.name for row in qry.all() )
+
+        return(found)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def _find_datasource_protocols(db:Session, ds_names:List[str]):
+        ''' Search the protocol of many datasources.\n
+        `db` (Session): Database access session.\n
+        `ds_names` (list): DataSource names to search for.\n
+        return `found` (dict): The protocol name of each existing datasource,
+        `None` if it has no protocol.\n
+        '''
+        found = {}
+        for i in range(0, len(ds_names), Tdatapoint.BULK_CHUNK_SIZE):
+            chunk = ds_names[i:i+Tdatapoint.BULK_CHUNK_SIZE]
+            qry = db.query(models.DataSource.name, models.Protocol.name.label('protocol'))
+            qry = qry.outerjoin(models.Protocol, models.Protocol.datasource_name == models.DataSource.name)
+            found.update( (row.name, row.protocol) for row in qry.filter(models.DataSource.name.in_(chunk)).all() )
+
+        return(found)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def bulk_create_datapoints(db:Session, dp_list:List[schemas.dataPointInfo], upsert:bool=False):
+        ''' Create many datapoints, of any implemented protocol, in a single
+        transaction. Items that fail validation are reported and skipped: the
+        access must have every field of its protocol and match the protocol of
+        the datasource.\n
+        `db` (Session): Database access session.\n
+        `dp_list` (list): Informations on the datapoints to create.\n
+        `upsert` (bool): Update the datapoints that already exist instead of
+        reporting them as errors.\n
+        return `dp_answer` (list): A `schemas.bulkItemStatus` for each item, in
+        the same order.\n
+        '''
+        dp_answer = []
+        to_insert = {}
+        to_update = {}
+
+        # Search every referenced name at once
+        names = list({dp.name for dp in dp_list})
+        ds_names = list({dp.datasource_name for dp in dp_list})
+        existing = Tdatapoint._find_existing_names(db, models.DataPoint, names)
+        ds_found = Tdatapoint._find_datasource_protocols(db, ds_names)
+        access_cols = set().union(*( Tdatapoint._access_columns(data_cls)
+            for data_cls in models.IMPLEMENTED_DATA.values() ))
+
+        seen = set()
+        for new_dp in dp_list:
+            status = schemas.bulkItemStatus(name=new_dp.name, status='error')
+            dp_answer.append(status)
+
+            if (new_dp.name in seen):
+                status.detail = 'Duplicated name in request.'
+                continue
+            seen.add(new_dp.name)
+
+            if new_dp.access.name not in models.IMPLEMENTED_DATA.keys():
+                status.detail = f"Protocol '{new_dp.access.name}' not implemented."
+                continue
+            data_cls = models.IMPLEMENTED_DATA[new_dp.access.name]
+
+            unknown = set(new_dp.access.data.keys()) - Tdatapoint._access_columns(data_cls)
+            if unknown:
+                status.detail = f"Unknown access fields {sorted(unknown)}."
+                continue
+
+            missing = Tdatapoint._access_columns(data_cls) - set(new_dp.access.data.keys())
+            if missing:
+                status.detail = f"Missing access fields {sorted(missing)}."
+                continue
+
+            if new_dp.datasource_name not in ds_found:
+                status.detail = f"Data Source '{new_dp.datasource_name}' not found."
+                continue
+
+            if ds_found[new_dp.datasource_name]!=new_dp.access.name:
+                status.detail = (f"Protocol '{new_dp.access.name}' does not match Data Source "
+                    f"'{new_dp.datasource_name}' protocol '{ds_found[new_dp.datasource_name]}'.")
+                continue
+
+            row = dict(
+                name=new_dp.name,
+                description=new_dp.description,
+                num_type=new_dp.num_type,
+                access=new_dp.access.name,
+                datasource_name=new_dp.datasource_name,
+                **new_dp.access.data)
+
+            if new_dp.name in existing:
+                if not upsert:
+                    status.detail = 'Already exists.'
+                    continue
+                # Updated datapoints need a new confirmation and lose the
+                # access fields of their previous protocol
+                row['pending'] = True
+                row.update({ col:None for col in access_cols if col not in row })
+                to_update.setdefault(data_cls,[]).append(row)
+                status.status = 'updated'
+            else:
+                to_insert.setdefault(data_cls,[]).append(row)
+                status.status = 'created'
+
+        # Batched executes inside a single transaction
+        try:
+            for data_cls, rows in to_insert.items():
+                db.bulk_insert_mappings(data_cls, rows)
+            # The table is shared by every protocol, so the update is made on
+            # it directly to also clear the columns of the other protocols
+            table = models.DataPoint.__table__
+            for data_cls, rows in to_update.items():
+                cols = [ col for col in rows[0] if col!='name' ]
+                stmt = table.update().where(table.c.name == bindparam('_name'))
+                stmt = stmt.values({ col:bindparam(col) for col in cols })
+                db.execute(stmt, [ dict({ col:row[col] for col in cols }, _name=row['name']) for row in rows ])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        return(dp_answer)
+    # --------------------
+
     # --------------------
     def update_datapoint(db: Session, dp_update: schemas.dataPointInfo):
         ''' Search for a datapoints and update it's informations.\n
@@ -208,17 +392,32 @@ class Tdatapoint:
         '''
         dp_answer = []
         # Declare the query
-        dbq = db.query(models.DataPoint)
+        dbq = Tdatapoint._query_datapoints(db)
 
         # Get Datapoint list
         for dp in dbq.all():
-            dp = Tdatapoint._get_datapoint_implementation(db,dp.access,dp.name)
             # Parse data
             dp_answer.append( Tdatapoint._parse_datapoint(dp) )
         
         return (dp_answer)
     # --------------------
 
+    # --------------------
+    @staticmethod
+    def iter_datapoints(db:Session, chunk_size:int):
+        ''' Iterate over all datapoints loading them from database in chunks.\n
+        `db` (Session): Database access session.\n
+        `chunk_size` (int): Number of rows fetched at once.\n
+        return `dp` (schemas.dataPoint): Generator of datapoints in database.\n
+        '''
+        # Declare the query
+        dbq = Tdatapoint._query_datapoints(db)
+
+        for dp in dbq.yield_per(chunk_size):
+            # Parse data
+            yield Tdatapoint._parse_datapoint(dp)
+    # --------------------
+
     # --------------------
     @staticmethod
     def get_datapoints_by_range(db:Session, ini:int, end:int):
@@ -230,17 +429,102 @@ class Tdatapoint:
         '''
         dp_answer = []
         # Declare the query
-        dbq = db.query(models.DataPoint)
+        dbq = Tdatapoint._query_datapoints(db)
 
         # Get Datapoint list
-        for dp in dbq.offset(ini-1).limit(end).all():
-            dp = Tdatapoint._get_datapoint_implementation(db,dp.access,dp.name)
+        for dp in dbq.offset(ini-1).limit(end-ini+1).all():
             # Parse data
             dp_answer.append( Tdatapoint._parse_datapoint(dp) )
 
         return (dp_answer)
     # --------------------
 
+    # --------------------
+    @staticmethod
+    def get_datapoints_page(db:Session, after:Union[str,None], limit:int, sort:str='name', desc:bool=False):
+        ''' Get a page of datapoints using keyset pagination.\n
+        `db` (Session): Database access session.\n
+        `after` (str): Cursor returned with the previous page, `None` for the first page.\n
+        `limit` (int): Maximum number of datapoints in the page.\n
+        `sort` (str): One of the `SORT_COLUMNS` keys.\n
+        `desc` (bool): Sort in descending order.\n
+        return `dp_answer` (list): List of datapoints in this page.\n
+        return `next_cursor` (str): Cursor for the next page, `None` on the last page.\n
+        '''
+        # Declare the query
+        dbq = Tdatapoint._query_datapoints(db)
+
+        # Get Datapoint list
+        rows, next_cursor = keyset_page(dbq, Tdatapoint.SORT_COLUMNS[sort],
+            models.DataPoint.name, after, limit, desc)
+        # Parse data
+        dp_answer = [ Tdatapoint._parse_datapoint(dp) for dp in rows ]
+
+        return (dp_answer, next_cursor)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def count_datapoints(db:Session):
+        ''' Count all datapoints.\n
+        `db` (Session): Database access session.\n
+        return `total` (int): Number of datapoints in database.\n
+        '''
+        total = db.query(func.count(models.DataPoint.name)).scalar()
+
+        return (total)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def _search_expression(words:str):
+        ''' Translate the user text into a FTS5 query where every word is
+        matched as a prefix. Quoting the words keeps FTS5 operators and
+        punctuation (`.`, `[`, `:`) from being interpreted.\n
+        `words` (str): Text typed by the user.\n
+        return `expr` (str): The FTS5 match expression.\n
+        '''
+        terms = [ '"'+w.replace('"','""')+'"*' for w in words.split() ]
+        expr = ' '.join(terms)
+
+        return(expr)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def search_datapoints(db:Session, words:str, limit:int, offset:int=0):
+        ''' Search datapoints by name, description, address, tag name and
+        datasource name. Results are sorted by relevance.\n
+        `db` (Session): Database access session.\n
+        `words` (str): Text to search. Every word is matched as a prefix.\n
+        `limit` (int): Maximum number of results.\n
+        `offset` (int): Number of results to skip.\n
+        return `dp_answer` (list): List of datapoints found.\n
+        '''
+        dp_answer = []
+        expr = Tdatapoint._search_expression(words)
+        if (expr==''):
+            return(dp_answer)
+
+        # Rank names using the search index
+        weights = ', '.join( str(w) for w in Tdatapoint.SEARCH_WEIGHTS )
+        stmt = text(f"""SELECT datapoints.name FROM datapoints_fts
+            JOIN datapoints ON datapoints.rowid = datapoints_fts.rowid
+            WHERE datapoints_fts MATCH :expr
+            ORDER BY bm25(datapoints_fts, {weights})
+            LIMIT :limit OFFSET :offset""")
+        names = [ row.name for row in db.execute(stmt, {'expr':expr, 'limit':limit, 'offset':offset}) ]
+
+        # Load the found datapoints keeping the rank order
+        dbq = Tdatapoint._query_datapoints(db)
+        found = { dp.name:dp for dp in dbq.filter(models.DataPoint.name.in_(names)).all() }
+        for name in names:
+            if name in found:
+                dp_answer.append( Tdatapoint._parse_datapoint(found[name]) )
+
+        return (dp_answer)
+    # --------------------
+
     # --------------------
     @staticmethod
     def get_datapoints_pending(db:Session):
@@ -250,11 +534,10 @@ class Tdatapoint:
         '''
         dp_answer = []
         # Declare the query
-        dbq = db.query(models.DataPoint)
+        dbq = Tdatapoint._query_datapoints(db)
 
         # Get Datapoint list
         for dp in dbq.filter(models.DataPoint.pending==True).all():
-            dp = Tdatapoint._get_datapoint_implementation(db,dp.access,dp.name)
             # Parse data
             dp_answer.append( Tdatapoint._parse_datapoint(dp) )
 
@@ -270,11 +553,10 @@ class Tdatapoint:
         '''
         dp_answer = []
         # Declare the query
-        dbq = db.query(models.DataPoint)
+        dbq = Tdatapoint._query_datapoints(db)
 
         # Get Datapoint list
         for dp in dbq.filter(models.DataPoint.active==True).all():
-            dp = Tdatapoint._get_datapoint_implementation(db,dp.access,dp.name)
             # Parse data
             dp_answer.append( Tdatapoint._parse_datapoint(dp) )
         
@@ -336,7 +618,135 @@ class Tdatapoint:
             
         return (dp_answer)
     # --------------------
+
+    # --------------------
+    @staticmethod
+    def _name_in(names:List[str]):
+        ''' Build a condition matching a list of datapoint names. The list is
+        bound as a single JSON parameter, so it has no size limit.\n
+        `names` (list): The datapoint names.\n
+        return (ColumnElement): The `name IN (...)` condition.\n
+        '''
+        values = select(column('value')).select_from(func.json_each(json.dumps(list(names))))
+        return(models.DataPoint.name.in_(values))
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def confirm_upload_datapoints(db:Session, names:List[str], upload:bool):
+        ''' Set the upload flag of many datapoints with a single UPDATE
+        statement and commit.\n
+        `db` (Session): Database access session.\n
+        `names` (list): DataPoint names.\n
+        `upload` (bool): New value of upload.\n
+        return `dp_answer` (dict): Number of `affected` datapoints.\n
+        '''
+        dbq = db.query(models.DataPoint).filter(Tdatapoint._name_in(names))
+
+        num = dbq.update({'upload': upload}, synchronize_session=False)
+        db.commit()
+
+        return({'affected': num})
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def set_uploaded_datapoints(db:Session, col_id:int, names:List[str]):
+        ''' Mark the listed datapoints of a collector as uploaded and all its
+        other datapoints as not uploaded, with a single UPDATE statement.\n
+        `db` (Session): Database access session.\n
+        `col_id` (int): Collector id.\n
+        `names` (list): The DataPoint names on the collector.\n
+        return `dp_answer` (dict): Number of `affected` datapoints.\n
+        '''
+        dbq = Tdatapoint._filter_datapoints(db.query(models.DataPoint),
+            schemas.dataPointFilter(collector_id=col_id))
+
+        num = dbq.update({'upload': Tdatapoint._name_in(names)}, synchronize_session=False)
+        db.commit()
+
+        return({'affected': num})
+    # --------------------
     
+    # --------------------
+    @staticmethod
+    def _filter_datapoints(dbq, flt:schemas.dataPointFilter):
+        ''' Restrict a DataPoint query to the items that match a filter.\n
+        `dbq` (Query): The declared query.\n
+        `flt` (schemas.dataPointFilter): The filter. Unset fields are ignored
+        but at least one of them is needed.\n
+        return `dbq` (Query): The filtered query.\n
+        '''
+        if all( value is None for value in flt.dict().values() ):
+            raise ValueError('At least one filter criteria is needed.')
+
+        if (flt.names is not None):
+            dbq = dbq.filter(Tdatapoint._name_in(flt.names))
+        if (flt.datasource_name is not None):
+            dbq = dbq.filter(models.DataPoint.datasource_name == flt.datasource_name)
+        if (flt.collector_id is not None):
+            ds_names = select(models.DataSource.name).where(models.DataSource.collector_id == flt.collector_id)
+            dbq = dbq.filter(models.DataPoint.datasource_name.in_(ds_names))
+        if (flt.prefix is not None):
+            dbq = dbq.filter(models.DataPoint.name.startswith(flt.prefix, autoescape=True))
+        if (flt.active is not None):
+            dbq = dbq.filter(models.DataPoint.active == flt.active)
+        if (flt.pending is not None):
+            dbq = dbq.filter(models.DataPoint.pending == flt.pending)
+
+        return(dbq)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def get_collector_ids(db:Session, flt:schemas.dataPointFilter):
+        ''' Find the collectors of the datapoints matching a filter.\n
+        `db` (Session): Database access session.\n
+        `flt` (schemas.dataPointFilter): The datapoints.\n
+        return `ids` (list): The collector ids.\n
+        '''
+        dbq = db.query(models.DataSource.collector_id).join(models.DataSource.datapoints)
+        dbq = Tdatapoint._filter_datapoints(dbq, flt)
+        ids = [ row.collector_id for row in dbq.distinct().all() if row.collector_id is not None ]
+
+        return(ids)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def bulk_set_datapoints(db:Session, flt:schemas.dataPointFilter, values:dict):
+        ''' Change the state of every datapoint matching a filter with
+        a single UPDATE statement.\n
+        `db` (Session): Database access session.\n
+        `flt` (schemas.dataPointFilter): Datapoints to change.\n
+        `values` (dict): Column names and their new values, i.e.
+        `{'active': False}`.\n
+        return `dp_answer` (dict): Number of `affected` datapoints.\n
+        '''
+        dbq = Tdatapoint._filter_datapoints(db.query(models.DataPoint), flt)
+
+        num = dbq.update(values, synchronize_session=False)
+        db.commit()
+
+        return({'affected': num})
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def bulk_delete_datapoints(db:Session, flt:schemas.dataPointFilter):
+        ''' Delete every datapoint matching a filter with a single DELETE statement.\n
+        `db` (Session): Database access session.\n
+        `flt` (schemas.dataPointFilter): Datapoints to delete.\n
+        return `dp_answer` (dict): Number of `affected` datapoints.\n
+        '''
+        dbq = Tdatapoint._filter_datapoints(db.query(models.DataPoint), flt)
+
+        num = dbq.delete(synchronize_session=False)
+        db.commit()
+
+        return({'affected': num})
+    # --------------------
+
     # --------------------
     @staticmethod
     def get_datapoint_by_name(db:Session, dp_name:str):
@@ -7,14 +7,16 @@ Copyright (c) 2017 Aimirim STI.\n
 '''
 
 # Import system libs
-from typing import List
-from sqlalchemy.orm import Session
+from typing import List, Union
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload, contains_eager
 
 # Import custom libs
 from .. import models
 from ..env import Enviroment as Env
 from ..plc_datasource import schemas
 from .datapoint import Tdatapoint
+from .pagination import keyset_page
 
 
 #######################################
@@ -22,6 +24,14 @@ from .datapoint import Tdatapoint
 class Tdatasource:
     ''' Class with CRUD methods to access the DataSource table.\n
     '''
+
+    SORT_COLUMNS = {
+        'name':      models.DataSource.name,
+        'collector': models.DataSource.collector_id,
+        'active':    models.DataSource.active,
+        'pending':   models.DataSource.pending,
+    }
+    '''`SORT_COLUMNS` (dict): Columns available to sort paginated results.'''
     
     # --------------------
     @staticmethod
@@ -125,16 +135,27 @@ class Tdatasource:
         `db_ds` (models.DataSource): Datasource table item.\n
         return `sb_prot` (models.Protocol): Corresponding protocol table item.\n
         '''
-        # Get protocol infos
-        p_id = db_ds.protocol.id
-        p_name = db_ds.protocol.name
-        # Search protocol Table
-        prot_cls = models.IMPLEMENTED_PROT[p_name]
-        prot = db.query(prot_cls).filter(prot_cls.id == p_id).first()
+        # The protocol relationship is loaded in the specific implementation
+        prot = db_ds.protocol
 
         return(prot)
     # --------------------
 
+    # --------------------
+    @staticmethod
+    def _query_datasources(db:Session):
+        ''' Declare a query on the DataSource table that loads the specific
+        protocol implementation and the collector in a single statement.\n
+        `db` (Session): Database access session.\n
+        return `dbq` (Query): The declared query.\n
+        '''
+        dbq = db.query(models.DataSource).options(
+            joinedload(models.DataSource.protocol),
+            joinedload(models.DataSource.collector))
+
+        return(dbq)
+    # --------------------
+
     # --------------------
     @staticmethod
     def create_protocol(db: Session, new_prot:schemas.protocolInfo, ds:models.DataSource):
@@ -265,7 +286,7 @@ class Tdatasource:
         '''
         ds_answer = []
         # Declare the query
-        dbq = db.query(models.DataSource)
+        dbq = Tdatasource._query_datasources(db)
 
         # Get Datasource list
         for ds in dbq.all():
@@ -276,6 +297,23 @@ class Tdatasource:
         return (ds_answer)
     # --------------------
 
+    # --------------------
+    @staticmethod
+    def iter_datasources(db:Session, chunk_size:int):
+        ''' Iterate over all datasources loading them from database in chunks.\n
+        `db` (Session): Database access session.\n
+        `chunk_size` (int): Number of rows fetched at once.\n
+        return `ds` (schemas.dataSource): Generator of datasources in database.\n
+        '''
+        # Declare the query
+        dbq = Tdatasource._query_datasources(db)
+
+        for ds in dbq.yield_per(chunk_size):
+            prot = Tdatasource._find_datasource_prototol(db,ds)
+            # Parse data
+            yield Tdatasource._parse_datasource(ds, Tdatasource._parse_protocol(prot))
+    # --------------------
+
     # --------------------
     @staticmethod
     def get_datasources_by_range(db:Session, ini:int, end:int):
@@ -287,10 +325,10 @@ class Tdatasource:
         '''
         ds_answer = []
         # Declare the query
-        dbq = db.query(models.DataSource)
+        dbq = Tdatasource._query_datasources(db)
 
         # Get Datasource list
-        for ds in dbq.offset(ini-1).limit(end).all():
+        for ds in dbq.offset(ini-1).limit(end-ini+1).all():
             prot = Tdatasource._find_datasource_prototol(db,ds)
             # Parse data
             ds_answer.append( Tdatasource._parse_datasource(ds, Tdatasource._parse_protocol(prot)) )
@@ -298,6 +336,45 @@ class Tdatasource:
         return (ds_answer)
     # --------------------
 
+    # --------------------
+    @staticmethod
+    def get_datasources_page(db:Session, after:Union[str,None], limit:int, sort:str='name', desc:bool=False):
+        ''' Get a page of datasources using keyset pagination.\n
+        `db` (Session): Database access session.\n
+        `after` (str): Cursor returned with the previous page, `None` for the first page.\n
+        `limit` (int): Maximum number of datasources in the page.\n
+        `sort` (str): One of the `SORT_COLUMNS` keys.\n
+        `desc` (bool): Sort in descending order.\n
+        return `ds_answer` (list): List of datasources in this page.\n
+        return `next_cursor` (str): Cursor for the next page, `None` on the last page.\n
+        '''
+        ds_answer = []
+        # Declare the query
+        dbq = Tdatasource._query_datasources(db)
+
+        # Get Datasource list
+        rows, next_cursor = keyset_page(dbq, Tdatasource.SORT_COLUMNS[sort],
+            models.DataSource.name, after, limit, desc)
+        for ds in rows:
+            prot = Tdatasource._find_datasource_prototol(db,ds)
+            # Parse data
+            ds_answer.append( Tdatasource._parse_datasource(ds, Tdatasource._parse_protocol(prot)) )
+
+        return (ds_answer, next_cursor)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def count_datasources(db:Session):
+        ''' Count all datasources.\n
+        `db` (Session): Database access session.\n
+        return `total` (int): Number of datasources in database.\n
+        '''
+        total = db.query(func.count(models.DataSource.name)).scalar()
+
+        return (total)
+    # --------------------
+
     # --------------------
     @staticmethod
     def get_datasources_pending(db:Session):
@@ -307,7 +384,7 @@ class Tdatasource:
         '''
         ds_answer = []
         # Declare the query
-        dbq = db.query(models.DataSource)
+        dbq = Tdatasource._query_datasources(db)
 
         # Get Datasource list
         for ds in dbq.filter(models.DataSource.pending==True).all():
@@ -327,7 +404,7 @@ class Tdatasource:
         '''
         ds_answer = []
         # Declare the query
-        dbq = db.query(models.DataSource)
+        dbq = Tdatasource._query_datasources(db)
 
         # Get Datasource list
         for ds in dbq.filter(models.DataSource.active==True).all():
@@ -365,6 +442,65 @@ class Tdatasource:
         return (ds_answer)
     # --------------------
     
+    # --------------------
+    @staticmethod
+    def _filter_datasources(dbq, flt:schemas.dataSourceFilter):
+        ''' Restrict a DataSource query to the items that match a filter.\n
+        `dbq` (Query): The declared query.\n
+        `flt` (schemas.dataSourceFilter): The filter. Unset fields are ignored
+        but at least one of them is needed.\n
+        return `dbq` (Query): The filtered query.\n
+        '''
+        if all( value is None for value in flt.dict().values() ):
+            raise ValueError('At least one filter criteria is needed.')
+
+        if (flt.names is not None):
+            dbq = dbq.filter(models.DataSource.name.in_(flt.names))
+        if (flt.collector_id is not None):
+            dbq = dbq.filter(models.DataSource.collector_id == flt.collector_id)
+        if (flt.prefix is not None):
+            dbq = dbq.filter(models.DataSource.name.startswith(flt.prefix, autoescape=True))
+        if (flt.active is not None):
+            dbq = dbq.filter(models.DataSource.active == flt.active)
+        if (flt.pending is not None):
+            dbq = dbq.filter(models.DataSource.pending == flt.pending)
+
+        return(dbq)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def get_collector_ids(db:Session, flt:schemas.dataSourceFilter):
+        ''' Find the collectors of the datasources matching a filter.\n
+        `db` (Session): Database access session.\n
+        `flt` (schemas.dataSourceFilter): The datasources.\n
+        return `ids` (list): The collector ids.\n
+        '''
+        dbq = Tdatasource._filter_datasources(db.query(models.DataSource.collector_id), flt)
+        ids = [ row.collector_id for row in dbq.distinct().all() if row.collector_id is not None ]
+
+        return(ids)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def bulk_set_datasources(db:Session, flt:schemas.dataSourceFilter, values:dict):
+        ''' Change the state of every datasource matching a filter with
+        a single UPDATE statement.\n
+        `db` (Session): Database access session.\n
+        `flt` (schemas.dataSourceFilter): Datasources to change.\n
+        `values` (dict): Column names and their new values, i.e.
+        `{'active': False}`.\n
+        return `ds_answer` (dict): Number of `affected` datasources.\n
+        '''
+        dbq = Tdatasource._filter_datasources(db.query(models.DataSource), flt)
+
+        num = dbq.update(values, synchronize_session=False)
+        db.commit()
+
+        return({'affected': num})
+    # --------------------
+
     # --------------------
     @staticmethod
     def get_datasource_by_name(db:Session, ds_name:str):
@@ -377,7 +513,7 @@ class Tdatasource:
         ds_answer = None
 
         # Declare the query
-        dbq = db.query(models.DataSource)
+        dbq = Tdatasource._query_datasources(db)
 
         # Get specific Datasource
         ds = dbq.filter(models.DataSource.name == ds_name).first()
@@ -458,14 +594,46 @@ class Tdatasource:
         return `ds_answer` (list): List of datasources.\n
         '''
         ds_answer = []
+        # Declare the query
+        dbq = Tdatasource._query_datasources(db)
 
-        qry = db.query(models.Collector)
-        col = qry.filter(models.Collector.id == id).first()
-
-        for ds in col.datasources:
+        for ds in dbq.filter(models.DataSource.collector_id == id).all():
             prot = Tdatasource._find_datasource_prototol(db,ds)
             # Parse data
             ds_answer.append( Tdatasource._parse_datasource(ds, Tdatasource._parse_protocol(prot)) )
         
         return(ds_answer)
-    # --------------------
\ No newline at end of file
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def get_export_datapoints(db:Session, id:int):
+        ''' Get the active and confirmed datapoints of the active and confirmed
+        datasources of a collector, with their protocol and access specific
+        columns, in a single query.\n
+        `db` (Session): Database access session.\n
+        `id` (int): Collector id to search for.\n
+        return `export_list` (list): Pairs of `schemas.dataSource` and the list of
+        its `plc_datapoint.schemas.dataPoint`, sorted by name.\n
+        '''
+        dbq = db.query(models.DataPoint).join(models.DataPoint.datasource).options(
+            contains_eager(models.DataPoint.datasource).joinedload(models.DataSource.protocol),
+            contains_eager(models.DataPoint.datasource).joinedload(models.DataSource.collector))
+        dbq = dbq.filter(
+            models.DataSource.collector_id == id,
+            models.DataSource.active == True,
+            models.DataSource.pending == False,
+            models.DataPoint.active == True,
+            models.DataPoint.pending == False)
+        dbq = dbq.order_by(models.DataSource.name, models.DataPoint.name)
+
+        export_list = []
+        for dp in dbq.all():
+            # Rows come grouped by datasource
+            if (len(export_list)==0 or export_list[-1][0].name!=dp.datasource.name):
+                prot = Tdatasource._parse_protocol(dp.datasource.protocol)
+                export_list.append( (Tdatasource._parse_datasource(dp.datasource, prot), []) )
+            export_list[-1][1].append( Tdatapoint._parse_datapoint(dp) )
+
+        return(export_list)
+    # --------------------
@@ -0,0 +1,422 @@
+'''
+This module holds the functions to
+access the export tables\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* sqlalchemy
+'''
+
+# Import system libs
+import json
+from datetime import datetime
+from typing import List
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+# Import custom libs
+from .. import models
+from ..fboot_gen import schemas
+from ..fboot_gen.store import store
+
+
+#######################################
+
+BUNDLE_FILES = ['fboot', 'opcua', 'prometheus', 'datapoints']
+'''`BUNDLE_FILES` (list): The `models.ExportBundle` columns with a file of the artifact store.'''
+
+class Texport:
+    ''' Class with CRUD methods to access the export tables.\n
+    '''
+
+    # --------------------
+    @staticmethod
+    def get_artifact(db:Session, col_id:int, name:str):
+        ''' Get the last export record of a collector file.\n
+        `db` (Session): Database session instance.\n
+        `col_id` (int): Collector id.\n
+        `name` (str): Artifact name.\n
+        return `db_art` (models.ExportArtifact): The record, `None` if never exported.\n
+        '''
+        qry = db.query(models.ExportArtifact)
+        db_art = qry.filter(models.ExportArtifact.collector_id == col_id,
+            models.ExportArtifact.name == name).first()
+
+        return(db_art)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def save_artifact(db:Session, col_id:int, name:str, path:str, digest:str):
+        ''' Record the content uploaded for a collector file.\n
+        `db` (Session): Database session instance.\n
+        `col_id` (int): Collector id.\n
+        `name` (str): Artifact name.\n
+        `path` (str): The file location.\n
+        `digest` (str): SHA-256 of the uploaded content.\n
+        return `db_art` (models.ExportArtifact): The saved record.\n
+        '''
+        db_art = db.merge(models.ExportArtifact(collector_id=col_id, name=name,
+            path=path, digest=digest, exported_at=datetime.utcnow()))
+        db.commit()
+
+        return(db_art)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def delete_exports(db:Session, col_id:int):
+        ''' Forget the exported files, the export jobs and the deployed versions
+        of a collector. The changes are committed by the caller, that must then
+        call `remove_unused_files` with the returned digests.\n
+        `db` (Session): Database session instance.\n
+        `col_id` (int): Collector id.\n
+        return `digests` (set): SHA-256 of the stored files referenced by the
+        deleted records.\n
+        '''
+        digests = set()
+        qry = db.query(models.ExportArtifact.digest)
+        digests.update( digest for digest, in qry.filter(models.ExportArtifact.collector_id == col_id) )
+        qry = db.query(*[ getattr(models.ExportBundle,name) for name in BUNDLE_FILES ])
+        for row in qry.filter(models.ExportBundle.collector_id == col_id):
+            digests.update(row)
+        digests.discard(None)
+
+        qry = db.query(models.ExportArtifact)
+        qry.filter(models.ExportArtifact.collector_id == col_id).delete(synchronize_session=False)
+        qry = db.query(models.ExportJob)
+        qry.filter(models.ExportJob.collector_id == col_id).delete(synchronize_session=False)
+        qry = db.query(models.ExportDeployment)
+        qry.filter(models.ExportDeployment.collector_id == col_id).delete(synchronize_session=False)
+        qry = db.query(models.ExportBundle)
+        qry.filter(models.ExportBundle.collector_id == col_id).delete(synchronize_session=False)
+
+        return(digests)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def remove_unused_files(db:Session, digests:set):
+        ''' Delete from the artifact store the files that no export record
+        references anymore, as the ones of deleted collectors.\n
+        `db` (Session): Database session instance.\n
+        `digests` (set): SHA-256 of the files to check.\n
+        return `removed` (set): SHA-256 of the deleted files.\n
+        '''
+        digests = set(digests)
+        used = set()
+        for name in BUNDLE_FILES:
+            column = getattr(models.ExportBundle,name)
+            used.update( digest for digest, in db.query(column).filter(column.in_(digests)) )
+        qry = db.query(models.ExportArtifact.digest)
+        used.update( digest for digest, in qry.filter(models.ExportArtifact.digest.in_(digests)) )
+
+        removed = digests - used
+        for digest in removed:
+            store.remove(digest)
+
+        return(removed)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def _parse_bundle(db_bundle:models.ExportBundle):
+        ''' Parse DB export bundle table item to corresponding schema.\n
+        `db_bundle` (models.ExportBundle): Export bundle table item.\n
+        return `bundle` (schemas.exportBundle): Parsed bundle information.\n
+        '''
+        bundle = schemas.exportBundle(
+            id=db_bundle.id,
+            collector_id=db_bundle.collector_id,
+            fboot=db_bundle.fboot,
+            opcua=db_bundle.opcua,
+            prometheus=db_bundle.prometheus,
+            datapoints=db_bundle.datapoints,
+            source=db_bundle.source,
+            created_at=db_bundle.created_at
+        )
+
+        return(bundle)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def save_bundle(db:Session, col_id:int, digests:dict):
+        ''' Register the files built for a collector. If they are the same
+        of its last bundle, that one is returned instead.\n
+        `db` (Session): Database session instance.\n
+        `col_id` (int): Collector id.\n
+        `digests` (dict): SHA-256 of the `fboot`, `opcua`, `prometheus`
+        and `datapoints` files in the artifact store, and of their `source`.\n
+        return `db_bundle` (models.ExportBundle): The bundle.\n
+        '''
+        db_bundle = Texport.get_last_bundle(db, col_id)
+        if (db_bundle is not None and all(
+                getattr(db_bundle,name)==digest for name, digest in digests.items())):
+            return(db_bundle)
+
+        db_bundle = models.ExportBundle(collector_id=col_id, **digests)
+        db.add(db_bundle)
+        db.commit()
+        db.refresh(db_bundle)
+
+        return(db_bundle)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def get_bundle(db:Session, id:int):
+        ''' Query the database for a specific export bundle.\n
+        `db` (Session): Database session instance.\n
+        `id` (int): Bundle id to search for.\n
+        return `db_bundle` (models.ExportBundle): The bundle, `None` if it does not exist.\n
+        '''
+        qry = db.query(models.ExportBundle)
+        db_bundle = qry.filter(models.ExportBundle.id == id).first()
+
+        return(db_bundle)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def get_last_bundle(db:Session, col_id:int):
+        ''' Get the most recent bundle built for a collector.\n
+        `db` (Session): Database session instance.\n
+        `col_id` (int): Collector id.\n
+        return `db_bundle` (models.ExportBundle): The bundle, `None` if never built.\n
+        '''
+        qry = db.query(models.ExportBundle)
+        qry = qry.filter(models.ExportBundle.collector_id == col_id)
+        db_bundle = qry.order_by(models.ExportBundle.id.desc()).first()
+
+        return(db_bundle)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def get_bundles(db:Session, col_id:int):
+        ''' Get the bundles built for a collector.\n
+        `db` (Session): Database session instance.\n
+        `col_id` (int): Collector id.\n
+        return (list): The `models.ExportBundle` items, newest first.\n
+        '''
+        qry = db.query(models.ExportBundle)
+        qry = qry.filter(models.ExportBundle.collector_id == col_id)
+
+        return(qry.order_by(models.ExportBundle.id.desc()).all())
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def _parse_deployment(db_dep:models.ExportDeployment, db_bundle:models.ExportBundle, current:bool):
+        ''' Parse DB export deployment table item to corresponding schema.\n
+        `db_dep` (models.ExportDeployment): Export deployment table item.\n
+        `db_bundle` (models.ExportBundle): The deployed bundle.\n
+        `current` (bool): If it is the version running on the collector.\n
+        return `version` (schemas.exportVersion): Parsed version information.\n
+        '''
+        version = schemas.exportVersion(
+            id=db_dep.id,
+            collector_id=db_dep.collector_id,
+            bundle=Texport._parse_bundle(db_bundle),
+            rollback=db_dep.rollback,
+            current=current,
+            deployed_at=db_dep.deployed_at
+        )
+
+        return(version)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def save_deployment(db:Session, col_id:int, bundle_id:int, rollback:bool=False):
+        ''' Record a bundle deployed to a collector as its current version. If it
+        is already the current version, that record is returned instead.\n
+        `db` (Session): Database session instance.\n
+        `col_id` (int): Collector id.\n
+        `bundle_id` (int): The deployed bundle.\n
+        `rollback` (bool): If it was deployed again to undo newer versions.\n
+        return `db_dep` (models.ExportDeployment): The saved record.\n
+        '''
+        qry = db.query(models.ExportDeployment)
+        qry = qry.filter(models.ExportDeployment.collector_id == col_id)
+        db_dep = qry.order_by(models.ExportDeployment.id.desc()).first()
+        if (db_dep is not None and db_dep.bundle_id==bundle_id):
+            return(db_dep)
+
+        db_dep = models.ExportDeployment(collector_id=col_id, bundle_id=bundle_id,
+            rollback=rollback, deployed_at=datetime.utcnow())
+        db.add(db_dep)
+        db.commit()
+        db.refresh(db_dep)
+
+        return(db_dep)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def get_current_bundles(db:Session):
+        ''' Get the bundle of the current version of every deployed collector.\n
+        `db` (Session): Database session instance.\n
+        return `bundles` (dict): The `models.ExportBundle` of each collector id.\n
+        '''
+        last = db.query(func.max(models.ExportDeployment.id)).group_by(models.ExportDeployment.collector_id)
+        qry = db.query(models.ExportDeployment.collector_id, models.ExportBundle)
+        qry = qry.join(models.ExportBundle, models.ExportBundle.id == models.ExportDeployment.bundle_id)
+        qry = qry.filter(models.ExportDeployment.id.in_(last.scalar_subquery()))
+        bundles = { col_id:db_bundle for col_id, db_bundle in qry.all() }
+
+        return(bundles)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def get_deployment(db:Session, id:int):
+        ''' Query the database for a specific deployed version.\n
+        `db` (Session): Database session instance.\n
+        `id` (int): Deployment id to search for.\n
+        return `db_dep` (models.ExportDeployment): The record, `None` if it does not exist.\n
+        '''
+        qry = db.query(models.ExportDeployment)
+        db_dep = qry.filter(models.ExportDeployment.id == id).first()
+
+        return(db_dep)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def get_deployments(db:Session, col_id:int):
+        ''' Get the versions deployed to a collector with their bundles.\n
+        `db` (Session): Database session instance.\n
+        `col_id` (int): Collector id.\n
+        return (list): `(models.ExportDeployment, models.ExportBundle)` items,
+        newest first.\n
+        '''
+        qry = db.query(models.ExportDeployment, models.ExportBundle)
+        qry = qry.join(models.ExportBundle, models.ExportBundle.id == models.ExportDeployment.bundle_id)
+        qry = qry.filter(models.ExportDeployment.collector_id == col_id)
+
+        return(qry.order_by(models.ExportDeployment.id.desc()).all())
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def _parse_job(db_job:models.ExportJob):
+        ''' Parse DB export job table item to corresponding schema.\n
+        `db_job` (models.ExportJob): Export job table item.\n
+        return `job` (schemas.exportJob): Parsed job information.\n
+        '''
+        report = None
+        if (db_job.report is not None):
+            report = schemas.exportReport.parse_raw(db_job.report)
+
+        job = schemas.exportJob(
+            id=db_job.id,
+            collector_id=db_job.collector_id,
+            status=db_job.status,
+            stage=db_job.stage,
+            progress=db_job.progress,
+            total=db_job.total,
+            timings=json.loads(db_job.timings or '{}'),
+            report=report,
+            error=db_job.error,
+            mode=db_job.mode,
+            bundle_id=db_job.bundle_id,
+            created_at=db_job.created_at,
+            started_at=db_job.started_at,
+            finished_at=db_job.finished_at
+        )
+
+        return(job)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def create_job(db:Session, col_id:int, mode:str='export', bundle_id:int=None):
+        ''' Register a new export job waiting to run.\n
+        `db` (Session): Database session instance.\n
+        `col_id` (int): Collector id to export.\n
+        `mode` (str): `"export"` to build and deploy, `"build"`, `"deploy"`
+        or `"rollback"`.\n
+        `bundle_id` (int): Bundle to deploy, `None` for the last one built.\n
+        return `db_job` (models.ExportJob): The created job.\n
+        '''
+        db_job = models.ExportJob(collector_id=col_id, status='queued',
+            progress=0, total=0, timings='{}', mode=mode, bundle_id=bundle_id)
+        db.add(db_job)
+        db.commit()
+        db.refresh(db_job)
+
+        return(db_job)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def get_job(db:Session, id:int):
+        ''' Query the database for a specific export job.\n
+        `db` (Session): Database session instance.\n
+        `id` (int): Job id to search for.\n
+        return `db_job` (models.ExportJob): The job, `None` if it does not exist.\n
+        '''
+        qry = db.query(models.ExportJob)
+        db_job = qry.filter(models.ExportJob.id == id).first()
+
+        return(db_job)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def get_jobs(db:Session, ids:List[int]):
+        ''' Query the database for several export jobs.\n
+        `db` (Session): Database session instance.\n
+        `ids` (list): Job ids to search for.\n
+        return (list): The `models.ExportJob` found, sorted by id.\n
+        '''
+        qry = db.query(models.ExportJob)
+        qry = qry.filter(models.ExportJob.id.in_(ids))
+
+        return(qry.order_by(models.ExportJob.id).all())
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def get_queued_job(db:Session, col_id:int, mode:str='export', bundle_id:int=None):
+        ''' Get the export job of a collector that did not start yet.\n
+        `db` (Session): Database session instance.\n
+        `col_id` (int): Collector id.\n
+        `mode` (str): The job mode.\n
+        `bundle_id` (int): The bundle to deploy.\n
+        return `db_job` (models.ExportJob): The job, `None` if there is none.\n
+        '''
+        qry = db.query(models.ExportJob)
+        db_job = qry.filter(models.ExportJob.collector_id == col_id,
+            models.ExportJob.status == 'queued', models.ExportJob.mode == mode,
+            models.ExportJob.bundle_id == bundle_id).first()
+
+        return(db_job)
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def get_unfinished_jobs(db:Session):
+        ''' Get the export jobs that are waiting or were interrupted.\n
+        `db` (Session): Database session instance.\n
+        return (list): The `models.ExportJob` items, oldest first.\n
+        '''
+        qry = db.query(models.ExportJob)
+        qry = qry.filter(models.ExportJob.status.in_(['queued','running']))
+
+        return(qry.order_by(models.ExportJob.id).all())
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def update_job(db:Session, id:int, values:dict):
+        ''' Change the state of an export job.\n
+        `db` (Session): Database session instance.\n
+        `id` (int): Job id.\n
+        `values` (dict): New column values.\n
+        '''
+        qry = db.query(models.ExportJob)
+        qry.filter(models.ExportJob.id == id).update(values, synchronize_session=False)
+        db.commit()
+    # --------------------
@@ -0,0 +1,100 @@
+'''
+This module holds the helpers to
+paginate table queries by keyset\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* sqlalchemy
+'''
+
+# Import system libs
+import json
+import base64
+import binascii
+from typing import Union
+from sqlalchemy import and_, or_, literal
+from sqlalchemy.orm import Query
+
+#######################################
+
+# --------------------
+def encode_cursor(values:list):
+    ''' Pack the keyset values of a row into an opaque cursor.\n
+    `values` (list): The sort column and primary key values.\n
+    return `cursor` (str): URL safe cursor string.\n
+    '''
+    raw = json.dumps(values, separators=(',',':')).encode('utf-8')
+    cursor = base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    return(cursor)
+# --------------------
+
+# --------------------
+def decode_cursor(cursor:str):
+    ''' Unpack a cursor created by `encode_cursor`.\n
+    `cursor` (str): URL safe cursor string.\n
+    return `values` (list): The sort column and primary key values.\n
+    '''
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '='*(-len(cursor)%4))
+        values = json.loads(raw)
+    except (ValueError, binascii.Error):
+        raise ValueError(f"Invalid pagination cursor '{cursor}'.")
+
+    # Only plain values can be bound to the keyset comparison
+    if (not isinstance(values,list) or len(values)!=2 or
+            not all( value is None or isinstance(value,(str,int,float,bool)) for value in values )):
+        raise ValueError(f"Invalid pagination cursor '{cursor}'.")
+
+    return(values)
+# --------------------
+
+# --------------------
+def keyset_page(dbq:Query, sort_col, key_col, after:Union[str,None], limit:int, desc:bool=False):
+    ''' Get one page of a query ordered by a sort column and the primary key.
+    The position is given by the cursor of the last row of the previous page,
+    so the database seeks the index instead of skipping rows. Empty sort values
+    come first in ascending order and last in descending order.\n
+    `dbq` (Query): The declared query.\n
+    `sort_col` (Column): Table column to sort by.\n
+    `key_col` (Column): Table primary key, used to break ties.\n
+    `after` (str): Cursor of the last row already seen, `None` for the first page.\n
+    `limit` (int): Maximum number of rows in the page.\n
+    `desc` (bool): Sort in descending order.\n
+    return `rows` (list): The table items in this page.\n
+    return `next_cursor` (str): Cursor for the next page, `None` if this is the last one.\n
+    '''
+    if (after is not None):
+        sort_val, key_val = decode_cursor(after)
+        # Bind with the column type so boolean columns can be compared
+        key_val = literal(key_val, type_=key_col.type)
+        next_key = (key_col < key_val) if desc else (key_col > key_val)
+        # NULL is never equal or compared to other values, so the rows
+        # before and after the empty ones are selected by `IS [NOT] NULL`
+        if (sort_val is None):
+            if desc:
+                dbq = dbq.filter(sort_col.is_(None), next_key)
+            else:
+                dbq = dbq.filter(or_(sort_col.isnot(None), and_(sort_col.is_(None), next_key)))
+        else:
+            sort_val = literal(sort_val, type_=sort_col.type)
+            if desc:
+                dbq = dbq.filter(or_(sort_col < sort_val, and_(sort_col == sort_val, next_key), sort_col.is_(None)))
+            else:
+                dbq = dbq.filter(or_(sort_col > sort_val, and_(sort_col == sort_val, next_key)))
+
+    if desc:
+        dbq = dbq.order_by(sort_col.desc().nullslast(), key_col.desc())
+    else:
+        dbq = dbq.order_by(sort_col.asc().nullsfirst(), key_col.asc())
+
+    # Fetch one extra row to know if there is a next page
+    rows = dbq.limit(limit+1).all()
+
+    next_cursor = None
+    if (len(rows)>limit):
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last,sort_col.key), getattr(last,key_col.key)])
+
+    return(rows, next_cursor)
+# --------------------
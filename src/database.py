@@ -7,7 +7,9 @@ Copyright (c) 2017 Aimirim STI.\n
 '''
 
 # Import system libs
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from contextlib import contextmanager
@@ -17,8 +19,60 @@ from .env import Enviroment as Env
 
 #######################################
 
+SQLITE_PRAGMAS = {
+    'journal_mode': Env.DB_JOURNAL_MODE,
+    'synchronous':  Env.DB_SYNCHRONOUS,
+    'cache_size':   Env.DB_CACHE_SIZE,
+    'mmap_size':    Env.DB_MMAP_SIZE,
+    'temp_store':   Env.DB_TEMP_STORE,
+    'busy_timeout': Env.DB_BUSY_TIMEOUT,
+    'foreign_keys': Env.DB_FOREIGN_KEYS,
+}
+'''`SQLITE_PRAGMAS` (dict): Pragmas applied on every new connection.'''
+
+# --------------------
+def set_sqlite_pragmas(dbapi_conn, pragmas:dict):
+    ''' Apply pragmas to a SQLite connection.\n
+    `dbapi_conn` (sqlite3.Connection): The raw database connection.\n
+    `pragmas` (dict): Pragma names and values.\n
+    '''
+    cursor = dbapi_conn.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+# --------------------
+
+# --------------------
+def get_pool_args(db_url):
+    ''' Connection pool of the engine. SQLAlchemy opens a new connection per
+    session on SQLite files by default, so the pragmas would be paid on every
+    request. Keeping a pool of open connections avoids that. In memory
+    databases live in a single connection and keep the default.\n
+    `db_url` (URL): The database URL.\n
+    return `pool_args` (dict): Keyword arguments of `create_engine`.\n
+    '''
+    pool_args = {}
+    if db_url.get_backend_name()=='sqlite' and db_url.database not in (None, '', ':memory:'):
+        pool_args = {
+            'poolclass': QueuePool,
+            'pool_size': int(Env.DB_POOL_SIZE),
+            'max_overflow': int(Env.DB_MAX_OVERFLOW),
+            'pool_timeout': float(Env.DB_POOL_TIMEOUT),
+        }
+    return(pool_args)
+# --------------------
+
+db_url = make_url(Env.DATABASE_URL)
+is_sqlite = db_url.get_backend_name()=='sqlite'
+pool_args = get_pool_args(db_url)
+
 engine = create_engine( Env.DATABASE_URL,
-    connect_args={"check_same_thread": False} )
+    connect_args={"check_same_thread": False}, **pool_args )
+
+if is_sqlite:
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, connection_record):
+        set_sqlite_pragmas(dbapi_conn, SQLITE_PRAGMAS)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -31,6 +31,47 @@ class Enviroment:
     '''`DATABASE_URL` (str): The SQL URL to find the `sql_app.db` file.
     Default is `"sqlite:///db/sql_app.db"`'''
 
+    DB_JOURNAL_MODE = os.getenv('CONF_DB_JOURNAL_MODE', default='WAL')
+    '''`DB_JOURNAL_MODE` (str): SQLite `journal_mode` pragma. `WAL` lets readers
+    work while a writer commits. Default is `"WAL"`'''
+
+    DB_SYNCHRONOUS = os.getenv('CONF_DB_SYNCHRONOUS', default='NORMAL')
+    '''`DB_SYNCHRONOUS` (str): SQLite `synchronous` pragma. With WAL, `NORMAL` only
+    syncs on checkpoints and is still safe against corruption. Default is `"NORMAL"`'''
+
+    DB_CACHE_SIZE = os.getenv('CONF_DB_CACHE_SIZE', default='-65536')
+    '''`DB_CACHE_SIZE` (int): SQLite `cache_size` pragma, negative values are in KiB.
+    Default is `"-65536"` (64 MiB)'''
+
+    DB_MMAP_SIZE = os.getenv('CONF_DB_MMAP_SIZE', default='268435456')
+    '''`DB_MMAP_SIZE` (int): SQLite `mmap_size` pragma in bytes. Default is `"268435456"` (256 MiB)'''
+
+    DB_TEMP_STORE = os.getenv('CONF_DB_TEMP_STORE', default='MEMORY')
+    '''`DB_TEMP_STORE` (str): SQLite `temp_store` pragma. Default is `"MEMORY"`'''
+
+    DB_BUSY_TIMEOUT = os.getenv('CONF_DB_BUSY_TIMEOUT', default='5000')
+    '''`DB_BUSY_TIMEOUT` (int): Milliseconds a connection waits for a lock before
+    failing with "database is locked". Default is `"5000"`'''
+
+    DB_FOREIGN_KEYS = os.getenv('CONF_DB_FOREIGN_KEYS', default='OFF')
+    '''`DB_FOREIGN_KEYS` (str): SQLite `foreign_keys` pragma. Enforcing them changes
+    which inserts and deletes existing databases accept, so it is opt-in with `"ON"`.
+    Default is `"OFF"`'''
+
+    DB_POOL_SIZE = os.getenv('CONF_DB_POOL_SIZE', default='5')
+    '''`DB_POOL_SIZE` (int): Number of database connections kept open. Default is `"5"`'''
+
+    DB_MAX_OVERFLOW = os.getenv('CONF_DB_MAX_OVERFLOW', default='-1')
+    '''`DB_MAX_OVERFLOW` (int): Extra connections opened above `DB_POOL_SIZE` on
+    load peaks and closed when returned, `-1` for no limit. The request threads, the
+    background workers and the streamed responses each hold a session, so a limit
+    lower than all of them makes requests wait `DB_POOL_TIMEOUT` and fail.
+    Default is `"-1"`'''
+
+    DB_POOL_TIMEOUT = os.getenv('CONF_DB_POOL_TIMEOUT', default='30')
+    '''`DB_POOL_TIMEOUT` (float): Seconds a session waits for a free connection when
+    `DB_MAX_OVERFLOW` is reached, before failing. Default is `"30"`'''
+
     DEFAULT_FILE = os.getenv('CONF_DEFAULT_FILE' ,default='config/defaults.json')
     '''`DEFAULT_FILE` (str): Path to a json file with placeholders for FrontEnd. 
     Default is `"../config/defaults.json"`'''
@@ -51,4 +92,82 @@ class Enviroment:
     Default is `"fboot/gw_opc.fboot"`'''
 
     OPCUA_TESTER_PORT = os.getenv('OPCUA_TESTER_PORT', default='4900')
-    '''`OPCUA_TESTER_PORT` (str): The OpcUA tester port on forte project. Default is `"4900"`'''
\ No newline at end of file
+    '''`OPCUA_TESTER_PORT` (str): The OpcUA tester port on forte project. Default is `"4900"`'''
+
+    STREAM_CHUNK_SIZE = os.getenv('CONF_STREAM_CHUNK_SIZE', default='500')
+    '''`STREAM_CHUNK_SIZE` (int): Number of table rows loaded from database and sent
+    at once on streamed (NDJSON) answers. Default is `"500"`'''
+
+    PROBE_CONCURRENCY = os.getenv('CONF_PROBE_CONCURRENCY', default='64')
+    '''`PROBE_CONCURRENCY` (int): Maximum number of simultaneous connections when
+    probing the collectors ports. Default is `"64"`'''
+
+    PROBE_TIMEOUT = os.getenv('CONF_PROBE_TIMEOUT', default='2')
+    '''`PROBE_TIMEOUT` (float): Seconds to wait on a collector port when the collector
+    has no `timeout` set. Default is `"2"`'''
+
+    MONITOR_ENABLED = os.getenv('CONF_MONITOR_ENABLED', default='1')
+    '''`MONITOR_ENABLED` (str): Set to `"1"` to probe the collectors in background and
+    answer status requests from the last probe. Default is `"1"`'''
+
+    MONITOR_HISTORY_SIZE = os.getenv('CONF_MONITOR_HISTORY_SIZE', default='120')
+    '''`MONITOR_HISTORY_SIZE` (int): Number of probe samples kept for each collector
+    port. Default is `"120"`'''
+
+    MONITOR_SYNC_PERIOD = os.getenv('CONF_MONITOR_SYNC_PERIOD', default='60')
+    '''`MONITOR_SYNC_PERIOD` (float): Seconds between reloads of the collectors list
+    by the monitor. Changes made through the API are applied at once. Default is `"60"`'''
+
+    SSH_POOL_SIZE = os.getenv('CONF_SSH_POOL_SIZE', default='32')
+    '''`SSH_POOL_SIZE` (int): Maximum number of idle SSH connections kept open to
+    the collectors. Default is `"32"`'''
+
+    SSH_IDLE_TIMEOUT = os.getenv('CONF_SSH_IDLE_TIMEOUT', default='300')
+    '''`SSH_IDLE_TIMEOUT` (float): Seconds an unused SSH connection is kept open.
+    Default is `"300"`'''
+
+    SSH_KEEPALIVE = os.getenv('CONF_SSH_KEEPALIVE', default='30')
+    '''`SSH_KEEPALIVE` (int): Seconds between keepalive packets on pooled SSH
+    connections, `0` disables them. Default is `"30"`'''
+
+    PROMETHEUS_WRITE_DELAY = os.getenv('CONF_PROMETHEUS_WRITE_DELAY', default='0.2')
+    '''`PROMETHEUS_WRITE_DELAY` (float): Seconds to wait for other collector changes
+    before writing the Prometheus configuration, so they are saved at once. Default is `"0.2"`'''
+
+    PROMETHEUS_MODE = os.getenv('CONF_PROMETHEUS_MODE', default='static')
+    '''`PROMETHEUS_MODE` (str): How the collectors are given to Prometheus. With `"static"`
+    each one is a job inside the configuration file, with `"file_sd"` each one has its own
+    target file in `CONF_PROMETHEUS_SD_URL`, read by Prometheus without reloading the
+    configuration. Default is `"static"`'''
+
+    PROMETHEUS_SD_URL = os.getenv('CONF_PROMETHEUS_SD_URL', default='./file_sd')
+    '''`PROMETHEUS_SD_URL` (str): Local or Remote folder of the `file_sd` target files.
+    Default is `"./file_sd"`'''
+
+    PROMETHEUS_SD_FORMAT = os.getenv('CONF_PROMETHEUS_SD_FORMAT', default='json')
+    '''`PROMETHEUS_SD_FORMAT` (str): Format of the `file_sd` target files, `"json"` or
+    `"yaml"`. Default is `"json"`'''
+
+    EXPORT_VERIFY_REMOTE = os.getenv('CONF_EXPORT_VERIFY_REMOTE', default='0')
+    '''`EXPORT_VERIFY_REMOTE` (str): Set to `"1"` to also compare the hash of the file
+    in the collector before skipping an unchanged export file. Default is `"0"`'''
+
+    EXPORT_WORKERS = os.getenv('CONF_EXPORT_WORKERS', default='4')
+    '''`EXPORT_WORKERS` (int): Number of export jobs, and so of collectors uploading,
+    at the same time. Default is `"4"`'''
+
+    EXPORT_PROCESSES = os.getenv('CONF_EXPORT_PROCESSES', default='2')
+    '''`EXPORT_PROCESSES` (int): Number of processes generating the gateway files of
+    the exported collectors, `0` generates them in the export thread. Default is `"2"`'''
+
+    ARTIFACT_STORE_LOCATION = os.getenv('CONF_ARTIFACT_STORE_LOCATION', default='artifacts')
+    '''`ARTIFACT_STORE_LOCATION` (str): Local folder where the export files are kept
+    by the hash of their content. Default is `"artifacts"`'''
+
+    AUTO_DEPLOY_DELAY = os.getenv('CONF_AUTO_DEPLOY_DELAY', default='30')
+    '''`AUTO_DEPLOY_DELAY` (float): Seconds without changes on a collector with `auto_deploy`
+    before it is exported. Default is `"30"`'''
+
+    AUTO_DEPLOY_MAX_DELAY = os.getenv('CONF_AUTO_DEPLOY_MAX_DELAY', default='300')
+    '''`AUTO_DEPLOY_MAX_DELAY` (float): Maximum seconds between the first change on a collector
+    with `auto_deploy` and its export. Default is `"300"`'''
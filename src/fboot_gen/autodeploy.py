@@ -0,0 +1,128 @@
+'''
+This module schedules the automatic export
+of the collectors after their configuration
+changes.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* sqlalchemy
+'''
+
+# Import system libs
+import time
+import threading
+
+# Import custom libs
+from ..env import Enviroment as Env
+from ..database import SessionManager
+from ..crud import Tcollector
+
+#######################################
+
+class AutoDeployer:
+    ''' Export a collector once its datasources and datapoints stop changing.
+    Each change postpones the export to `CONF_AUTO_DEPLOY_DELAY` seconds later,
+    so a burst of edits becomes a single build and upload. A collector that
+    never stops changing is exported `CONF_AUTO_DEPLOY_MAX_DELAY` seconds after
+    its first change. Only collectors with `auto_deploy` enabled are exported.\n
+    '''
+
+    def __init__(self, submit):
+        self.submit = submit
+        '''`submit` (callable): `submit(db, col_id)` queues the export of a collector.'''
+        self._due = {}
+        '''`_due` (dict): `(export time, first change time)` of each collector id.'''
+        self._changed = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    # --------------------
+    def start(self):
+        ''' Start the scheduler thread.\n
+        '''
+        with self._changed:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._loop, name='auto-deploy', daemon=True)
+        self._thread.start()
+    # --------------------
+
+    # --------------------
+    def stop(self):
+        ''' Stop the scheduler thread. The exports not due yet are dropped.\n
+        '''
+        with self._changed:
+            self._running = False
+            self._due = {}
+            self._changed.notify_all()
+        if (self._thread is not None):
+            self._thread.join()
+            self._thread = None
+    # --------------------
+
+    # --------------------
+    def touch(self, col_ids:list):
+        ''' Register a change on some collectors, postponing their export.\n
+        `col_ids` (list): The changed collector ids.\n
+        '''
+        now = time.monotonic()
+        delay = float(Env.AUTO_DEPLOY_DELAY)
+        max_delay = float(Env.AUTO_DEPLOY_MAX_DELAY)
+
+        with self._changed:
+            for col_id in col_ids:
+                _, first = self._due.get(col_id, (None, now))
+                self._due[col_id] = (min(now+delay, first+max_delay), first)
+            self._changed.notify_all()
+    # --------------------
+
+    # --------------------
+    def scheduled(self, col_id:int):
+        ''' Seconds until the automatic export of a collector.\n
+        `col_id` (int): Collector id.\n
+        return (float): The remaining time, `None` if nothing is scheduled.\n
+        '''
+        with self._changed:
+            due = self._due.get(col_id)
+        if (due is None):
+            return(None)
+        return(max(due[0]-time.monotonic(), 0.0))
+    # --------------------
+
+    # --------------------
+    def _loop(self):
+        ''' Wait for the next due collectors and queue their export.\n
+        '''
+        while True:
+            with self._changed:
+                while self._running:
+                    now = time.monotonic()
+                    ready = [ col_id for col_id, (due, _) in self._due.items() if due<=now ]
+                    if (len(ready)>0):
+                        break
+                    timeout = min([ due for due, _ in self._due.values() ], default=now+60) - now
+                    self._changed.wait(timeout)
+                if not self._running:
+                    return
+                for col_id in ready:
+                    del self._due[col_id]
+
+            for col_id in ready:
+                self._deploy(col_id)
+    # --------------------
+
+    # --------------------
+    def _deploy(self, col_id:int):
+        ''' Queue the export of a collector, if it still exists and has
+        `auto_deploy` enabled.\n
+        `col_id` (int): Collector id.\n
+        '''
+        try:
+            with SessionManager() as db:
+                db_col = Tcollector.get_by_id(db, col_id)
+                if (db_col is not None and db_col.auto_deploy):
+                    self.submit(db, col_id)
+        except Exception as exc:
+            # A failed scheduling must not stop the other collectors
+            print(f'Auto deploy: collector {col_id}: {exc}')
+    # --------------------
@@ -0,0 +1,101 @@
+'''
+This module generates the gateway files
+of a collector. It has no database access, so
+it can run in worker processes.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* pyfboot
+* pyyaml
+'''
+
+# Import system libs
+import os
+import tempfile
+import yaml
+from typing import List, Tuple
+from pyfboot.gateway import MonoGatewayProject
+
+#######################################
+
+# --------------------
+def render_fboot(prj_4diac:MonoGatewayProject, fboot_name:str):
+    ''' Generate the fboot file content.\n
+    `prj_4diac` (MonoGatewayProject): The gateway project.\n
+    `fboot_name` (str): Name of the fboot file.\n
+    return `content` (bytes): The fboot file.\n
+    '''
+    with tempfile.TemporaryDirectory() as folder:
+        fboot_path = os.path.join(folder, fboot_name)
+        prj_4diac.write_fboot(fboot_path, overwrite=True)
+        with open(fboot_path, 'rb') as fid:
+            content = fid.read()
+
+    return(content)
+# --------------------
+
+# --------------------
+def build_project(cycle_ms:int, export_list:List[Tuple[dict,List[dict]]]):
+    ''' Build the Forte project with a communication block for each datapoint.\n
+    `cycle_ms` (int): Gateway cycle time in milliseconds.\n
+    `export_list` (list): Pairs of datasource and its datapoints, as dictionaries
+    of `schemas.dataSource` and `schemas.dataPoint`.\n
+    return `prj_4diac` (MonoGatewayProject): The gateway project.\n
+    '''
+    # Create the 4diac Gateway Project
+    prj_4diac = MonoGatewayProject(cycle_ms)
+
+    for ds, dp_list in export_list:
+        for dp in dp_list:
+            # Create communication blocks and associate them with an OPC variable
+            comFB = prj_4diac.build_comm_block(ds,dp)
+            prj_4diac.addVariable(dp['name'],comFB)
+
+    return(prj_4diac)
+# --------------------
+
+# --------------------
+def render_opcua(export_list:List[Tuple[dict,List[dict]]]):
+    ''' Generate the OPC-UA exporter configuration with a node for each datapoint.\n
+    `export_list` (list): Pairs of datasource and its datapoints, as dictionaries
+    of `schemas.dataSource` and `schemas.dataPoint`.\n
+    return `content` (bytes): The OPC-UA exporter YAML file.\n
+    '''
+    # Create OPCUA configuration file
+    opcua_conf = { 'endPoint':f'opc.tcp://forte_server:4840', 'nodes':[] }
+
+    for ds, dp_list in export_list:
+        for dp in dp_list:
+            # Create corresponding Node on OPCUA
+            opcua_conf['nodes'].append({
+                'nodeName':f'ns={1};s={dp["name"]}',
+                'metricName':f'{dp["name"]}',
+                'metricHelp':f'{dp["description"]}'
+            })
+
+    # Insert one more node with the pre-defined observability variable
+    opcua_conf['nodes'].append({
+        'nodeName':'ns=1;s=_ForteCycleTime',
+        'metricName':'_ForteCycleTime',
+        'metricHelp':'Tempo de leitura das variavies do Forte'
+    })
+
+    content = yaml.dump(opcua_conf, allow_unicode=True, encoding=None).encode('utf-8')
+    return(content)
+# --------------------
+
+# --------------------
+def build_gateway_files(cycle_ms:int, export_list:List[Tuple[dict,List[dict]]], fboot_name:str):
+    ''' Build the Forte project and the OPC-UA exporter configuration.\n
+    `cycle_ms` (int): Gateway cycle time in milliseconds.\n
+    `export_list` (list): Pairs of datasource and its datapoints, as dictionaries
+    of `schemas.dataSource` and `schemas.dataPoint`.\n
+    `fboot_name` (str): Name of the fboot file.\n
+    return `fboot` (bytes): The fboot file.\n
+    return `opcua` (bytes): The OPC-UA exporter YAML file.\n
+    '''
+    prj_4diac = build_project(cycle_ms, export_list)
+    fboot = render_fboot(prj_4diac, fboot_name)
+    opcua = render_opcua(export_list)
+
+    return(fboot, opcua)
+# --------------------
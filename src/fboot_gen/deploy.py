@@ -0,0 +1,196 @@
+'''
+This module puts several files in place
+on a collector as a single change.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* fsspec
+'''
+
+# Import system libs
+import os
+import uuid
+import posixpath
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from fsspec.implementations.local import LocalFileSystem
+from fsspec.implementations.sftp import SFTPFileSystem
+
+#######################################
+
+# --------------------
+def replace_file(fs, src:str, dst:str):
+    ''' Rename a file over another one atomically. fsspec moves local files
+    with a copy, so they use `os.replace`, SFTP uses `posix_rename`.\n
+    `fs` (AbstractFileSystem): The filesystem of both files.\n
+    `src` (str): The new file.\n
+    `dst` (str): The file to replace.\n
+    '''
+    if isinstance(fs, LocalFileSystem):
+        os.replace(src, dst)
+    else:
+        fs.mv(src, dst)
+# --------------------
+
+# --------------------
+def write_file(fs, path:str, content:bytes):
+    ''' Write a file from a worker thread. A paramiko SFTP channel can not be
+    shared by threads, so SFTP files are written over a new channel of the
+    same SSH connection, with pipelined writes.\n
+    `fs` (AbstractFileSystem): The filesystem of the file.\n
+    `path` (str): The file location.\n
+    `content` (bytes): The file content.\n
+    '''
+    if not isinstance(fs, SFTPFileSystem):
+        with fs.open(path, 'wb') as fid:
+            fid.write(content)
+        return
+
+    sftp = fs.client.open_sftp()
+    try:
+        with sftp.open(path, 'wb') as fid:
+            fid.set_pipelined(True)
+            fid.write(content)
+    finally:
+        sftp.close()
+# --------------------
+
+class _Staged:
+    ''' A file uploaded to its temporary name.\n
+    '''
+
+    def __init__(self, tmp_path:str, path:str, existed:bool, previous:bytes):
+        self.tmp_path = tmp_path
+        '''`tmp_path` (str): The temporary file.'''
+        self.path = path
+        '''`path` (str): The final location.'''
+        self.existed = existed
+        '''`existed` (bool): If `path` existed before the deploy.'''
+        self.previous = previous
+        '''`previous` (bytes): Content of `path` before the deploy, if known.'''
+        self.upload = None
+        '''`upload` (Future): The upload of `tmp_path`.'''
+
+class Deployment:
+    ''' Upload a set of files over one filesystem session, each one to a
+    temporary name beside its destination, and only rename them into place
+    once all of them were written. The files are uploaded at the same time,
+    each one over its own channel. A failed upload leaves the destination
+    untouched, and a failed rename puts back the files already renamed.\n
+    Use it as a context manager, so the temporary files are removed if
+    `commit` is not reached.\n
+    '''
+
+    def __init__(self, fs, workers:int=4):
+        self.fs = fs
+        '''`fs` (AbstractFileSystem): The session where the files are written, `None`
+        if no file is staged.'''
+        self.workers = workers
+        '''`workers` (int): Maximum number of files uploaded at the same time.'''
+        self._executor = None
+        self._staged = []
+        self._committed = []
+
+    # --------------------
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, *exc):
+        self.abort()
+    # --------------------
+
+    # --------------------
+    def stage(self, path:str, content:bytes, previous:bytes=None):
+        ''' Start the upload of a file to a temporary name in the destination
+        folder. It runs beside the uploads of the other staged files, `wait`
+        or `commit` get its result.\n
+        `path` (str): The final location.\n
+        `content` (bytes): The file content.\n
+        `previous` (bytes): The current content of `path`, to restore it if the
+        commit fails. `None` if it is not known.\n
+        '''
+        folder = posixpath.dirname(path)
+        self.fs.makedirs(folder, exist_ok=True)
+        tmp_path = posixpath.join(folder, f'.{posixpath.basename(path)}.{uuid.uuid4().hex}.tmp')
+
+        staged = _Staged(tmp_path, path, self.fs.exists(path), previous)
+        self._staged.append(staged)
+        if (self._executor is None):
+            self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        staged.upload = self._executor.submit(write_file, self.fs, tmp_path, content)
+    # --------------------
+
+    # --------------------
+    def wait(self, progress=None):
+        ''' Wait for the upload of every staged file.\n
+        `progress` (callable): Called as `progress(done)` when each upload finishes.\n
+        '''
+        uploads = [ staged.upload for staged in self._staged ]
+        error = None
+        for done, upload in enumerate(as_completed(uploads)):
+            if (upload.exception() is not None and error is None):
+                error = upload.exception()
+            if (progress is not None):
+                progress(done+1)
+        if (error is not None):
+            raise error
+    # --------------------
+
+    # --------------------
+    def commit(self):
+        ''' Rename every staged file into place.\n
+        '''
+        done = []
+        try:
+            self.wait()
+            for staged in self._staged:
+                replace_file(self.fs, staged.tmp_path, staged.path)
+                done.append(staged)
+            self._committed = done
+        except:
+            self._restore(done)
+            raise
+        finally:
+            self.abort()
+    # --------------------
+
+    # --------------------
+    def revert(self):
+        ''' Put back the files of a finished commit, when a later step of the
+        same change fails.\n
+        '''
+        committed, self._committed = self._committed, []
+        self._restore(committed)
+    # --------------------
+
+    # --------------------
+    def _restore(self, done:list):
+        ''' Put back the files replaced by an interrupted commit, when
+        their previous content is known.\n
+        `done` (list): The `_Staged` files already renamed.\n
+        '''
+        for staged in reversed(done):
+            try:
+                if (not staged.existed):
+                    self.fs.rm(staged.path)
+                elif (staged.previous is not None):
+                    with self.fs.open(staged.tmp_path, 'wb') as fid:
+                        fid.write(staged.previous)
+                    replace_file(self.fs, staged.tmp_path, staged.path)
+            except Exception:
+                pass
+    # --------------------
+
+    # --------------------
+    def abort(self):
+        ''' Stop the uploads and remove the temporary files not renamed.\n
+        '''
+        if (self._executor is not None):
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        for staged in self._staged:
+            try:
+                if self.fs.exists(staged.tmp_path):
+                    self.fs.rm(staged.tmp_path)
+            except Exception:
+                pass
+        self._staged = []
+    # --------------------
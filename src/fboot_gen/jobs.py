@@ -0,0 +1,250 @@
+'''
+This module has the worker that runs
+the export jobs in background.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* sqlalchemy
+'''
+
+# Import system libs
+import json
+import time
+import asyncio
+import threading
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# Import custom libs
+from ..env import Enviroment as Env
+from ..database import SessionManager
+from ..crud import Tcollector, Texport
+
+#######################################
+
+FINISHED = ('done', 'failed')
+'''`FINISHED` (tuple): Job status that will not change anymore.'''
+
+class ExportWorker:
+    ''' Run the export jobs in a thread pool. The job state is saved in the
+    `export_jobs` table, so jobs left behind by a restart run again when the
+    worker starts. Jobs of the same collector never run at the same time.
+    The CPU bound steps can run in a process pool, so several collectors are
+    generated in parallel.\n
+    '''
+
+    def __init__(self, runner):
+        self.runner = runner
+        '''`runner` (callable): `runner(db, db_col, progress, mode, bundle_id)` exports a
+        collector and returns a `schemas.exportReport`. `progress(stage, done, total)`
+        reports its state.'''
+        self._executor = None
+        self._processes = None
+        self._pools_lock = threading.Lock()
+        self._versions = {}
+        '''`_versions` (dict): Number of changes of each job, to wake up the waiting requests.'''
+        self._waiters = {}
+        '''`_waiters` (dict): `(loop, asyncio.Event)` of the requests waiting on each job.'''
+        self._changed = threading.Lock()
+        self._submit_lock = threading.Lock()
+        self._locks = {}
+        '''`_locks` (dict): A lock by collector id.'''
+        self._locks_lock = threading.Lock()
+
+    # --------------------
+    def _get_executor(self):
+        ''' Create the thread pool on first use.\n
+        return `executor` (ThreadPoolExecutor): The worker threads.\n
+        '''
+        with self._pools_lock:
+            if (self._executor is None):
+                self._executor = ThreadPoolExecutor(max_workers=int(Env.EXPORT_WORKERS),
+                    thread_name_prefix='export')
+            return(self._executor)
+    # --------------------
+
+    # --------------------
+    def run_cpu(self, func, *args):
+        ''' Run a CPU bound function in the process pool, or in the calling
+        thread if `CONF_EXPORT_PROCESSES` is `0`.\n
+        `func` (callable): A module level function, its arguments and result
+        must be picklable.\n
+        return: The function result.\n
+        '''
+        if (int(Env.EXPORT_PROCESSES)<=0):
+            return(func(*args))
+
+        # Several export threads may get here at once, only one pool is created
+        with self._pools_lock:
+            if (self._processes is None):
+                # Spawn, so the children do not inherit the server threads and connections
+                self._processes = ProcessPoolExecutor(max_workers=int(Env.EXPORT_PROCESSES),
+                    mp_context=multiprocessing.get_context('spawn'))
+            processes = self._processes
+        return(processes.submit(func, *args).result())
+    # --------------------
+
+    # --------------------
+    def start(self):
+        ''' Run again the jobs that were waiting or running when the
+        application stopped.\n
+        '''
+        with SessionManager() as db:
+            ids = [ job.id for job in Texport.get_unfinished_jobs(db) ]
+            for id in ids:
+                Texport.update_job(db, id, {'status':'queued'})
+
+        for id in ids:
+            self._get_executor().submit(self._run, id)
+    # --------------------
+
+    # --------------------
+    def stop(self):
+        ''' Stop taking jobs. The queued ones stay in database.\n
+        '''
+        with self._pools_lock:
+            executor, self._executor = self._executor, None
+            processes, self._processes = self._processes, None
+        if (executor is not None):
+            executor.shutdown(wait=False, cancel_futures=True)
+        if (processes is not None):
+            processes.shutdown(wait=False, cancel_futures=True)
+    # --------------------
+
+    # --------------------
+    def submit(self, db, col_id:int, mode:str='export', bundle_id:int=None):
+        ''' Queue the export of a collector. If the same export of this collector
+        is already waiting, it is returned instead, since it will export the
+        latest data anyway.\n
+        `db` (Session): Database session instance.\n
+        `col_id` (int): Collector id.\n
+        `mode` (str): `"export"` to build and deploy, `"build"`, `"deploy"`
+        or `"rollback"`.\n
+        `bundle_id` (int): Bundle to deploy, `None` for the last one built.\n
+        return `db_job` (models.ExportJob): The queued job.\n
+        '''
+        # Search and create together, so concurrent requests share the job
+        with self._submit_lock:
+            db_job = Texport.get_queued_job(db, col_id, mode, bundle_id)
+            if (db_job is None):
+                db_job = Texport.create_job(db, col_id, mode, bundle_id)
+                self._get_executor().submit(self._run, db_job.id)
+
+        return(db_job)
+    # --------------------
+
+    # --------------------
+    def version(self, id:int):
+        ''' Number of changes seen on a job.\n
+        `id` (int): Job id.\n
+        return (int): The change counter.\n
+        '''
+        with self._changed:
+            return(self._versions.get(id, 0))
+    # --------------------
+
+    # --------------------
+    async def wait_change(self, id:int, version:int, timeout:float):
+        ''' Wait until a job changes after `version` or the timeout ends. The
+        request waits on the event loop, without holding a thread.\n
+        `id` (int): Job id.\n
+        `version` (int): Value of `version` already seen.\n
+        `timeout` (float): Maximum seconds to wait.\n
+        return (int): The current change counter.\n
+        '''
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._changed:
+            if (self._versions.get(id, 0)!=version):
+                return(self._versions[id])
+            self._waiters.setdefault(id, set()).add(waiter)
+
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._changed:
+                waiters = self._waiters.get(id, set())
+                waiters.discard(waiter)
+                if (len(waiters)==0):
+                    self._waiters.pop(id, None)
+
+        return(self.version(id))
+    # --------------------
+
+    # --------------------
+    def _notify(self, id:int):
+        ''' Wake up the requests waiting on a job. Called from the worker
+        threads, so the events are set on the loop of each request.\n
+        `id` (int): Job id.\n
+        '''
+        with self._changed:
+            self._versions[id] = self._versions.get(id, 0) + 1
+            waiters = list(self._waiters.get(id, ()))
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The loop of that request is already closed
+                pass
+    # --------------------
+
+    # --------------------
+    def _collector_lock(self, col_id:int):
+        ''' Get the lock that serializes the jobs of a collector.\n
+        `col_id` (int): Collector id.\n
+        return (Lock): The collector lock.\n
+        '''
+        with self._locks_lock:
+            return(self._locks.setdefault(col_id, threading.Lock()))
+    # --------------------
+
+    # --------------------
+    def _run(self, id:int):
+        ''' Run one job, saving each stage, its progress and timing.\n
+        `id` (int): Job id.\n
+        '''
+        with SessionManager() as db:
+            db_job = Texport.get_job(db, id)
+            if (db_job is None or db_job.status in FINISHED):
+                return
+            col_id = db_job.collector_id
+            mode, bundle_id = db_job.mode, db_job.bundle_id
+            timings = {}
+            current = {'stage':None, 'start':time.perf_counter()}
+
+            def _close_stage():
+                if (current['stage'] is not None):
+                    timings[current['stage']] = round(time.perf_counter()-current['start'], 3)
+
+            def _progress(stage:str, done:int=0, total:int=0):
+                values = {'progress':done, 'total':total}
+                if (stage!=current['stage']):
+                    _close_stage()
+                    current['stage'] = stage
+                    current['start'] = time.perf_counter()
+                    values['stage'] = stage
+                    values['timings'] = json.dumps(timings)
+                Texport.update_job(db, id, values)
+                self._notify(id)
+
+            with self._collector_lock(col_id):
+                Texport.update_job(db, id, {'status':'running', 'started_at':datetime.utcnow()})
+                self._notify(id)
+                try:
+                    db_col = Tcollector.get_by_id(db, col_id)
+                    if (db_col is None):
+                        raise ValueError('Invalid collector ID.')
+                    report = self.runner(db, db_col, _progress, mode, bundle_id)
+                    _close_stage()
+                    values = {'status':'done', 'report':report.json()}
+                except Exception as exc:
+                    db.rollback()
+                    _close_stage()
+                    msg = str(exc).split('\n')[0]
+                    values = {'status':'failed', 'error':f'Export Error: "{msg}"'}
+
+                values.update({'timings':json.dumps(timings), 'finished_at':datetime.utcnow()})
+                Texport.update_job(db, id, values)
+                self._notify(id)
+    # --------------------
@@ -0,0 +1,340 @@
+'''
+This module keeps the Prometheus configuration
+files cached and writes them only on changes.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* fsspec
+* pyyaml
+'''
+
+# Import system libs
+import copy
+import json
+import uuid
+import posixpath
+import threading
+import fsspec
+import yaml
+from pydantic.utils import deep_update
+
+# Import custom libs
+from ..env import Enviroment as Env
+from ..ssh_pool import storage_options, open_filesystem
+from .deploy import replace_file
+
+#######################################
+
+SD_JOB_NAME = 'tocandira_collectors'
+'''`SD_JOB_NAME` (str): The Prometheus job that reads the `file_sd` target files.'''
+
+# --------------------
+def file_sd_job():
+    ''' Build the Prometheus job that reads the collectors target files.\n
+    return `job` (dict): The scrape job.\n
+    '''
+    folder = fsspec.core.strip_protocol(Env.PROMETHEUS_SD_URL)
+    job = { 'job_name': SD_JOB_NAME,
+        'file_sd_configs': [{'files': [posixpath.join(folder, f'*.{Env.PROMETHEUS_SD_FORMAT}')]}]
+    }
+    return(job)
+# --------------------
+
+class _PendingWrite:
+    ''' A write shared by all changes made in the same coalescing window.\n
+    '''
+
+    def __init__(self):
+        self.done = threading.Event()
+        '''`done` (Event): Set when the write has finished.'''
+        self.error = None
+        '''`error` (Exception): The write failure, if any.'''
+        self.written = False
+        '''`written` (bool): If any file was changed.'''
+        self.waited = False
+        '''`waited` (bool): If a caller waits for the result. A failed write
+        waited by nobody keeps its changes to save them on the next one.'''
+
+class PrometheusFile:
+    ''' Parsed copy of one `prometheus.yml`. The file is only downloaded
+    again when its modification time or size changes, the scrape jobs are
+    edited in memory and the file is rewritten only when the rendered output
+    differs from its content. Writes requested within `CONF_PROMETHEUS_WRITE_DELAY`
+    seconds are joined in a single one, made by a background timer. The
+    configuration is copied under the lock and written outside it, so the
+    changes of other requests do not wait for the upload.\n
+    The `file_sd` target files kept beside it follow the same rules, each one
+    replaced atomically.\n
+    '''
+
+    def __init__(self, url:str, options:dict):
+        self.url = url
+        '''`url` (str): Location of the file.'''
+        self.options = options
+        '''`options` (dict): fsspec options to access the file.'''
+        self.conf = None
+        '''`conf` (dict): The configuration with the changes not written yet.'''
+        self._text = None
+        '''`_text` (str): Last known content of the file.'''
+        self._stamp = None
+        '''`_stamp` (tuple): Modification time and size of `_text`.'''
+        self._targets = {}
+        '''`_targets` (dict): Target files content not written yet by name, `None` to remove.'''
+        self._targets_text = {}
+        '''`_targets_text` (dict): Last written content of each target file.'''
+        self._pending = None
+        self._lock = threading.RLock()
+        self._flushing = threading.Lock()
+
+    # --------------------
+    def _get_stamp(self, fs, path:str):
+        ''' Stat the file.\n
+        `fs` (AbstractFileSystem): The filesystem of the file.\n
+        `path` (str): The file location.\n
+        return `stamp` (tuple): Modification time and size, `None` if the
+        file can not be reached.\n
+        '''
+        try:
+            info = fs.info(path)
+            stamp = (info.get('mtime'), info.get('size'))
+        except Exception:
+            stamp = None
+        return(stamp)
+    # --------------------
+
+    # --------------------
+    def load(self):
+        ''' Get the configuration, downloading and parsing the file only
+        if it changed since the last access.\n
+        return `conf` (dict): The `prometheus.yml` content, merged with the
+        Prometheus defaults.\n
+        '''
+        with self._lock:
+            # The file changes under a write in progress, that is not an outside edit
+            if (self.conf is not None and self._flushing.locked()):
+                return(self.conf)
+
+            stamp, text = None, None
+            try:
+                with open_filesystem(self.url, **self.options) as (fs, path):
+                    stamp = self._get_stamp(fs, path)
+                    if (self.conf is None or (stamp is not None and stamp!=self._stamp)):
+                        with fs.open(path, 'r', encoding="utf-8") as fid:
+                            text = fid.read()
+            except:
+                pass
+            # Keep the changes not written yet while the file is unchanged or missing
+            if (self.conf is not None and (stamp is None or stamp==self._stamp)):
+                return(self.conf)
+
+            conf = copy.deepcopy(Env.DEFAULTS['Prometheus'])
+            try:
+                conf = deep_update(conf, yaml.safe_load(text))
+            except:
+                pass
+
+            self.conf = conf
+            self._text = text
+            self._stamp = stamp
+            return(self.conf)
+    # --------------------
+
+    # --------------------
+    def set_job(self, old_name:str, job:dict):
+        ''' Replace the scrape job named `old_name` or append a new one.\n
+        `old_name` (str): Current job name, `None` for a new collector.\n
+        `job` (dict): The scrape job.\n
+        return `conf` (dict): The updated configuration.\n
+        '''
+        with self._lock:
+            conf = self.load()
+            # Search for existing configuration
+            exporter_id = -1
+            for i,item in enumerate(conf['scrape_configs']):
+                if (old_name is not None and item['job_name']==old_name):
+                    exporter_id = i
+
+            if (exporter_id!=-1):
+                conf['scrape_configs'][exporter_id] = job
+            else:
+                conf['scrape_configs'].append(job)
+            return(conf)
+    # --------------------
+
+    # --------------------
+    def remove_job(self, name:str):
+        ''' Remove the scrape job named `name`, if it exists.\n
+        `name` (str): Job name.\n
+        return `conf` (dict): The updated configuration.\n
+        '''
+        with self._lock:
+            conf = self.load()
+            conf['scrape_configs'] = [ item for item in conf['scrape_configs']
+                if item['job_name']!=name ]
+            return(conf)
+    # --------------------
+
+    # --------------------
+    def set_target(self, name:str, groups:list):
+        ''' Set the content of a `file_sd` target file.\n
+        `name` (str): File name, without extension.\n
+        `groups` (list): The target groups, with `targets` and `labels`.\n
+        '''
+        if (Env.PROMETHEUS_SD_FORMAT=='yaml'):
+            text = yaml.dump(groups, allow_unicode=True, encoding=None, default_flow_style=False)
+        else:
+            text = json.dumps(groups, indent=2)
+        with self._lock:
+            self._targets[name] = text
+    # --------------------
+
+    # --------------------
+    def remove_target(self, name:str):
+        ''' Remove a `file_sd` target file.\n
+        `name` (str): File name, without extension.\n
+        '''
+        with self._lock:
+            self._targets[name] = None
+    # --------------------
+
+    # --------------------
+    def _flush_targets(self, targets:dict):
+        ''' Write the changed target files through a temporary file and a
+        rename, so Prometheus never reads a partial file.\n
+        `targets` (dict): Copy of the target files content not written yet.\n
+        return `written` (bool): If any target file was changed.\n
+        '''
+        written = False
+        if (len(targets)==0):
+            return(written)
+        with open_filesystem(Env.PROMETHEUS_SD_URL, **self.options) as (fs, folder):
+            fs.makedirs(folder, exist_ok=True)
+
+            for name, text in targets.items():
+                path = posixpath.join(folder, f'{name}.{Env.PROMETHEUS_SD_FORMAT}')
+                if (text is None):
+                    if fs.exists(path):
+                        fs.rm(path)
+                        written = True
+                elif (text!=self._targets_text.get(name)):
+                    tmp_path = posixpath.join(folder, f'.{name}.{uuid.uuid4().hex}.tmp')
+                    with fs.open(tmp_path, 'w', encoding="utf-8") as fid:
+                        fid.write(text)
+                    replace_file(fs, tmp_path, path)
+                    written = True
+                with self._lock:
+                    self._targets_text[name] = text
+                    # Keep a newer content set during the upload
+                    if (name in self._targets and self._targets[name]==text):
+                        del self._targets[name]
+
+        return(written)
+    # --------------------
+
+    # --------------------
+    def _flush(self):
+        ''' Write the configuration if it differs from the file content,
+        then the changed target files.\n
+        return `written` (bool): If any file was changed.\n
+        '''
+        written = False
+        with self._flushing:
+            with self._lock:
+                text = None
+                if (self.conf is not None):
+                    text = yaml.dump(self.conf, allow_unicode=True, encoding=None, default_flow_style=False)
+                known_text, known_stamp = self._text, self._stamp
+                targets = dict(self._targets)
+
+            if (text is not None):
+                with open_filesystem(self.url, **self.options) as (fs, path):
+                    if (text!=known_text or known_stamp!=self._get_stamp(fs, path)):
+                        if posixpath.dirname(path):
+                            fs.makedirs(posixpath.dirname(path), exist_ok=True)
+                        with fs.open(path, 'w', encoding="utf-8") as fid:
+                            fid.write(text)
+                        stamp = self._get_stamp(fs, path)
+                        with self._lock:
+                            self._text, self._stamp = text, stamp
+                        written = True
+            written = self._flush_targets(targets) or written
+
+        return(written)
+    # --------------------
+
+    # --------------------
+    def write(self, wait:bool=True):
+        ''' Save the configuration. The first caller starts a timer that waits
+        for the coalescing window and writes once for all changes made meanwhile.\n
+        `wait` (bool): Wait for that write and raise its error. If `False` the
+        call returns at once and a failure is only logged.\n
+        return `written` (bool): If any file was changed, `False` when the
+        files already had this content, `None` when not waiting.\n
+        '''
+        with self._lock:
+            pending = self._pending
+            if (pending is None):
+                pending = self._pending = _PendingWrite()
+                timer = threading.Timer(float(Env.PROMETHEUS_WRITE_DELAY), self._write_pending, (pending,))
+                timer.daemon = True
+                timer.start()
+            pending.waited = pending.waited or wait
+
+        if not wait:
+            return(None)
+
+        pending.done.wait()
+        if (pending.error is not None):
+            raise pending.error
+
+        return(pending.written)
+    # --------------------
+
+    # --------------------
+    def _write_pending(self, pending:_PendingWrite):
+        ''' Write the files for the callers of a coalescing window. Runs
+        in the timer thread.\n
+        `pending` (_PendingWrite): The shared write.\n
+        '''
+        with self._lock:
+            self._pending = None
+        try:
+            pending.written = self._flush()
+        except Exception as exc:
+            pending.error = exc
+            if pending.waited:
+                # Forget the changes not written, so they are not saved later
+                # by another collector. The file is read again on next access.
+                with self._lock:
+                    self.conf = None
+                    self._targets = {}
+            else:
+                print(f'Prometheus file {self.url}: {exc}')
+        finally:
+            pending.done.set()
+    # --------------------
+
+_files = {}
+_files_lock = threading.Lock()
+
+# --------------------
+def get_file(db_col):
+    ''' Get the cached Prometheus file of a collector. A local file is shared
+    by all collectors, a remote one belongs to the collector host.\n
+    `db_col` (models.Collector): The collector.\n
+    return `prom_file` (PrometheusFile): The cached file.\n
+    '''
+    options = storage_options(db_col)
+    if (fsspec.utils.get_protocol(Env.PROMETHEUS_FILEURL) in ('file','local')):
+        key = (Env.PROMETHEUS_FILEURL,)
+    else:
+        key = (Env.PROMETHEUS_FILEURL, options['host'], options['port'], options['username'])
+
+    with _files_lock:
+        prom_file = _files.get(key)
+        if (prom_file is None):
+            prom_file = _files[key] = PrometheusFile(Env.PROMETHEUS_FILEURL, options)
+        # Keep the latest credentials
+        prom_file.options = options
+
+    return(prom_file)
+# --------------------
@@ -11,197 +11,679 @@ Copyright (c) 2017 Aimirim STI.\n
 '''
 
 # Import system libs
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
-from pyfboot.gateway import MonoGatewayProject
-from pydantic.utils import deep_update
+from datetime import timezone
+import os
+import io
+import json
+import shlex
+import tarfile
+import zipfile
+import asyncio
+import hashlib
+import contextlib
 import fsspec
+from concurrent.futures import ThreadPoolExecutor
 import yaml
-import os
+from typing import List, Union
 
 # Import custom libs
-from ..database import get_db
+from . import schemas
+from . import jobs
+from . import builder
+from . import prometheus
+from . import deploy
+from . import autodeploy
+from .store import store
+from ..database import get_db, SessionManager
+from ..ssh_pool import pool, storage_options, open_filesystem
 from ..env import Enviroment as Env
 from ..user_auth import routes as usr_routes
 from ..crud.datapoint import Tdatapoint
 from ..crud.datasource import Tdatasource
 from ..crud.collector import Tcollector
+from ..crud.export import Texport
 
 #######################################
 
 # --------------------
-def _update_prometheus_conf(old,db_col):
-    ''' Load the existing Prometheus configuration and update it.\n
-    `db_col` (schema.collector): The collector information.\n
-    return `prometheus_conf` (dict): The `prometheus.yml` file updated for
-    this collector.\n
+def _target_name(db_col):
+    ''' Name of the `file_sd` target file of a collector.\n
+    `db_col` (models.Collector): The collector information.\n
+    return `name` (str): The file name, without extension.\n
     '''
+    return(f'collector_{db_col.id}')
+# --------------------
 
-    prometheus_conf = Env.DEFAULTS['Prometheus']
-    
-    # Read existing Prometheus File
-    try:
-        with fsspec.open(Env.PROMETHEUS_FILEURL, 'r', host=db_col.ip, 
-            port=int(db_col.ssh_port), username=db_col.ssh_user, password=db_col.ssh_pass) as fid:
-            prometheus_conf_r = yaml.safe_load(fid)
-        prometheus_conf = deep_update(prometheus_conf,prometheus_conf_r)
-    except:
-        pass
-
-    # Search for existing configuration
-    exporter_id = -1
-    for i,conf in enumerate(prometheus_conf['scrape_configs']):
-        if(old!=None):
-            if( conf['job_name']==old.name ):
-                exporter_id = i
-    
+# --------------------
+def _prometheus_job(db_col):
+    ''' Build the Prometheus scrape job of a collector.\n
+    `db_col` (schema.collector): The collector information.\n
+    return `ex_data` (dict): The scrape job.\n
+    '''
     # Write data into correct format
     ex_data = { 'job_name': db_col.name,
         'scrape_interval': f"{db_col.update_period}s", 
         'static_configs':[{'labels':{'group':db_col.name},'targets': 
         [f"{db_col.ip}:{db_col.opcua_port}",f"{db_col.ip}:{db_col.health_port}"]}]
     }
-    # Insert data in prometheus structure
-    if (exporter_id!=-1):
-        prometheus_conf['scrape_configs'][exporter_id] = ex_data
+    return(ex_data)
+# --------------------
+
+# --------------------
+def _update_prometheus_conf(old,db_col,ex_data:dict=None):
+    ''' Load the existing Prometheus configuration and update it.\n
+    `old` (schema.collector): The collector information before the change.\n
+    `db_col` (schema.collector): The collector information.\n
+    `ex_data` (dict): The scrape job to use, `None` to build it from `db_col`.\n
+    return `prometheus_conf` (dict): The `prometheus.yml` file updated for
+    this collector.\n
+    '''
+    if (ex_data is None):
+        ex_data = _prometheus_job(db_col)
+    old_name = old.name if (old is not None) else None
+    prom_file = prometheus.get_file(db_col)
+
+    if (Env.PROMETHEUS_MODE=='file_sd'):
+        # Targets go to the collector file, the configuration only points to them
+        prom_file.set_target(_target_name(db_col), [{
+            'targets': ex_data['static_configs'][0]['targets'],
+            'labels': { 'job':ex_data['job_name'], 'group':ex_data['job_name'],
+                '__scrape_interval__':ex_data['scrape_interval'] }
+        }])
+        if (old_name is not None):
+            prom_file.remove_job(old_name)
+        prometheus_conf = prom_file.set_job(prometheus.SD_JOB_NAME, prometheus.file_sd_job())
     else:
-        prometheus_conf['scrape_configs'].append(ex_data)
+        prometheus_conf = prom_file.set_job(old_name, ex_data)
     
     return(prometheus_conf)
 # --------------------
 
 # --------------------
 def _delete_prometheus_conf(db_col):
-    ''' Load the existing Prometheus configuration and update it.\n
+    ''' Load the existing Prometheus configuration and remove the collector.\n
     `db_col` (schema.collector): The collector information.\n
     return `prometheus_conf` (dict): The `prometheus.yml` file updated for
     this collector.\n
     '''
+    prom_file = prometheus.get_file(db_col)
+    if (Env.PROMETHEUS_MODE=='file_sd'):
+        prom_file.remove_target(_target_name(db_col))
+    prometheus_conf = prom_file.remove_job(db_col.name)
+    
+    return(prometheus_conf)
+# --------------------
 
-    prometheus_conf = Env.DEFAULTS['Prometheus']
+# --------------------
+def _write_prometheus_file(db_col, prometheus_conf, wait:bool=True):
+    ''' Save the Prometheus configuration of the collector. Nothing is
+    written if the file already has this content.\n
+    `db_col` (models.Collector): The collector information.\n
+    `prometheus_conf` (dict): The configuration returned by `_update_prometheus_conf`
+    or `_delete_prometheus_conf`. Those changes are already kept by the cached
+    file, under its lock, so it is not assigned again here.\n
+    `wait` (bool): Wait for the write, `False` to leave it to the background.\n
+    return `written` (bool): If the file was changed, `None` when not waiting.\n
+    '''
+    prom_file = prometheus.get_file(db_col)
+    written = prom_file.write(wait)
 
-    # Read existing Prometheus File
+    return(written)
+# --------------------
+
+# --------------------
+def _remote_digest(db_col, fileurl:str):
+    ''' Compute the SHA-256 of a file already in the collector, without
+    downloading it.\n
+    `db_col` (models.Collector): The collector information.\n
+    `fileurl` (str): The file location.\n
+    return `digest` (str): The file hash, `None` if it can not be read.\n
+    '''
+    path = fsspec.core.strip_protocol(fileurl)
+    if (fsspec.utils.get_protocol(fileurl) in ('file','local')):
+        try:
+            with open(path, 'rb') as fid:
+                return(hashlib.sha256(fid.read()).hexdigest())
+        except OSError:
+            return(None)
+
+    opts = storage_options(db_col)
     try:
-        with fsspec.open(Env.PROMETHEUS_FILEURL, 'r', host=db_col.ip, 
-            port=int(db_col.ssh_port), username=db_col.ssh_user, password=db_col.ssh_pass) as fid:
-            prometheus_conf_r = yaml.safe_load(fid)
-        prometheus_conf = deep_update(prometheus_conf,prometheus_conf_r)
-    except:
-        pass
-
-    # Search for existing configuration
-    exporter_id = -1
-    for i,conf in enumerate(prometheus_conf['scrape_configs']):
-        if( conf['job_name']==db_col.name ):
-            exporter_id = i
-    
-    # Remove data from prometheus structure
-    if (exporter_id!=-1):
-        _ = prometheus_conf['scrape_configs'].pop(exporter_id)
-    
-    return(prometheus_conf)
+        client = pool.acquire(opts['host'], opts['port'], opts['username'], opts['password'])
+        try:
+            _, stdout, _ = client.exec_command(f'sha256sum -- {shlex.quote(path)}')
+            out = stdout.read().decode().split()
+        finally:
+            pool.release(opts['host'], opts['port'], opts['username'], client)
+    except Exception:
+        return(None)
+
+    return(out[0] if out else None)
 # --------------------
 
 # --------------------
-def _write_prometheus_file(db_col, prometheus_conf):
-    ''' Description \n
-    `` (): \n
-    return `` (): \n
+def _artifact_changed(db:Session, db_col, name:str, fileurl:str, digest:str):
+    ''' Check if a file must be uploaded to the collector, that is, if the same
+    content was not uploaded to the same location yet. With `CONF_EXPORT_VERIFY_REMOTE`
+    the hash of the remote file is also checked.\n
+    `db` (Session): Database session instance.\n
+    `db_col` (models.Collector): The collector information.\n
+    `name` (str): Artifact name.\n
+    `fileurl` (str): The file location.\n
+    `digest` (str): SHA-256 of the new content.\n
+    return `changed` (bool): If the file must be uploaded.\n
     '''
-    with fsspec.open(Env.PROMETHEUS_FILEURL, 'w', encoding = "utf-8", host=db_col.ip, 
-        port=int(db_col.ssh_port), username=db_col.ssh_user, password=db_col.ssh_pass) as fid:
-        p_dump = yaml.dump(prometheus_conf, allow_unicode=True, encoding=None, default_flow_style=False)
-        fid.write( p_dump )
+    last = Texport.get_artifact(db,db_col.id,name)
+    unchanged = (last is not None and last.digest==digest and last.path==fileurl)
+    if (unchanged and Env.EXPORT_VERIFY_REMOTE=='1'):
+        unchanged = (_remote_digest(db_col,fileurl)==digest)
+
+    return(not unchanged)
 # --------------------
 
 # --------------------
-def export_gateway(id:int,db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
-    ''' Export active database entries as a Forte OPC-UA gateway fboot file.\n
-    return `res` (JSONResponse): A `bool` automatically parser into
-    a HTTP_OK response.\n
+def _previous_content(db:Session, db_col, name:str, fileurl:str):
+    ''' Get the content last uploaded to a collector file from the artifact
+    store, to restore it if a deploy is interrupted.\n
+    `db` (Session): Database session instance.\n
+    `db_col` (models.Collector): The collector information.\n
+    `name` (str): Artifact name.\n
+    `fileurl` (str): The file location.\n
+    return `content` (bytes): The file content, `None` if it is not known.\n
     '''
-    res = False
-    dp_upload = []
+    last = Texport.get_artifact(db,db_col.id,name)
+    if (last is None or last.path!=fileurl or not store.exists(last.digest)):
+        return(None)
+    return(store.get(last.digest))
+# --------------------
+
+# --------------------
+def _export_source(db:Session, val_col):
+    ''' Load the datapoints exported by a collector and hash everything its
+    built files depend on, so two exports with the same digest produce
+    the same files.\n
+    `db` (Session): Database session instance.\n
+    `val_col` (models.Collector): The collector.\n
+    return `export_list` (list): The `(schemas.dataSource, [schemas.dataPoint])`
+    exported.\n
+    return `export_data` (list): The same items as dictionaries.\n
+    return `digest` (str): SHA-256 of the export source.\n
+    '''
+    parsed_col = Tcollector._parse_collector(val_col)
+    export_list = Tdatasource.get_export_datapoints(db,val_col.id)
+    # The upload flag is changed by the deploy itself, it is not part of the files
+    export_data = [ (ds.dict(), [ dp.dict(exclude={'upload'}) for dp in dp_list ]) for ds, dp_list in export_list ]
+
+    source = {
+        'update_period': parsed_col.update_period,
+        'prj_path': parsed_col.prj_path,
+        'files': [Env.GATEWAY_FBOOT_LOCATION, Env.EXPORTER_CONFIG_LOCATION],
+        'prometheus': _prometheus_job(parsed_col),
+        'data': export_data
+    }
+    digest = hashlib.sha256(json.dumps(source, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    return(export_list, export_data, digest)
+# --------------------
+
+# --------------------
+def _get_changed_ids(db:Session):
+    ''' Find the collectors whose export would not produce the files of their
+    current version, or that were never deployed.\n
+    `db` (Session): Database session instance.\n
+    return `ids` (list): The collector ids.\n
+    '''
+    current = Texport.get_current_bundles(db)
+    ids = []
+    for val_col in Tcollector.get_all(db):
+        _, _, digest = _export_source(db,val_col)
+        db_bundle = current.get(val_col.id)
+        if (db_bundle is None or db_bundle.source!=digest):
+            ids.append(val_col.id)
+
+    return(sorted(ids))
+# --------------------
+
+# --------------------
+def build_export(db:Session, val_col, progress):
+    ''' Generate the Forte OPC-UA gateway files of a collector from the active
+    database entries and keep them in the artifact store.\n
+    `db` (Session): Database session instance.\n
+    `val_col` (models.Collector): The collector to build.\n
+    `progress` (callable): Called as `progress(stage, done, total)` on each step.\n
+    return `db_bundle` (models.ExportBundle): The built files.\n
+    '''
+    parsed_col = Tcollector._parse_collector(val_col)
+
+    # Get the exported datasources and datapoints of this collector
+    progress('query')
+    export_list, export_data, source = _export_source(db,val_col)
+    dp_names = [ dp.name for _, dp_list in export_list for dp in dp_list ]
+
+    # Create the Forte project and the OPCUA configuration file
+    progress('generate', 0, len(dp_names))
+    fboot_content, opcua_content = export_worker.run_cpu(builder.build_gateway_files,
+        parsed_col.update_period*1000, export_data, os.path.basename(Env.GATEWAY_FBOOT_LOCATION))
+    prometheus_content = yaml.dump({'scrape_configs':[_prometheus_job(parsed_col)]},
+        allow_unicode=True, encoding=None, default_flow_style=False).encode('utf-8')
+    progress('generate', len(dp_names), len(dp_names))
+
+    # Keep the files and the datapoints they export
+    progress('store')
+    digests = {
+        'fboot': store.put(fboot_content),
+        'opcua': store.put(opcua_content),
+        'prometheus': store.put(prometheus_content),
+        'datapoints': store.put(json.dumps(dp_names).encode('utf-8')),
+        'source': source
+    }
+    db_bundle = Texport.save_bundle(db,val_col.id,digests)
+
+    return(db_bundle)
+# --------------------
+
+# --------------------
+def deploy_bundle(db:Session, val_col, db_bundle, progress, rollback:bool=False):
+    ''' Upload the files of a built bundle to the collector. The changed gateway
+    files are uploaded at the same time over one SSH connection to temporary
+    names and renamed into place only when all of them were uploaded, so the
+    fboot and the exporter configuration always match. The Prometheus file is read meanwhile and
+    written once they are in place, if it fails they are put back.
+    Files with the same content as in the last export are not uploaded again.\n
+    `db` (Session): Database session instance.\n
+    `val_col` (models.Collector): The collector to deploy.\n
+    `db_bundle` (models.ExportBundle): The files to upload.\n
+    `progress` (callable): Called as `progress(stage, done, total)` on each step.\n
+    `rollback` (bool): Deploying an older bundle, so the datapoints exported after
+    it are not uploaded anymore.\n
+    return `artifacts` (dict): The state of each file.\n
+    '''
+    parsed_col = Tcollector._parse_collector(val_col)
+
+    files = {
+        'fboot': (os.path.join('ssh://'+parsed_col.prj_path,Env.GATEWAY_FBOOT_LOCATION), db_bundle.fboot),
+        'opcua': (os.path.join('ssh://'+parsed_col.prj_path,Env.EXPORTER_CONFIG_LOCATION), db_bundle.opcua)
+    }
+    changed = [ name for name, (fileurl, digest) in files.items()
+        if _artifact_changed(db,val_col,name,fileurl,digest) ]
+    artifacts = { name:('uploaded' if name in changed else 'unchanged') for name in files }
+
+    ex_data = yaml.safe_load(store.get(db_bundle.prometheus))['scrape_configs'][0]
+
+    progress('upload', 0, len(changed))
+    session = contextlib.nullcontext((None, None))
+    if (len(changed)>0):
+        session = open_filesystem(files[changed[0]][0], **storage_options(val_col))
+    with session as (fs, _), ThreadPoolExecutor(max_workers=1) as executor, deploy.Deployment(fs) as deployment:
+        # Read the Prometheus file while the gateway files are uploaded
+        prometheus_load = executor.submit(prometheus.get_file(val_col).load)
+
+        for name in changed:
+            fileurl, digest = files[name]
+            deployment.stage(fsspec.core.strip_protocol(fileurl), store.get(digest),
+                _previous_content(db,val_col,name,fileurl))
+        deployment.wait(lambda done: progress('upload', done, len(changed)))
+        prometheus_load.result()
+
+        # The Prometheus job only changes once the gateway files are in place,
+        # and they are put back if it can not be written
+        progress('commit', 0, len(changed))
+        deployment.commit()
+        try:
+            written = _write_prometheus_file(val_col, _update_prometheus_conf(parsed_col,val_col,ex_data))
+        except:
+            deployment.revert()
+            raise
+    for name in changed:
+        Texport.save_artifact(db,val_col.id,name,*files[name])
+    artifacts['prometheus'] = 'uploaded' if written else 'unchanged'
+
+    dp_names = json.loads(store.get(db_bundle.datapoints))
+    progress('confirm', 0, len(dp_names))
+    if rollback:
+        Tdatapoint.set_uploaded_datapoints(db, val_col.id, dp_names)
+    else:
+        Tdatapoint.confirm_upload_datapoints(db, dp_names, True)
+
+    return(artifacts)
+# --------------------
+
+# --------------------
+def run_export(db:Session, val_col, progress, mode:str='export', bundle_id:int=None):
+    ''' Run an export job of a collector: build its files, deploy an already
+    built bundle, or both. Each deployed bundle is recorded as a version of
+    the collector.\n
+    `db` (Session): Database session instance.\n
+    `val_col` (models.Collector): The collector to export.\n
+    `progress` (callable): Called as `progress(stage, done, total)` on each step.\n
+    `mode` (str): `"export"` to build and deploy, `"build"`, `"deploy"` or
+    `"rollback"` to deploy an older bundle. Any bundle older than the last one
+    built is deployed as a rollback.\n
+    `bundle_id` (int): Bundle to deploy, `None` for the last one built.\n
+    return `report` (schemas.exportReport): The state of each file.\n
+    '''
+    if (mode in ('export','build')):
+        db_bundle = build_export(db,val_col,progress)
+        artifacts = { name:'built' for name in ('fboot','opcua','prometheus') }
+    else:
+        db_bundle = _get_collector_bundle(db,val_col.id,bundle_id)
+        if (db_bundle is None):
+            raise ValueError('Invalid bundle for this collector.')
+
+    if (mode in ('export','deploy','rollback')):
+        # Deploying a bundle older than the last one built undoes the newer ones,
+        # whichever route asked for it
+        rollback = (mode=='rollback' or db_bundle.id!=Texport.get_last_bundle(db,val_col.id).id)
+        artifacts = deploy_bundle(db,val_col,db_bundle,progress,rollback)
+        Texport.save_deployment(db,val_col.id,db_bundle.id,rollback)
+
+    report = schemas.exportReport(success=True, artifacts=artifacts, bundle_id=db_bundle.id)
+    return(report)
+# --------------------
+
+# --------------------
+def _get_collector_bundle(db:Session, col_id:int, bundle_id:int=None):
+    ''' Get a bundle of a collector.\n
+    `db` (Session): Database session instance.\n
+    `col_id` (int): Collector id.\n
+    `bundle_id` (int): Bundle id, `None` for the last one built.\n
+    return `db_bundle` (models.ExportBundle): The bundle, `None` if it does not
+    exist or belongs to another collector.\n
+    '''
+    if (bundle_id is None):
+        return(Texport.get_last_bundle(db,col_id))
+
+    db_bundle = Texport.get_bundle(db,bundle_id)
+    if (db_bundle is not None and db_bundle.collector_id!=col_id):
+        db_bundle = None
+    return(db_bundle)
+# --------------------
 
+export_worker = jobs.ExportWorker(run_export)
+'''`export_worker` (jobs.ExportWorker): Runs the export jobs.'''
+
+auto_deployer = autodeploy.AutoDeployer(export_worker.submit)
+'''`auto_deployer` (autodeploy.AutoDeployer): Exports the collectors with `auto_deploy`
+after their changes.'''
+
+# --------------------
+def export_gateway(id:int, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Queue the export of the active database entries as a Forte OPC-UA gateway
+    fboot file. Follow it on `/export/jobs/{id}`.\n
+    `id` (int): The Collector ID.\n
+    return `job` (JSONResponse): The queued `schemas.exportJob` automatically parsed into
+    a HTTP_ACCEPTED response.\n
+    '''
     val_col = Tcollector.get_by_id(db,id)
     if val_col==None:
         raise HTTPException(status_code=404, detail=f"Error searching for Collector to Export. Invalid ID.")
-    
-    parsed_col = Tcollector._parse_collector(val_col)
 
-    # Create the 4diac Gateway Project
-    prj_4diac = MonoGatewayProject(parsed_col.update_period*1000)
+    db_job = export_worker.submit(db,id)
+
+    job = Texport._parse_job(db_job)
+    return(job)
+# --------------------
+
+# --------------------
+def build_gateway(id:int, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Queue the build of the gateway files of a collector into the artifact
+    store, without uploading them. Follow it on `/export/jobs/{id}`.\n
+    `id` (int): The Collector ID.\n
+    return `job` (JSONResponse): The queued `schemas.exportJob` automatically parsed into
+    a HTTP_ACCEPTED response.\n
+    '''
+    val_col = Tcollector.get_by_id(db,id)
+    if val_col==None:
+        raise HTTPException(status_code=404, detail=f"Error searching for Collector to Build. Invalid ID.")
+
+    db_job = export_worker.submit(db,id,'build')
+
+    job = Texport._parse_job(db_job)
+    return(job)
+# --------------------
+
+# --------------------
+def deploy_gateway(id:int, bundle_id:Union[int,None]=None, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Queue the upload of an already built bundle, without generating it
+    again. Follow it on `/export/jobs/{id}`.\n
+    `id` (int): The Collector ID.\n
+    `bundle_id` (int): The bundle to upload, the last one built if not given.\n
+    return `job` (JSONResponse): The queued `schemas.exportJob` automatically parsed into
+    a HTTP_ACCEPTED response.\n
+    '''
+    val_col = Tcollector.get_by_id(db,id)
+    if val_col==None:
+        raise HTTPException(status_code=404, detail=f"Error searching for Collector to Deploy. Invalid ID.")
+    db_bundle = _get_collector_bundle(db,id,bundle_id)
+    if db_bundle==None:
+        raise HTTPException(status_code=404, detail=f"Error searching for Bundle to Deploy. Invalid ID.")
+
+    db_job = export_worker.submit(db,id,'deploy',db_bundle.id)
+
+    job = Texport._parse_job(db_job)
+    return(job)
+# --------------------
+
+# --------------------
+def get_collector_bundles(id:int, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Get the bundles built for a collector.\n
+    `id` (int): The Collector ID.\n
+    return `bundles` (JSONResponse): The `schemas.exportBundle` items, newest first,
+    automatically parsed into a HTTP_OK response.\n
+    '''
+    val_col = Tcollector.get_by_id(db,id)
+    if val_col==None:
+        raise HTTPException(status_code=404, detail=f"Error searching for Collector. Invalid ID.")
+
+    bundle_list = [ Texport._parse_bundle(db_bundle) for db_bundle in Texport.get_bundles(db,id) ]
+    return(bundle_list)
+# --------------------
+
+# --------------------
+def get_collector_versions(id:int, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Get the versions deployed to a collector. The newest one is the
+    `current` version.\n
+    `id` (int): The Collector ID.\n
+    return `versions` (JSONResponse): The `schemas.exportVersion` items, newest first,
+    automatically parsed into a HTTP_OK response.\n
+    '''
+    val_col = Tcollector.get_by_id(db,id)
+    if val_col==None:
+        raise HTTPException(status_code=404, detail=f"Error searching for Collector. Invalid ID.")
+
+    version_list = [ Texport._parse_deployment(db_dep, db_bundle, i==0)
+        for i, (db_dep, db_bundle) in enumerate(Texport.get_deployments(db,id)) ]
+    return(version_list)
+# --------------------
+
+# --------------------
+def _get_rollback_bundle(db:Session, col_id:int, version:int=None):
+    ''' Get the bundle of a version deployed to a collector.\n
+    `db` (Session): Database session instance.\n
+    `col_id` (int): Collector id.\n
+    `version` (int): Version id, `None` for the last version different from
+    the current one.\n
+    return `db_bundle` (models.ExportBundle): The bundle, `None` if there is
+    no such version.\n
+    '''
+    deployments = Texport.get_deployments(db,col_id)
+    if (version is not None):
+        return(next(( db_bundle for db_dep, db_bundle in deployments if db_dep.id==version ), None))
+
+    if (len(deployments)==0):
+        return(None)
+    current = deployments[0][1]
+    return(next(( db_bundle for _, db_bundle in deployments if db_bundle.id!=current.id ), None))
+# --------------------
+
+# --------------------
+def rollback_gateway(id:int, version:Union[int,None]=None, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Queue the deploy of a version previously deployed to a collector, with
+    its stored files, without generating them again. Only the files that differ
+    from the current version are uploaded. Follow it on `/export/jobs/{id}`.\n
+    `id` (int): The Collector ID.\n
+    `version` (int): The version to deploy, the one before the current if not given.\n
+    return `job` (JSONResponse): The queued `schemas.exportJob` automatically parsed into
+    a HTTP_ACCEPTED response.\n
+    '''
+    val_col = Tcollector.get_by_id(db,id)
+    if val_col==None:
+        raise HTTPException(status_code=404, detail=f"Error searching for Collector to Rollback. Invalid ID.")
+    db_bundle = _get_rollback_bundle(db,id,version)
+    if db_bundle==None:
+        raise HTTPException(status_code=404, detail=f"Error searching for Version to Rollback. Invalid ID.")
+
+    db_job = export_worker.submit(db,id,'rollback',db_bundle.id)
+
+    job = Texport._parse_job(db_job)
+    return(job)
+# --------------------
+
+# --------------------
+def _bundle_files(db_bundle):
+    ''' List the files of a bundle with their path in the gateway project.\n
+    `db_bundle` (models.ExportBundle): The bundle.\n
+    return `files` (list): Pairs of path and content.\n
+    '''
+    manifest = Texport._parse_bundle(db_bundle).json(indent=2)
+    files = [
+        (Env.GATEWAY_FBOOT_LOCATION, store.get(db_bundle.fboot)),
+        (Env.EXPORTER_CONFIG_LOCATION, store.get(db_bundle.opcua)),
+        ('prometheus/scrape_config.yml', store.get(db_bundle.prometheus)),
+        ('datapoints.json', store.get(db_bundle.datapoints)),
+        ('manifest.json', manifest.encode('utf-8'))
+    ]
+    return(files)
+# --------------------
 
-    # Create OPCUA configuration file
-    opcua_conf = { 'endPoint':f'opc.tcp://forte_server:4840', 'nodes':[] }
+# --------------------
+def download_bundle(id:int, format:str=Query(default='tar', regex='^(tar|zip)$'), db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Download the files of a bundle as an archive, laid out as in the
+    gateway project, to inspect them or install them by hand.\n
+    `id` (int): The bundle ID.\n
+    `format` (str): `"tar"` for a `.tar.gz` or `"zip"`.\n
+    return (Response): The archive.\n
+    '''
+    db_bundle = Texport.get_bundle(db,id)
+    if (db_bundle is None):
+        raise HTTPException(status_code=404, detail=f"Error searching for Bundle. Invalid ID.")
 
     try:
-        # Get active datasources
-        ds_list = Tdatasource.get_datasources_active(db)
-        for ds in ds_list:
-            # Filter datasources for the ones in this collector
-            if ds.collector_id!=val_col.id:
-                continue
-            # Filter datasources for confirmed ones
-            if ds.pending:
-                continue
-            
-            # Get the datapoints from this datasource
-            dp_list = Tdatapoint.get_datapoints_from_datasource(db,ds.name)
-            for dp in dp_list:
-                
-                # Filter datapoints for active ones
-                if dp.active and not dp.pending:
-                    # Get specific informations
-                    dp = Tdatapoint._get_datapoint_implementation(db,dp.access.name,dp.name)
-                    dp = Tdatapoint._parse_datapoint(dp)
-                    # Create communication blocks and associate them with an OPC variable
-                    comFB = prj_4diac.build_comm_block(ds.dict(),dp.dict())
-                    prj_4diac.addVariable(dp.name,comFB)
-                    # Create corresponding Node on OPCUA
-                    opcua_conf['nodes'].append({
-                        'nodeName':f'ns={1};s={dp.name}',
-                        'metricName':f'{dp.name}',
-                        'metricHelp':f'{dp.description}'
-                    })
-                    dp_upload.append(dp)
-
-        # Insert one more node with the pre-defined observability variable
-        opcua_conf['nodes'].append({
-            'nodeName':'ns=1;s=_ForteCycleTime',
-            'metricName':'_ForteCycleTime',
-            'metricHelp':'Tempo de leitura das variavies do Forte'
-        })
-
-        # Get the updated prometheus configuration
-        prometheus_conf = _update_prometheus_conf(parsed_col,val_col)
-        
-        # Write Forte project remote
-        fboot_fileurl = os.path.join('ssh://'+parsed_col.prj_path,Env.GATEWAY_FBOOT_LOCATION)
-        prj_4diac.write_fboot(fboot_fileurl, overwrite=True,
-            host=val_col.ip, port=int(val_col.ssh_port),
-            username=val_col.ssh_user, password=val_col.ssh_pass)
-        # Write OPC configuration remote
-        opcua_fileurl = os.path.join('ssh://'+parsed_col.prj_path,Env.EXPORTER_CONFIG_LOCATION)
-        with fsspec.open(opcua_fileurl, "w", encoding = "utf-8", host=val_col.ip, 
-            port=int(val_col.ssh_port), username=val_col.ssh_user, password=val_col.ssh_pass) as fid:
-            dump =  yaml.dump(opcua_conf, allow_unicode=True, encoding=None)
-            fid.write( dump )        
-        # Write Prometheus File        
-        _write_prometheus_file(val_col, prometheus_conf)
-
-        # Return Status
-        res = True
-
-    except Exception as exc:
-        msg = str(exc).split('\n')[0]
-        msg = f'Export Error: "{msg}"'
-        raise HTTPException(status_code=520, detail=msg)
-
-    if(res):
-        for dp in dp_upload:
-            # Get specific informations
-            _ = Tdatapoint.confirm_upload_datapoint(db,dp.name,True)
-
-    return(res)
+        files = _bundle_files(db_bundle)
+    except OSError:
+        raise HTTPException(status_code=410, detail=f"Bundle files are no longer in the artifact store.")
+
+    buffer = io.BytesIO()
+    if (format=='zip'):
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for path, content in files:
+                archive.writestr(path, content)
+        filename, media_type = f'bundle_{db_bundle.id}.zip', 'application/zip'
+    else:
+        mtime = db_bundle.created_at.replace(tzinfo=timezone.utc).timestamp()
+        with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+            for path, content in files:
+                info = tarfile.TarInfo(path)
+                info.size = len(content)
+                info.mtime = mtime
+                archive.addfile(info, io.BytesIO(content))
+        filename, media_type = f'bundle_{db_bundle.id}.tar.gz', 'application/gzip'
+
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    return(Response(content=buffer.getvalue(), media_type=media_type, headers=headers))
+# --------------------
+
+# --------------------
+def export_collectors(fleet:schemas.fleetExport, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Queue the export of several collectors. They run in parallel, up to
+    `CONF_EXPORT_WORKERS` at the same time, and each one can be followed on
+    `/export/jobs/{id}` or all of them on `/export/jobs`.\n
+    `fleet` (schemas.fleetExport): The collector IDs and/or `pending` to export
+    every collector whose current data differs from its deployed version.\n
+    return `jobs` (JSONResponse): The queued `schemas.exportJob` of each collector
+    automatically parsed into a HTTP_ACCEPTED response.\n
+    '''
+    ids = list(fleet.ids or [])
+    if fleet.pending:
+        ids += _get_changed_ids(db)
+    ids = list(dict.fromkeys(ids))
+
+    missing = [ id for id in ids if Tcollector.get_by_id(db,id) is None ]
+    if (len(missing)>0):
+        raise HTTPException(status_code=404, detail=f"Error searching for Collectors to Export. Invalid IDs {missing}.")
+
+    job_list = [ Texport._parse_job(export_worker.submit(db,id)) for id in ids ]
+    return(job_list)
+# --------------------
+
+# --------------------
+def get_export_jobs(ids:List[int]=Query(default=[]), db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Get the state of several export jobs, like the ones of a fleet export.\n
+    `ids` (list): The job IDs.\n
+    return `jobs` (JSONResponse): The `schemas.exportJob` found automatically parsed into
+    a HTTP_OK response.\n
+    '''
+    job_list = [ Texport._parse_job(db_job) for db_job in Texport.get_jobs(db,ids) ]
+    return(job_list)
+# --------------------
+
+# --------------------
+async def get_export_job(id:int, wait:float=Query(default=0, ge=0, le=60), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Get the state of an export job.\n
+    `id` (int): The job ID.\n
+    `wait` (float): Seconds to wait for a change before answering, if the job is
+    not finished. Allows long polling.\n
+    return `job` (JSONResponse): The `schemas.exportJob` automatically parsed into
+    a HTTP_OK response.\n
+    '''
+    version = export_worker.version(id)
+    job = await asyncio.to_thread(_read_job, id)
+    if (job is None):
+        raise HTTPException(status_code=404, detail=f"Error searching for Export job.")
+
+    # Wait on the event loop, so long polls do not hold the request threads
+    if (wait>0 and job.status not in jobs.FINISHED):
+        await export_worker.wait_change(id, version, wait)
+        job = await asyncio.to_thread(_read_job, id)
+
+    return(job)
+# --------------------
+
+# --------------------
+def _read_job(id:int):
+    ''' Read an export job in its own session.\n
+    `id` (int): The job ID.\n
+    return `job` (schemas.exportJob): The job, `None` if it does not exist.\n
+    '''
+    with SessionManager() as db:
+        db_job = Texport.get_job(db,id)
+        job = Texport._parse_job(db_job) if (db_job is not None) else None
+    return(job)
+# --------------------
+
+# --------------------
+async def stream_export_job(id:int, usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Follow an export job as Server-Sent Events. One event is sent on each
+    change until the job finishes.\n
+    `id` (int): The job ID.\n
+    return (StreamingResponse): The `text/event-stream` of `schemas.exportJob`.\n
+    '''
+    job = await asyncio.to_thread(_read_job, id)
+    if (job is None):
+        raise HTTPException(status_code=404, detail=f"Error searching for Export job.")
+
+    async def _events():
+        version = export_worker.version(id)
+        job = await asyncio.to_thread(_read_job, id)
+        while True:
+            yield f'data: {job.json()}\n\n'
+            if (job.status in jobs.FINISHED):
+                break
+            version = await export_worker.wait_change(id, version, 15)
+            job = await asyncio.to_thread(_read_job, id)
+
+    return(StreamingResponse(_events(), media_type='text/event-stream'))
 # --------------------
@@ -0,0 +1,57 @@
+'''
+This module contaims the schemas
+expected in HTTP responses.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* pydantic
+'''
+
+# Import system libs
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Dict, List, Union
+
+#######################################
+
+class exportReport(BaseModel):
+    success: bool
+    artifacts: Dict[str,str]
+    bundle_id: Union[int,None] = None
+
+class exportJob(BaseModel):
+    id: int
+    collector_id: int
+    status: str
+    stage: Union[str,None]
+    progress: int
+    total: int
+    timings: Dict[str,float]
+    report: Union[exportReport,None]
+    error: Union[str,None]
+    mode: str
+    bundle_id: Union[int,None]
+    created_at: datetime
+    started_at: Union[datetime,None]
+    finished_at: Union[datetime,None]
+
+class fleetExport(BaseModel):
+    ids: Union[List[int],None] = None
+    pending: bool = False
+
+class exportBundle(BaseModel):
+    id: int
+    collector_id: int
+    fboot: str
+    opcua: str
+    prometheus: str
+    datapoints: str
+    source: Union[str,None] = None
+    created_at: datetime
+
+class exportVersion(BaseModel):
+    id: int
+    collector_id: int
+    bundle: exportBundle
+    rollback: bool
+    current: bool
+    deployed_at: datetime
@@ -0,0 +1,94 @@
+'''
+This module keeps the generated export files
+in a local content-addressed store, so every
+exported version can be deployed again.\n
+Copyright (c) 2017 Aimirim STI.\n
+'''
+
+# Import system libs
+import os
+import gzip
+import uuid
+import hashlib
+
+# Import custom libs
+from ..env import Enviroment as Env
+
+#######################################
+
+class ArtifactStore:
+    ''' Files saved by the SHA-256 of their content, so the same content is
+    stored only once and never changes after written. The files are kept gzip
+    compressed.\n
+    '''
+
+    def __init__(self, root:str):
+        self.root = root
+        '''`root` (str): Folder of the store.'''
+
+    # --------------------
+    def path(self, digest:str):
+        ''' Location of a stored file.\n
+        `digest` (str): SHA-256 of the content.\n
+        return `path` (str): The compressed file path.\n
+        '''
+        return(os.path.join(self.root, digest[:2], digest+'.gz'))
+    # --------------------
+
+    # --------------------
+    def exists(self, digest:str):
+        ''' Check if a content is stored.\n
+        `digest` (str): SHA-256 of the content.\n
+        return (bool): If the file exists.\n
+        '''
+        return(os.path.isfile(self.path(digest)))
+    # --------------------
+
+    # --------------------
+    def put(self, content:bytes):
+        ''' Save a content, if it is not stored yet. The file is written to a
+        temporary name and renamed, so a stored file is always complete.\n
+        `content` (bytes): The file content.\n
+        return `digest` (str): SHA-256 of the content.\n
+        '''
+        digest = hashlib.sha256(content).hexdigest()
+        if self.exists(digest):
+            return(digest)
+
+        path = self.path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'wb') as fid:
+            fid.write(gzip.compress(content, mtime=0))
+        os.replace(tmp_path, path)
+
+        return(digest)
+    # --------------------
+
+    # --------------------
+    def get(self, digest:str):
+        ''' Read a stored content.\n
+        `digest` (str): SHA-256 of the content.\n
+        return `content` (bytes): The file content.\n
+        '''
+        if not self.exists(digest):
+            raise FileNotFoundError(f'Artifact {digest} is not stored.')
+
+        with open(self.path(digest), 'rb') as fid:
+            content = gzip.decompress(fid.read())
+        return(content)
+    # --------------------
+
+    # --------------------
+    def remove(self, digest:str):
+        ''' Delete a stored content, if it is stored.\n
+        `digest` (str): SHA-256 of the content.\n
+        '''
+        try:
+            os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
+    # --------------------
+
+store = ArtifactStore(Env.ARTIFACT_STORE_LOCATION)
+'''`store` (ArtifactStore): The store of the export files.'''
@@ -9,11 +9,12 @@ Copyright (c) 2017 Aimirim STI.\n
 # Import system libs
 from typing import Dict, List
 from fastapi import FastAPI
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 
 # Import custom libs
 from . import AppInfo
-from . import database
+from . import migrations
 from .env import Enviroment as Env
 from .crud import Tuser
 from .database import SessionManager, engine
@@ -25,6 +26,9 @@ from .plc_datapoint import schemas as dp_schemas
 from .plc_datapoint import routes as dp_routes
 from .collector import schemas as col_schemas
 from .collector import routes as col_routes
+from .collector.monitor import monitor
+from .ssh_pool import pool, register_filesystems
+from .fboot_gen import schemas as fboot_schemas
 from .fboot_gen import routes as fboot_routes
 from .com_test import schemas as com_schemas
 from .com_test import routes as com_routes
@@ -32,7 +36,8 @@ from .com_test import routes as com_routes
 
 #######################################
 
-database.Base.metadata.create_all(bind=engine)
+migrations.run_migrations(engine)
+migrations.check_search_index(engine)
 
 app = FastAPI(root_path=f"{Env.API_NAME}", **AppInfo.__dict__)
 
@@ -42,8 +47,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Next-Cursor"],
 )
 
+app.add_event_handler("startup", register_filesystems)
+app.add_event_handler("startup", monitor.start)
+app.add_event_handler("shutdown", monitor.stop)
+app.add_event_handler("shutdown", pool.close_all)
+app.add_event_handler("startup", fboot_routes.export_worker.start)
+app.add_event_handler("startup", fboot_routes.auto_deployer.start)
+app.add_event_handler("shutdown", fboot_routes.auto_deployer.stop)
+app.add_event_handler("shutdown", fboot_routes.export_worker.stop)
+
 with SessionManager() as db:
     # Check for users and create a default one if empty
     if (len(Tuser.get_all(db))==0):
@@ -91,6 +106,10 @@ app.add_api_route("/collector/{id}/status",
     methods=["GET"], response_model=col_schemas.collectorStatus,
     endpoint=col_routes.check_collector_status)
 
+app.add_api_route("/collector/{id}/history",
+    methods=["GET"], response_model=col_schemas.collectorHistory,
+    endpoint=col_routes.get_collector_history)
+
 app.add_api_route("/collector/{id}/check",
     methods=["GET"], response_model=col_schemas.collector,
     endpoint=col_routes.check_collector_access)
@@ -111,6 +130,9 @@ app.add_api_route("/collectors/status",
     methods=["GET"], response_model=List[col_schemas.collectorStatus],
     endpoint=col_routes.check_collectors_status)
 
+app.add_api_websocket_route("/collectors/status/ws",
+    endpoint=col_routes.collectors_status_ws)
+
 ### DataSources
 app.add_api_route("/datasource",
     methods=["POST"], response_model=ds_schemas.dataSource,
@@ -140,6 +162,10 @@ app.add_api_route("/datasources/range/{ini}-{end}",
     methods=["GET"], response_model=List[ds_schemas.dataSource],
     endpoint=ds_routes.get_datasources_by_range)
 
+app.add_api_route("/datasources/page",
+    methods=["GET"], response_model=List[ds_schemas.dataSource],
+    endpoint=ds_routes.get_datasources_page)
+
 app.add_api_route("/datasources/pending",
     methods=["GET"], response_model=List[ds_schemas.dataSource],
     endpoint=ds_routes.get_datasources_pending)
@@ -152,6 +178,14 @@ app.add_api_route("/datasource/{ds_name}/confirm",
     methods=["PUT"], response_model=Dict[str,bool],
     endpoint=ds_routes.confirm_datasources)
 
+app.add_api_route("/datasources/bulk/active/{active}",
+    methods=["PUT"], response_model=Dict[str,int],
+    endpoint=ds_routes.change_datasources_active_status)
+
+app.add_api_route("/datasources/bulk/confirm",
+    methods=["PUT"], response_model=Dict[str,int],
+    endpoint=ds_routes.confirm_datasources_bulk)
+
 ### DataPoints
 app.add_api_route("/datapoint",
     methods=["POST"], response_model=dp_schemas.dataPoint,
@@ -161,6 +195,10 @@ app.add_api_route("/datapoint",
     methods=["PUT"], response_model=dp_schemas.dataPoint,
     endpoint=dp_routes.update_datapoint)
 
+app.add_api_route("/datapoints/bulk",
+    methods=["POST"], response_model=List[dp_schemas.bulkItemStatus],
+    endpoint=dp_routes.bulk_create_datapoints)
+
 app.add_api_route("/datapoint/{dp_name}",
     methods=["GET"], response_model=dp_schemas.dataPoint,
     endpoint=dp_routes.get_datapoint_by_name)
@@ -181,6 +219,14 @@ app.add_api_route("/datapoints/range/{ini}-{end}",
     methods=["GET"], response_model=List[dp_schemas.dataPoint],
     endpoint=dp_routes.get_datapoints_by_range)
 
+app.add_api_route("/datapoints/page",
+    methods=["GET"], response_model=List[dp_schemas.dataPoint],
+    endpoint=dp_routes.get_datapoints_page)
+
+app.add_api_route("/datapoints/search",
+    methods=["GET"], response_model=List[dp_schemas.dataPoint],
+    endpoint=dp_routes.search_datapoints)
+
 app.add_api_route("/datapoints/pending",
     methods=["GET"], response_model=List[dp_schemas.dataPoint],
     endpoint=dp_routes.get_datapoints_pending)
@@ -193,11 +239,67 @@ app.add_api_route("/datapoint/{dp_name}/confirm/{pending}",
     methods=["PUT"], response_model=Dict[str,bool],
     endpoint=dp_routes.confirm_datapoints)
 
+app.add_api_route("/datapoints/bulk/active/{active}",
+    methods=["PUT"], response_model=Dict[str,int],
+    endpoint=dp_routes.change_datapoints_active_status)
+
+app.add_api_route("/datapoints/bulk/confirm/{pending}",
+    methods=["PUT"], response_model=Dict[str,int],
+    endpoint=dp_routes.confirm_datapoints_bulk)
+
+app.add_api_route("/datapoints/bulk/upload/{upload}",
+    methods=["PUT"], response_model=Dict[str,int],
+    endpoint=dp_routes.confirm_upload_datapoints_bulk)
+
+app.add_api_route("/datapoints/bulk/delete",
+    methods=["POST"], response_model=Dict[str,int],
+    endpoint=dp_routes.del_datapoints_bulk)
+
 ### ForteGateway
 app.add_api_route("/export/collector/{id}",
-    methods=["POST"], response_model=bool,
+    methods=["POST"], response_model=fboot_schemas.exportJob, status_code=202,
     endpoint=fboot_routes.export_gateway)
 
+app.add_api_route("/export/collector/{id}/build",
+    methods=["POST"], response_model=fboot_schemas.exportJob, status_code=202,
+    endpoint=fboot_routes.build_gateway)
+
+app.add_api_route("/export/collector/{id}/deploy",
+    methods=["POST"], response_model=fboot_schemas.exportJob, status_code=202,
+    endpoint=fboot_routes.deploy_gateway)
+
+app.add_api_route("/export/collector/{id}/bundles",
+    methods=["GET"], response_model=List[fboot_schemas.exportBundle],
+    endpoint=fboot_routes.get_collector_bundles)
+
+app.add_api_route("/export/collector/{id}/versions",
+    methods=["GET"], response_model=List[fboot_schemas.exportVersion],
+    endpoint=fboot_routes.get_collector_versions)
+
+app.add_api_route("/export/collector/{id}/rollback",
+    methods=["POST"], response_model=fboot_schemas.exportJob, status_code=202,
+    endpoint=fboot_routes.rollback_gateway)
+
+app.add_api_route("/export/bundles/{id}",
+    methods=["GET"], response_class=Response,
+    endpoint=fboot_routes.download_bundle)
+
+app.add_api_route("/export/collectors",
+    methods=["POST"], response_model=List[fboot_schemas.exportJob], status_code=202,
+    endpoint=fboot_routes.export_collectors)
+
+app.add_api_route("/export/jobs",
+    methods=["GET"], response_model=List[fboot_schemas.exportJob],
+    endpoint=fboot_routes.get_export_jobs)
+
+app.add_api_route("/export/jobs/{id}",
+    methods=["GET"], response_model=fboot_schemas.exportJob,
+    endpoint=fboot_routes.get_export_job)
+
+app.add_api_route("/export/jobs/{id}/stream",
+    methods=["GET"],
+    endpoint=fboot_routes.stream_export_job)
+
 ### Communication Tests
 app.add_api_route("/test/{dp_name}",
     methods=["POST"], response_model=com_schemas.comTest,
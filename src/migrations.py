@@ -0,0 +1,173 @@
+'''
+This module has the versioned schema
+migrations applied on startup.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* sqlalchemy
+'''
+
+# Import system libs
+from sqlalchemy import exc, inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+# Import custom libs
+from . import models
+from .database import Base
+
+#######################################
+
+SEARCH_INDEX_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS datapoints_fts USING fts5(
+        name, description, address, tag_name, datasource_name,
+        content='datapoints', content_rowid='rowid', prefix='2 3')""",
+    """CREATE TRIGGER IF NOT EXISTS datapoints_fts_ai AFTER INSERT ON datapoints BEGIN
+        INSERT INTO datapoints_fts(rowid, name, description, address, tag_name, datasource_name)
+        VALUES (new.rowid, new.name, new.description, new.address, new.tag_name, new.datasource_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS datapoints_fts_ad AFTER DELETE ON datapoints BEGIN
+        INSERT INTO datapoints_fts(datapoints_fts, rowid, name, description, address, tag_name, datasource_name)
+        VALUES ('delete', old.rowid, old.name, old.description, old.address, old.tag_name, old.datasource_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS datapoints_fts_au AFTER UPDATE OF name, description, address, tag_name, datasource_name ON datapoints BEGIN
+        INSERT INTO datapoints_fts(datapoints_fts, rowid, name, description, address, tag_name, datasource_name)
+        VALUES ('delete', old.rowid, old.name, old.description, old.address, old.tag_name, old.datasource_name);
+        INSERT INTO datapoints_fts(rowid, name, description, address, tag_name, datasource_name)
+        VALUES (new.rowid, new.name, new.description, new.address, new.tag_name, new.datasource_name);
+    END""",
+    # Index the rows created before the triggers
+    """INSERT INTO datapoints_fts(datapoints_fts) VALUES ('rebuild')""",
+]
+'''`SEARCH_INDEX_DDL` (list): The datapoints full text search table and its
+triggers as they were when migration 1 was released. It is an external content
+FTS5 table, so only the index is stored and the triggers keep it in sync with
+every insert, update and delete on `datapoints`.'''
+
+# --------------------
+def _create_search_index(conn:Connection):
+    ''' Create the datapoints full text search table and its triggers.\n
+    `conn` (Connection): Database connection inside a transaction.\n
+    '''
+    for stmt in SEARCH_INDEX_DDL:
+        conn.execute(text(stmt))
+# --------------------
+
+FILTER_INDEXES_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_datapoints_datasource_name_name ON datapoints (datasource_name, name)",
+    "CREATE INDEX IF NOT EXISTS ix_datapoints_active_name ON datapoints (active, name)",
+    "CREATE INDEX IF NOT EXISTS ix_datapoints_pending_name ON datapoints (pending, name)",
+    "CREATE INDEX IF NOT EXISTS ix_datapoints_upload ON datapoints (upload)",
+    "CREATE INDEX IF NOT EXISTS ix_datasources_collector_id_active_pending ON datasources (collector_id, active, pending)",
+    "CREATE INDEX IF NOT EXISTS ix_datasources_active_name ON datasources (active, name)",
+    "CREATE INDEX IF NOT EXISTS ix_datasources_pending_name ON datasources (pending, name)",
+    "CREATE INDEX IF NOT EXISTS ix_protocols_datasource_name ON protocols (datasource_name)",
+]
+'''`FILTER_INDEXES_DDL` (list): The indexes on filtered columns as they were
+declared in the models when migration 2 was released.'''
+
+# --------------------
+def _create_filter_indexes(conn:Connection):
+    ''' Create the indexes on filtered columns on tables that already
+    existed before they were declared.\n
+    `conn` (Connection): Database connection inside a transaction.\n
+    '''
+    for stmt in FILTER_INDEXES_DDL:
+        conn.execute(text(stmt))
+# --------------------
+
+# --------------------
+def _add_export_job_mode(conn:Connection):
+    ''' Add the export mode and bundle columns to the export jobs created
+    before them.\n
+    `conn` (Connection): Database connection inside a transaction.\n
+    '''
+    columns = { col['name'] for col in inspect(conn).get_columns('export_jobs') }
+    if ('mode' not in columns):
+        conn.execute(text("ALTER TABLE export_jobs ADD COLUMN mode VARCHAR NOT NULL DEFAULT 'export'"))
+    if ('bundle_id' not in columns):
+        conn.execute(text("ALTER TABLE export_jobs ADD COLUMN bundle_id INTEGER REFERENCES export_bundles (id)"))
+# --------------------
+
+# --------------------
+def _add_collector_auto_deploy(conn:Connection):
+    ''' Add the automatic deploy option to the collectors created before it.\n
+    `conn` (Connection): Database connection inside a transaction.\n
+    '''
+    columns = { col['name'] for col in inspect(conn).get_columns('collector') }
+    if ('auto_deploy' not in columns):
+        conn.execute(text("ALTER TABLE collector ADD COLUMN auto_deploy BOOLEAN NOT NULL DEFAULT 0"))
+# --------------------
+
+# --------------------
+def _add_export_bundle_source(conn:Connection):
+    ''' Add the source digest to the export bundles built before it.\n
+    `conn` (Connection): Database connection inside a transaction.\n
+    '''
+    columns = { col['name'] for col in inspect(conn).get_columns('export_bundles') }
+    if ('source' not in columns):
+        conn.execute(text("ALTER TABLE export_bundles ADD COLUMN source VARCHAR"))
+# --------------------
+
+MIGRATIONS = [
+    (1, 'Datapoints full text search', _create_search_index),
+    (2, 'Indexes on filtered columns', _create_filter_indexes),
+    (3, 'Export job mode and bundle', _add_export_job_mode),
+    (4, 'Collector automatic deploy', _add_collector_auto_deploy),
+    (5, 'Export bundle source digest', _add_export_bundle_source),
+]
+'''`MIGRATIONS` (list): Ordered `(version, description, function)` steps. New
+steps must be appended with the next version number and never changed
+after they are released.'''
+
+# --------------------
+def run_migrations(engine:Engine):
+    ''' Create the missing tables and apply the migrations that are not
+    registered yet, each one in its own transaction. Running it again on
+    an updated database does nothing.\n
+    `engine` (Engine): The database engine.\n
+    return `applied` (list): Versions applied in this call.\n
+    '''
+    applied = []
+
+    # New tables, including the migrations registry, come from the models
+    Base.metadata.create_all(bind=engine)
+
+    with engine.connect() as conn:
+        done = { row.version for row in conn.execute(text("SELECT version FROM schema_migrations")) }
+
+    for version, description, step in MIGRATIONS:
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            step(conn)
+            conn.execute(models.SchemaMigration.__table__.insert().values(
+                version=version, description=description))
+        applied.append(version)
+
+    # Refresh the query planner statistics after schema changes
+    if applied:
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+
+    return(applied)
+# --------------------
+
+# --------------------
+def check_search_index(engine:Engine):
+    ''' Rebuild the datapoints full text search index if it does not match the
+    `datapoints` table. The index is keyed on the implicit `rowid` of the table,
+    which is not an alias of its text primary key, so a `VACUUM` may renumber the
+    rows and leave the index pointing at the wrong ones. Run it on startup, after
+    `run_migrations`.\n
+    `engine` (Engine): The database engine.\n
+    return `rebuilt` (bool): If the index was rebuilt.\n
+    '''
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO datapoints_fts(datapoints_fts, rank) VALUES ('integrity-check', 1)"))
+    except exc.DatabaseError:
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO datapoints_fts(datapoints_fts) VALUES ('rebuild')"))
+        return(True)
+
+    return(False)
+# --------------------
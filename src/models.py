@@ -7,7 +7,8 @@ Copyright (c) 2017 Aimirim STI.\n
 '''
 
 # Import system libs
-from sqlalchemy import Column, ForeignKey, Boolean, Integer, String
+from datetime import datetime
+from sqlalchemy import Column, ForeignKey, Index, Boolean, DateTime, Integer, String
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.orm import relationship
 
@@ -25,6 +26,13 @@ class User(Base):
     change_password = Column(Boolean, default=False)
     is_admin = Column(Boolean, default=False)
 
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True)
+    description = Column(String)
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
 class Collector(Base):
     __tablename__ = "collector"
 
@@ -40,8 +48,63 @@ class Collector(Base):
     valid = Column(Boolean, default=False)
     update_period = Column(Integer)
     timeout = Column(Integer)
+    auto_deploy = Column(Boolean, nullable=False, default=False)
     # Other tables
     datasources = relationship("DataSource", back_populates="collector")# 1 to N
+
+class ExportArtifact(Base):
+    __tablename__ = "export_artifacts"
+
+    collector_id = Column(Integer, ForeignKey("collector.id"), primary_key=True)
+    name = Column(String, primary_key=True)
+    path = Column(String)
+    digest = Column(String)
+    exported_at = Column(DateTime, default=datetime.utcnow)
+
+class ExportJob(Base):
+    __tablename__ = "export_jobs"
+    __table_args__ = (
+        Index('ix_export_jobs_collector_status', 'collector_id', 'status'),
+        Index('ix_export_jobs_status', 'status'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    collector_id = Column(Integer, ForeignKey("collector.id"), nullable=False)
+    status = Column(String, nullable=False, default='queued')
+    stage = Column(String)
+    progress = Column(Integer, default=0)
+    total = Column(Integer, default=0)
+    timings = Column(String, default='{}')
+    report = Column(String)
+    error = Column(String)
+    mode = Column(String, nullable=False, default='export')
+    bundle_id = Column(Integer, ForeignKey("export_bundles.id"))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+class ExportBundle(Base):
+    __tablename__ = "export_bundles"
+
+    id = Column(Integer, primary_key=True, index=True)
+    collector_id = Column(Integer, ForeignKey("collector.id"), nullable=False, index=True)
+    # SHA-256 of each file in the artifact store
+    fboot = Column(String, nullable=False)
+    opcua = Column(String, nullable=False)
+    prometheus = Column(String, nullable=False)
+    datapoints = Column(String, nullable=False)
+    # SHA-256 of everything the files were built from
+    source = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ExportDeployment(Base):
+    __tablename__ = "export_deployments"
+
+    id = Column(Integer, primary_key=True, index=True)
+    collector_id = Column(Integer, ForeignKey("collector.id"), nullable=False, index=True)
+    bundle_id = Column(Integer, ForeignKey("export_bundles.id"), nullable=False)
+    rollback = Column(Boolean, nullable=False, default=False)
+    deployed_at = Column(DateTime, default=datetime.utcnow)
     
 # --------------------
 class DataPoint(Base):
@@ -58,8 +121,15 @@ class DataPoint(Base):
     # Other tables
     datasource = relationship("DataSource", back_populates="datapoints")# N to 1
     datasource_name = Column(Integer, ForeignKey("datasources.name"))
-    # Allow inheritance
-    __mapper_args__ = {'polymorphic_on': access}
+    # Allow inheritance and load every implementation columns at once
+    __mapper_args__ = {'polymorphic_on': access, 'with_polymorphic': '*'}
+    # Indexes for the filters and sorts used on lists and exports
+    __table_args__ = (
+        Index('ix_datapoints_datasource_name_name', 'datasource_name', 'name'),
+        Index('ix_datapoints_active_name', 'active', 'name'),
+        Index('ix_datapoints_pending_name', 'pending', 'name'),
+        Index('ix_datapoints_upload', 'upload'),
+    )
 # --------------------
 
 # --------------------
@@ -79,6 +149,12 @@ class DataSource(Base):
     datapoints = relationship("DataPoint", back_populates="datasource")# 1 to N
     collector = relationship("Collector", back_populates="datasources")# N to 1
     collector_id = Column(Integer, ForeignKey("collector.id"))
+    # Indexes for the filters and sorts used on lists and exports
+    __table_args__ = (
+        Index('ix_datasources_collector_id_active_pending', 'collector_id', 'active', 'pending'),
+        Index('ix_datasources_active_name', 'active', 'name'),
+        Index('ix_datasources_pending_name', 'pending', 'name'),
+    )
 # --------------------
 
 # --------------------
@@ -89,9 +165,9 @@ class Protocol(Base):
     name = Column(String, nullable=False)
     # Other tables
     datasource = relationship("DataSource", back_populates="protocol")# 1 to 1
-    datasource_name = Column(Integer, ForeignKey("datasources.name"))
-    # Allow inheritance
-    __mapper_args__ = {'polymorphic_on': name,'polymorphic_identity' : 'protocol'}
+    datasource_name = Column(Integer, ForeignKey("datasources.name"), index=True)
+    # Allow inheritance and load every implementation columns at once
+    __mapper_args__ = {'polymorphic_on': name,'polymorphic_identity' : 'protocol', 'with_polymorphic': '*'}
 # --------------------
 
 # --------------------
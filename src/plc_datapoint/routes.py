@@ -8,18 +8,36 @@ Copyright (c) 2017 Aimirim STI.\n
 '''
 
 # Import system libs
-from fastapi import Depends, HTTPException
+from typing import List, Literal, Union
+from fastapi import Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 
 # Import custom libs
 from . import schemas
 from ..database import get_db
+from ..env import Enviroment as Env
+from ..streaming import wants_ndjson, ndjson_response
 from ..crud import Tdatapoint
 from ..user_auth import routes as usr_routes
+from ..fboot_gen import routes as fb_routes
 
 
 #######################################
 
+# --------------------
+def _collector_ids(db:Session, flt:schemas.dataPointFilter):
+    ''' Find the collectors of the DataPoints matching a filter, so they
+    can be exported automatically after a change.\n
+    `db` (Session): Database access session.\n
+    `flt` (schemas.dataPointFilter): The changed DataPoints.\n
+    return `ids` (list): The collector ids, empty for an invalid filter.\n
+    '''
+    try:
+        ids = Tdatapoint.get_collector_ids(db, flt)
+    except ValueError:
+        ids = []
+    return(ids)
+# --------------------
 
 # --------------------
 def get_datapoint_defaults(prot_name:str, usr:str=Depends(usr_routes._check_valid_token)):
@@ -54,6 +72,30 @@ def create_datapoint(datapoint:schemas.dataPointInfo, db:Session=Depends(get_db)
         m_name = f"Data Point '{datapoint.name}'"
         raise HTTPException(status_code=404, detail=f"Error creating {m_name}.")
 
+    fb_routes.auto_deployer.touch(_collector_ids(db, schemas.dataPointFilter(names=[datapoint.name])))
+    return(val_dp)
+# --------------------
+
+# --------------------
+def bulk_create_datapoints(datapoints:List[schemas.dataPointInfo], upsert:bool=False, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Create many DataPoints, of any protocol, in a single transaction.\n
+    `datapoints` (list): List of `schemas.dataPointInfo` to create.\n
+    `upsert` (bool): Update the DataPoints that already exist.\n
+    return `val_dp` (JSONResponse): A list of `schemas.bulkItemStatus`, one per
+    item, automatically parsed into a HTTP_OK response.\n
+    '''
+    # An upserted DataPoint moved to another DataSource changes both collectors
+    names = [ datapoint.name for datapoint in datapoints ]
+    flt = schemas.dataPointFilter(names=names)
+    ids = _collector_ids(db, flt) if (len(names)>0) else []
+    try:
+        val_dp = Tdatapoint.bulk_create_datapoints(db, datapoints, upsert)
+    except Exception as exc:
+        msg = str(exc).split('\n')[0]
+        raise HTTPException(status_code=520, detail=msg)
+
+    if (len(names)>0):
+        fb_routes.auto_deployer.touch(set(ids+_collector_ids(db, flt)))
     return(val_dp)
 # --------------------
 
@@ -80,12 +122,16 @@ def update_datapoint(datapoint:schemas.dataPointInfo, db:Session=Depends(get_db)
     return `val_dp` (JSONResponse): A `schemas.datapoint` automatically parsed into
     a HTTP_OK response.\n
     '''
+    # A DataPoint moved to another DataSource changes both collectors
+    flt = schemas.dataPointFilter(names=[datapoint.name])
+    ids = _collector_ids(db, flt)
     val_dp = Tdatapoint.update_datapoint(db, datapoint)
 
     if (val_dp is None):
         m_name = f"Data Point '{datapoint.name}'"
         raise HTTPException(status_code=404, detail=f"Error updating {m_name}.")
 
+    fb_routes.auto_deployer.touch(set(ids+_collector_ids(db, flt)))
     return(val_dp)
 # --------------------
 
@@ -97,12 +143,14 @@ def change_datapoint_active_status(dp_name:str, active:bool, db:Session=Depends(
     return `val_dp` (JSONResponse): A `schemas.dataPoint` automatically parsed into
     a HTTP_OK response.\n
     '''
+    ids = _collector_ids(db, schemas.dataPointFilter(names=[dp_name]))
     val_dp = Tdatapoint.activate_datapoint(db, dp_name, active)
 
     if (val_dp is None):
         m_name = f"Data Point '{dp_name}'"
         raise HTTPException(status_code=404, detail=f"Error activating {m_name}.")
 
+    fb_routes.auto_deployer.touch(ids)
     return(val_dp)
 # --------------------
 
@@ -114,21 +162,28 @@ def confirm_datapoints(dp_name:str, pending:bool, db:Session=Depends(get_db), us
     return `val_dp` (JSONResponse): A `schemas.dataPoint` automatically parsed into
     a HTTP_OK response.\n
     '''
+    ids = _collector_ids(db, schemas.dataPointFilter(names=[dp_name]))
     val_dp = Tdatapoint.confirm_datapoint(db, dp_name, pending)
 
     if (val_dp is None):
         m_name = f"Data Point"
         raise HTTPException(status_code=404, detail=f"Error on {m_name} authorizations.")
 
+    fb_routes.auto_deployer.touch(ids)
     return(val_dp)
 # --------------------
 
 # --------------------
-def get_datapoints(db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+def get_datapoints(request:Request, stream:bool=False, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Get all datapoint entries in database.\n
+    `stream` (bool): Send the entries as NDJSON while they are read from database.
+    The same happens if the `Accept` header asks for `application/x-ndjson`.\n
     return `val_dp` (JSONResponse): A list of `schemas.dataPoint` automatically parsed into
     a HTTP_OK response.\n
     '''
+    if wants_ndjson(request, stream):
+        return(ndjson_response(Tdatapoint.iter_datapoints(db, int(Env.STREAM_CHUNK_SIZE))))
+
     val_dp = Tdatapoint.get_datapoints(db)
 
     if (val_dp is None):
@@ -138,6 +193,25 @@ def get_datapoints(db:Session=Depends(get_db), usr:str=Depends(usr_routes._check
     return(val_dp)
 # --------------------
 
+# --------------------
+def search_datapoints(q:str, limit:int=Query(default=20,ge=1,le=1000), offset:int=Query(default=0,ge=0),
+    db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Search datapoint entries by name, description, address and datasource.\n
+    `q` (str): Words to search. Each word is matched as a prefix.\n
+    `limit` (int): Maximum number of results.\n
+    `offset` (int): Number of results to skip.\n
+    return `val_dp` (JSONResponse): A list of `schemas.dataPoint`, best match first,
+    automatically parsed into a HTTP_OK response.\n
+    '''
+    try:
+        val_dp = Tdatapoint.search_datapoints(db, q, limit, offset)
+    except Exception as exc:
+        msg = str(exc).split('\n')[0]
+        raise HTTPException(status_code=520, detail=msg)
+
+    return(val_dp)
+# --------------------
+
 # --------------------
 def get_datapoints_pending(db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Get all datapoint that are pending in database.\n
@@ -169,7 +243,7 @@ def get_datapoints_active(db:Session=Depends(get_db), usr:str=Depends(usr_routes
 # --------------------
 
 # --------------------
-def get_datapoints_by_range(ini:int, end:int, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+def get_datapoints_by_range(ini:int, end:int, response:Response, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Get all datapoint entries in database.\n
     `ini` (int): First query result to show. Starts at `1`.\n
     `end` (int): Last query result to show, inclusive. \n
@@ -179,6 +253,8 @@ def get_datapoints_by_range(ini:int, end:int, db:Session=Depends(get_db), usr:st
 
     if(ini<1):
         raise HTTPException(status_code=401, detail=f"Range parameter error. Minimun value for `ini` is `1`.")
+    if(end<ini):
+        raise HTTPException(status_code=401, detail=f"Range parameter error. `end` must not be smaller than `ini`.")
 
     val_dp = Tdatapoint.get_datapoints_by_range(db,ini,end)
 
@@ -186,6 +262,33 @@ def get_datapoints_by_range(ini:int, end:int, db:Session=Depends(get_db), usr:st
         m_name = f"Data Points"
         raise HTTPException(status_code=404, detail=f"Error searching for available {m_name}.")
 
+    response.headers['X-Total-Count'] = str(Tdatapoint.count_datapoints(db))
+
+    return(val_dp)
+# --------------------
+
+# --------------------
+def get_datapoints_page(response:Response, after:Union[str,None]=None, limit:int=Query(default=100,ge=1,le=1000),
+    sort:Literal['name','datasource','active','pending']='name', desc:bool=False, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Get a page of datapoint entries in database. The total number of entries is
+    sent in the `X-Total-Count` header and the cursor for the next page, if
+    any, in the `X-Next-Cursor` header.\n
+    `after` (str): Cursor of the previous page. Omit it to get the first page.\n
+    `limit` (int): Maximum number of entries in the page.\n
+    `sort` (str): Field used to sort the entries.\n
+    `desc` (bool): Sort in descending order.\n
+    return `val_dp` (JSONResponse): A list of `schemas.dataPoint` automatically parsed into
+    a HTTP_OK response.\n
+    '''
+    try:
+        val_dp, next_cursor = Tdatapoint.get_datapoints_page(db, after, limit, sort, desc)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    response.headers['X-Total-Count'] = str(Tdatapoint.count_datapoints(db))
+    if (next_cursor is not None):
+        response.headers['X-Next-Cursor'] = next_cursor
+
     return(val_dp)
 # --------------------
 
@@ -196,11 +299,86 @@ def del_datapoint_by_name(dp_name:str, db:Session=Depends(get_db), usr:str=Depen
     return `val_dp` (JSONResponse): A `schemas.dataPoint` automatically parsed into
     a HTTP_OK response.\n
     '''
+    ids = _collector_ids(db, schemas.dataPointFilter(names=[dp_name]))
     val_dp = Tdatapoint.delete_datapoint(db, dp_name)
 
     if (val_dp is None):
         m_name = f"Data Point"
         raise HTTPException(status_code=404, detail=f"Error on {m_name} deletion.")
 
+    fb_routes.auto_deployer.touch(ids)
     return(val_dp)
-# --------------------
\ No newline at end of file
+# --------------------
+
+# --------------------
+def change_datapoints_active_status(active:bool, flt:schemas.dataPointFilter, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Change the activated state of every entry that matches the filter.\n
+    `active` (bool): Active state.\n
+    `flt` (schemas.dataPointFilter): Names, datasource, collector, name prefix or
+    state of the DataPoints to change.\n
+    return `val_dp` (JSONResponse): The number of `affected` DataPoints automatically
+    parsed into a HTTP_OK response.\n
+    '''
+    ids = _collector_ids(db, flt)
+    try:
+        val_dp = Tdatapoint.bulk_set_datapoints(db, flt, {'active': active})
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    fb_routes.auto_deployer.touch(ids)
+    return(val_dp)
+# --------------------
+
+# --------------------
+def confirm_datapoints_bulk(pending:bool, flt:schemas.dataPointFilter, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Change the pending state of every entry that matches the filter.\n
+    `pending` (bool): New value of pending.\n
+    `flt` (schemas.dataPointFilter): Names, datasource, collector, name prefix or
+    state of the DataPoints to change.\n
+    return `val_dp` (JSONResponse): The number of `affected` DataPoints automatically
+    parsed into a HTTP_OK response.\n
+    '''
+    ids = _collector_ids(db, flt)
+    try:
+        val_dp = Tdatapoint.bulk_set_datapoints(db, flt, {'pending': pending})
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    fb_routes.auto_deployer.touch(ids)
+    return(val_dp)
+# --------------------
+
+# --------------------
+def confirm_upload_datapoints_bulk(upload:bool, flt:schemas.dataPointFilter, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Change the upload state of every entry that matches the filter.\n
+    `upload` (bool): New value of upload.\n
+    `flt` (schemas.dataPointFilter): Names, datasource, collector, name prefix or
+    state of the DataPoints to change.\n
+    return `val_dp` (JSONResponse): The number of `affected` DataPoints automatically
+    parsed into a HTTP_OK response.\n
+    '''
+    try:
+        val_dp = Tdatapoint.bulk_set_datapoints(db, flt, {'upload': upload})
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    return(val_dp)
+# --------------------
+
+# --------------------
+def del_datapoints_bulk(flt:schemas.dataPointFilter, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Delete every entry that matches the filter.\n
+    `flt` (schemas.dataPointFilter): Names, datasource, collector, name prefix or
+    state of the DataPoints to delete.\n
+    return `val_dp` (JSONResponse): The number of `affected` DataPoints automatically
+    parsed into a HTTP_OK response.\n
+    '''
+    ids = _collector_ids(db, flt)
+    try:
+        val_dp = Tdatapoint.bulk_delete_datapoints(db, flt)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    fb_routes.auto_deployer.touch(ids)
+    return(val_dp)
+# --------------------
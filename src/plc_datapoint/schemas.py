@@ -8,7 +8,7 @@ Copyright (c) 2017 Aimirim STI.\n
 
 # Import system libs
 from pydantic import BaseModel
-from typing import Any
+from typing import Any, List, Union
 
 # Import custom libs
 from ..plc_datasource import schemas as ds_schemas
@@ -31,3 +31,16 @@ class dataPoint(dataPointInfo):
     pending: bool
     upload: bool
     # datasource: ds_schemas.dataSource
+
+class bulkItemStatus(BaseModel):
+    name: str
+    status: str
+    detail: str = ''
+
+class dataPointFilter(BaseModel):
+    names: Union[List[str],None] = None
+    datasource_name: Union[str,None] = None
+    collector_id: Union[int,None] = None
+    prefix: Union[str,None] = None
+    active: Union[bool,None] = None
+    pending: Union[bool,None] = None
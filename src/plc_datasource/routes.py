@@ -8,14 +8,18 @@ Copyright (c) 2017 Aimirim STI.\n
 '''
 
 # Import system libs
-from fastapi import Depends, HTTPException
+from typing import Literal, Union
+from fastapi import Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 
 # Import custom libs
 from . import schemas
 from ..database import get_db
+from ..env import Enviroment as Env
+from ..streaming import wants_ndjson, ndjson_response
 from ..crud import Tdatasource
 from ..user_auth import routes as usr_routes
+from ..fboot_gen import routes as fb_routes
 
 #######################################
 
@@ -24,6 +28,21 @@ from ..user_auth import routes as usr_routes
 #       route documentation and will look like something that the
 #       user shoud pass, but it is handled internaly by FastAPI.
 
+# --------------------
+def _collector_ids(db:Session, flt:schemas.dataSourceFilter):
+    ''' Find the collectors of the DataSources matching a filter, so they
+    can be exported automatically after a change.\n
+    `db` (Session): Database access session.\n
+    `flt` (schemas.dataSourceFilter): The changed DataSources.\n
+    return `ids` (list): The collector ids, empty for an invalid filter.\n
+    '''
+    try:
+        ids = Tdatasource.get_collector_ids(db, flt)
+    except ValueError:
+        ids = []
+    return(ids)
+# --------------------
+
 # --------------------
 def get_protocol_defaults(usr:str=Depends(usr_routes._check_valid_token)):
     ''' Get the list of DataSource protocols available.\n
@@ -72,6 +91,7 @@ def create_datasource(datasource:schemas.dataSourceInfo, db:Session=Depends(get_
         m_name = f"Data Source '{datasource.name}'"
         raise HTTPException(status_code=404, detail=f"Error creating {m_name}.")
 
+    fb_routes.auto_deployer.touch(_collector_ids(db, schemas.dataSourceFilter(names=[datasource.name])))
     return(val_ds)
 # --------------------
 
@@ -98,12 +118,16 @@ def update_datasource(datasource:schemas.dataSourceInfo, db:Session=Depends(get_
     return `val_ds` (JSONResponse): A `schemas.dataSource` automatically parsed into
     a HTTP_OK response.\n
     '''
+    # A DataSource moved to another collector changes both
+    flt = schemas.dataSourceFilter(names=[datasource.name])
+    ids = _collector_ids(db, flt)
     val_ds = Tdatasource.update_datasource(db, datasource)
 
     if (val_ds is None):
         m_name = f"Data Source '{datasource.name}'"
         raise HTTPException(status_code=404, detail=f"Error updating {m_name}.")
 
+    fb_routes.auto_deployer.touch(set(ids+_collector_ids(db, flt)))
     return(val_ds)
 # --------------------
 
@@ -115,12 +139,14 @@ def change_datasource_active_status(ds_name:str, active:bool, db:Session=Depends
     return `val_ds` (JSONResponse): A `schemas.dataSource` automatically parsed into
     a HTTP_OK response.\n
     '''
+    ids = _collector_ids(db, schemas.dataSourceFilter(names=[ds_name]))
     val_ds = Tdatasource.activate_datasource(db, ds_name, active)
 
     if (val_ds is None):
         m_name = f"Data Source '{ds_name}'"
         raise HTTPException(status_code=404, detail=f"Error activating {m_name}.")
 
+    fb_routes.auto_deployer.touch(ids)
     return(val_ds)
 # --------------------
 
@@ -131,21 +157,28 @@ def confirm_datasources(ds_name:str, db:Session=Depends(get_db), usr:str=Depends
     return `val_ds` (JSONResponse): A `schemas.dataSource` automatically parsed into
     a HTTP_OK response.\n
     '''
+    ids = _collector_ids(db, schemas.dataSourceFilter(names=[ds_name]))
     val_ds = Tdatasource.confirm_datasource(db, ds_name)
 
     if (val_ds is None):
         m_name = f"Data Source"
         raise HTTPException(status_code=404, detail=f"Error on {m_name} authorizations.")
 
+    fb_routes.auto_deployer.touch(ids)
     return(val_ds)
 # --------------------
 
 # --------------------
-def get_datasources(db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+def get_datasources(request:Request, stream:bool=False, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Get all datasource entries in database.\n
+    `stream` (bool): Send the entries as NDJSON while they are read from database.
+    The same happens if the `Accept` header asks for `application/x-ndjson`.\n
     return `val_ds` (JSONResponse): A list of `schemas.dataSource` automatically parsed into
     a HTTP_OK response.\n
     '''
+    if wants_ndjson(request, stream):
+        return(ndjson_response(Tdatasource.iter_datasources(db, int(Env.STREAM_CHUNK_SIZE))))
+
     val_ds = Tdatasource.get_datasources(db)
 
     if (val_ds is None):
@@ -186,7 +219,7 @@ def get_datasources_active(db:Session=Depends(get_db), usr:str=Depends(usr_route
 # --------------------
 
 # --------------------
-def get_datasources_by_range(ini:int, end:int, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+def get_datasources_by_range(ini:int, end:int, response:Response, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
     ''' Get all datasource entries in database.\n
     `ini` (int): First query result to show. Starts at `1`.\n
     `end` (int): Last query result to show, inclusive. \n
@@ -196,6 +229,8 @@ def get_datasources_by_range(ini:int, end:int, db:Session=Depends(get_db), usr:s
 
     if(ini<1):
         raise HTTPException(status_code=401, detail=f"Range parameter error. Minimun value for `ini` is `1`.")
+    if(end<ini):
+        raise HTTPException(status_code=401, detail=f"Range parameter error. `end` must not be smaller than `ini`.")
 
     val_ds = Tdatasource.get_datasources_by_range(db,ini,end)
 
@@ -203,6 +238,33 @@ def get_datasources_by_range(ini:int, end:int, db:Session=Depends(get_db), usr:s
         m_name = f"Data Sources"
         raise HTTPException(status_code=404, detail=f"Error searching for available {m_name}.")
 
+    response.headers['X-Total-Count'] = str(Tdatasource.count_datasources(db))
+
+    return(val_ds)
+# --------------------
+
+# --------------------
+def get_datasources_page(response:Response, after:Union[str,None]=None, limit:int=Query(default=100,ge=1,le=1000),
+    sort:Literal['name','collector','active','pending']='name', desc:bool=False, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Get a page of datasource entries in database. The total number of entries is
+    sent in the `X-Total-Count` header and the cursor for the next page, if
+    any, in the `X-Next-Cursor` header.\n
+    `after` (str): Cursor of the previous page. Omit it to get the first page.\n
+    `limit` (int): Maximum number of entries in the page.\n
+    `sort` (str): Field used to sort the entries.\n
+    `desc` (bool): Sort in descending order.\n
+    return `val_ds` (JSONResponse): A list of `schemas.dataSource` automatically parsed into
+    a HTTP_OK response.\n
+    '''
+    try:
+        val_ds, next_cursor = Tdatasource.get_datasources_page(db, after, limit, sort, desc)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    response.headers['X-Total-Count'] = str(Tdatasource.count_datasources(db))
+    if (next_cursor is not None):
+        response.headers['X-Next-Cursor'] = next_cursor
+
     return(val_ds)
 # --------------------
 
@@ -213,11 +275,50 @@ def del_datasource_by_name(ds_name:str, db:Session=Depends(get_db), usr:str=Depe
     return `val_ds` (JSONResponse): A `schemas.dataSource` automatically parsed into
     a HTTP_OK response.\n
     '''
+    ids = _collector_ids(db, schemas.dataSourceFilter(names=[ds_name]))
     val_ds = Tdatasource.delete_datasource(db, ds_name)
 
     if (val_ds is None):
         m_name = f"Data Source"
         raise HTTPException(status_code=404, detail=f"Error on {m_name} deletion.")
 
+    fb_routes.auto_deployer.touch(ids)
     return(val_ds)
-# --------------------
\ No newline at end of file
+# --------------------
+
+# --------------------
+def change_datasources_active_status(active:bool, flt:schemas.dataSourceFilter, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Change the activated state of every entry that matches the filter.\n
+    `active` (bool): Active state.\n
+    `flt` (schemas.dataSourceFilter): Names, collector, name prefix or state
+    of the DataSources to change.\n
+    return `val_ds` (JSONResponse): The number of `affected` DataSources automatically
+    parsed into a HTTP_OK response.\n
+    '''
+    ids = _collector_ids(db, flt)
+    try:
+        val_ds = Tdatasource.bulk_set_datasources(db, flt, {'active': active})
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    fb_routes.auto_deployer.touch(ids)
+    return(val_ds)
+# --------------------
+
+# --------------------
+def confirm_datasources_bulk(flt:schemas.dataSourceFilter, db:Session=Depends(get_db), usr:str=Depends(usr_routes._check_valid_token)):
+    ''' Change the pending state of every entry that matches the filter to False.\n
+    `flt` (schemas.dataSourceFilter): Names, collector, name prefix or state
+    of the DataSources to confirm.\n
+    return `val_ds` (JSONResponse): The number of `affected` DataSources automatically
+    parsed into a HTTP_OK response.\n
+    '''
+    ids = _collector_ids(db, flt)
+    try:
+        val_ds = Tdatasource.bulk_set_datasources(db, flt, {'pending': False})
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    fb_routes.auto_deployer.touch(ids)
+    return(val_ds)
+# --------------------
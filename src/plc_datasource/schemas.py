@@ -8,6 +8,7 @@ Copyright (c) 2017 Aimirim STI.\n
 
 # Import system libs
 from pydantic import BaseModel
+from typing import List, Union
 
 #######################################
 
@@ -34,4 +35,11 @@ class protocol(protocolInfo):
 class dataSource(dataSourceInfo):
     active: bool
     pending: bool
-    protocol: protocol
\ No newline at end of file
+    protocol: protocol
+
+class dataSourceFilter(BaseModel):
+    names: Union[List[str],None] = None
+    collector_id: Union[int,None] = None
+    prefix: Union[str,None] = None
+    active: Union[bool,None] = None
+    pending: Union[bool,None] = None
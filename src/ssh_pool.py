@@ -0,0 +1,331 @@
+'''
+This module holds the pool of SSH
+connections shared by the collector accesses.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* paramiko
+* fsspec
+'''
+
+# Import system libs
+import time
+import weakref
+import threading
+import fsspec
+from contextlib import contextmanager
+from paramiko import SSHClient, AutoAddPolicy
+from fsspec.implementations.sftp import SFTPFileSystem
+
+# Import custom libs
+from .env import Enviroment as Env
+
+#######################################
+
+class _PoolEntry:
+    ''' One pooled connection and its usage information.\n
+    '''
+
+    def __init__(self):
+        self.client = None
+        '''`client` (SSHClient): The connected client, `None` if not connected.'''
+        self.password = None
+        '''`password` (str): Password used to open `client`.'''
+        self.stale = False
+        '''`stale` (bool): The next `acquire` must connect again.'''
+        self.refs = 0
+        '''`refs` (int): Number of users holding or waiting for a connection.'''
+        self.holders = {}
+        '''`holders` (dict): Number of users of each client, including the
+        replaced ones still in use.'''
+        self.last_used = time.monotonic()
+        '''`last_used` (float): Monotonic time of the last acquire or release.'''
+        self.lock = threading.Lock()
+        '''`lock` (Lock): Serializes the (re)connection.'''
+
+    # --------------------
+    def is_alive(self):
+        ''' Check if the connection can still be used.\n
+        return (bool): `True` if the SSH transport is active.\n
+        '''
+        if (self.client is None):
+            return(False)
+        transport = self.client.get_transport()
+        return(transport is not None and transport.is_active())
+    # --------------------
+
+    # --------------------
+    def close(self):
+        ''' Close the connection, if any.\n
+        '''
+        if (self.client is not None):
+            self.client.close()
+            self.client = None
+    # --------------------
+
+class SSHPool:
+    ''' Keep one authenticated SSH connection for each collector address
+    (ip, port and user), so several file transfers only pay the handshake
+    once. Each user opens its own channels over the shared transport.
+    Idle connections are closed after `CONF_SSH_IDLE_TIMEOUT` seconds and
+    the least recently used ones when the pool exceeds `CONF_SSH_POOL_SIZE`.\n
+    '''
+
+    def __init__(self):
+        self._entries = {}
+        '''`_entries` (dict): The `_PoolEntry` by `(host, port, username)`.'''
+        self._lock = threading.Lock()
+
+    # --------------------
+    @staticmethod
+    def _key(host:str, port:int, username:str):
+        ''' Build the pool key of an address.\n
+        `host` (str): The IP address.\n
+        `port` (int): The SSH port.\n
+        `username` (str): The SSH user.\n
+        return `key` (tuple): The pool key.\n
+        '''
+        return((host, int(port), username))
+    # --------------------
+
+    # --------------------
+    @staticmethod
+    def _connect(host:str, port:int, username:str, password:str, timeout:float):
+        ''' Open a new SSH connection.\n
+        `host` (str): The IP address.\n
+        `port` (int): The SSH port.\n
+        `username` (str): The SSH user.\n
+        `password` (str): The SSH password.\n
+        `timeout` (float): Seconds to wait for the connection, banner and authentication.\n
+        return `client` (SSHClient): The connected client.\n
+        '''
+        client = SSHClient()
+        client.set_missing_host_key_policy(AutoAddPolicy())
+        try:
+            client.connect(host, port=int(port), username=username, password=password,
+                timeout=timeout, banner_timeout=timeout, auth_timeout=timeout)
+        except:
+            client.close()
+            raise
+        client.get_transport().set_keepalive(int(Env.SSH_KEEPALIVE))
+
+        return(client)
+    # --------------------
+
+    # --------------------
+    def acquire(self, host:str, port:int, username:str, password:str, timeout:float=None):
+        ''' Get the pooled connection of an address, connecting if there is
+        none, it was dropped, invalidated or the password changed. A replaced
+        connection still in use is closed by its last `release`. Every call
+        must be followed by a `release` of the returned client.\n
+        `host` (str): The IP address.\n
+        `port` (int): The SSH port.\n
+        `username` (str): The SSH user.\n
+        `password` (str): The SSH password.\n
+        `timeout` (float): Seconds to wait when a new connection is needed.\n
+        return `client` (SSHClient): The connected client.\n
+        '''
+        key = self._key(host, port, username)
+        with self._lock:
+            entry = self._entries.setdefault(key, _PoolEntry())
+            entry.refs += 1
+
+        try:
+            with entry.lock:
+                if (entry.stale or not entry.is_alive() or entry.password!=password):
+                    self._retire(entry)
+                    client = self._connect(host, port, username, password, timeout)
+                    with self._lock:
+                        entry.client = client
+                        entry.password = password
+                        entry.stale = False
+                with self._lock:
+                    client = entry.client
+                    entry.holders[client] = entry.holders.get(client, 0) + 1
+        except:
+            self.release(host, port, username)
+            raise
+
+        self._evict()
+        return(client)
+    # --------------------
+
+    # --------------------
+    def _retire(self, entry:_PoolEntry):
+        ''' Detach the client of an entry before connecting again. It is closed
+        now if nobody uses it, otherwise by its last `release`.\n
+        `entry` (_PoolEntry): The pool entry, with its `lock` held.\n
+        '''
+        with self._lock:
+            old, entry.client = entry.client, None
+            in_use = (old in entry.holders)
+        if (old is not None and not in_use):
+            old.close()
+    # --------------------
+
+    # --------------------
+    def release(self, host:str, port:int, username:str, client:SSHClient=None):
+        ''' Give back a connection got by `acquire`.\n
+        `host` (str): The IP address.\n
+        `port` (int): The SSH port.\n
+        `username` (str): The SSH user.\n
+        `client` (SSHClient): The client returned by `acquire`, `None` if it failed.\n
+        '''
+        retired = None
+        with self._lock:
+            entry = self._entries.get(self._key(host, port, username))
+            if (entry is not None):
+                entry.refs = max(entry.refs-1, 0)
+                entry.last_used = time.monotonic()
+                if (client in entry.holders):
+                    entry.holders[client] -= 1
+                    if (entry.holders[client]==0):
+                        del entry.holders[client]
+                        if (client is not entry.client):
+                            retired = client
+        if (retired is not None):
+            retired.close()
+    # --------------------
+
+    # --------------------
+    def invalidate(self, host:str, port:int, username:str):
+        ''' Close the connection of an address, so the next `acquire` connects
+        again. A connection in use is only replaced on the next `acquire` and
+        closed when its last user releases it.\n
+        `host` (str): The IP address.\n
+        `port` (int): The SSH port.\n
+        `username` (str): The SSH user.\n
+        '''
+        with self._lock:
+            entry = self._entries.get(self._key(host, port, username))
+            if (entry is None):
+                return
+            if (entry.refs==0):
+                del self._entries[self._key(host, port, username)]
+            else:
+                # Force a reconnection on the next acquire
+                entry.stale = True
+                return
+        entry.close()
+    # --------------------
+
+    # --------------------
+    def _evict(self):
+        ''' Close the idle connections that expired and, if the pool is still
+        above its size, the least recently used idle ones.\n
+        '''
+        now = time.monotonic()
+        idle_timeout = float(Env.SSH_IDLE_TIMEOUT)
+        max_size = int(Env.SSH_POOL_SIZE)
+
+        with self._lock:
+            idle = sorted([ (e.last_used, k) for k, e in self._entries.items() if e.refs==0 ])
+            expired = [ k for t, k in idle if (now-t>idle_timeout) ]
+            overflow = len(self._entries) - len(expired) - max_size
+            if (overflow>0):
+                expired += [ k for t, k in idle if (now-t<=idle_timeout) ][:overflow]
+            removed = [ self._entries.pop(k) for k in expired ]
+
+        for entry in removed:
+            entry.close()
+    # --------------------
+
+    # --------------------
+    def close_all(self):
+        ''' Close every pooled connection.\n
+        '''
+        with self._lock:
+            removed = list(self._entries.values())
+            self._entries = {}
+
+        for entry in removed:
+            for client in list(entry.holders):
+                if (client is not entry.client):
+                    client.close()
+            entry.close()
+    # --------------------
+
+pool = SSHPool()
+'''`pool` (SSHPool): The application SSH connections pool.'''
+
+# --------------------
+def storage_options(col):
+    ''' Build the fsspec options to access a collector files.\n
+    `col` (models.Collector): The collector.\n
+    return `options` (dict): Keyword arguments for `fsspec.open`.\n
+    '''
+    options = { 'host':col.ip, 'port':int(col.ssh_port),
+        'username':col.ssh_user, 'password':col.ssh_pass }
+    return(options)
+# --------------------
+
+# --------------------
+def _release_filesystem(ftp, client, host:str, port:int, username:str):
+    ''' Close the SFTP channel of a filesystem and release its connection.\n
+    '''
+    ftp.close()
+    pool.release(host, port, username, client)
+# --------------------
+
+class PooledSFTPFileSystem(SFTPFileSystem):
+    ''' fsspec SFTP filesystem that opens its channel over a pooled
+    connection instead of doing a new SSH handshake. The connection is
+    given back by `close`, use `open_filesystem` to do it on exit.\n
+    '''
+    cachable = False
+
+    # --------------------
+    def _connect(self):
+        ''' Borrow the connection from `pool`.\n
+        '''
+        port = self.ssh_kwargs.get('port', 22)
+        username = self.ssh_kwargs.get('username')
+        self.client = pool.acquire(self.host, port, username,
+            self.ssh_kwargs.get('password'), self.ssh_kwargs.get('timeout'))
+        try:
+            self.ftp = self.client.open_sftp()
+        except:
+            pool.release(self.host, port, username, self.client)
+            raise
+        # Only runs once, on `close` or, if it is never called, on garbage collection
+        self._release = weakref.finalize(self, _release_filesystem, self.ftp, self.client,
+            self.host, port, username)
+    # --------------------
+
+    # --------------------
+    def close(self):
+        ''' Close the SFTP channel and give back the connection to `pool`.\n
+        '''
+        self._release()
+    # --------------------
+
+# --------------------
+@contextmanager
+def open_filesystem(url:str, **options):
+    ''' Open the filesystem of an URL. Remote collector files use a
+    `PooledSFTPFileSystem`, released on exit.\n
+    `url` (str): The file or folder location.\n
+    `options` (dict): The fsspec options, see `storage_options`.\n
+    return `fs` (AbstractFileSystem): The filesystem.\n
+    return `path` (str): The location without protocol.\n
+    '''
+    if (fsspec.utils.get_protocol(url) in ('ssh','sftp')):
+        fs = PooledSFTPFileSystem(**{**PooledSFTPFileSystem._get_kwargs_from_urls(url), **options})
+        path = PooledSFTPFileSystem._strip_protocol(url)
+    else:
+        fs, path = fsspec.core.url_to_fs(url, **options)
+
+    try:
+        yield(fs, path)
+    finally:
+        if isinstance(fs, PooledSFTPFileSystem):
+            fs.close()
+# --------------------
+
+# --------------------
+def register_filesystems():
+    ''' Make `ssh://` and `sftp://` URLs opened with fsspec use the pool.
+    Called on the application startup.\n
+    '''
+    fsspec.register_implementation('ssh', PooledSFTPFileSystem, clobber=True)
+    fsspec.register_implementation('sftp', PooledSFTPFileSystem, clobber=True)
+# --------------------
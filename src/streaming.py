@@ -0,0 +1,68 @@
+'''
+This module has the helpers to stream
+table dumps as newline delimited JSON.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* fastapi
+* pydantic
+'''
+
+# Import system libs
+from typing import AsyncIterable, Iterable
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+# Import custom libs
+from .env import Enviroment as Env
+
+#######################################
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
+# --------------------
+def wants_ndjson(request:Request, stream:bool):
+    ''' Check if the client asked for a streamed answer.\n
+    `request` (Request): The HTTP request.\n
+    `stream` (bool): The `stream` query parameter.\n
+    return (bool): `True` when the answer should be NDJSON.\n
+    '''
+    return(stream or NDJSON_MEDIA_TYPE in request.headers.get('accept',''))
+# --------------------
+
+# --------------------
+def ndjson_response(items:Iterable[BaseModel]):
+    ''' Build a response that serializes one item per line as they are
+    produced, so the whole table is never held in memory.\n
+    `items` (Iterable[BaseModel]): The schemas to send.\n
+    return (StreamingResponse): The NDJSON response.\n
+    '''
+    chunk_size = int(Env.STREAM_CHUNK_SIZE)
+
+    def _lines():
+        # Group lines to avoid one socket write per item
+        buffer = []
+        for item in items:
+            buffer.append(item.json())
+            if (len(buffer)>=chunk_size):
+                yield '\n'.join(buffer) + '\n'
+                buffer = []
+        if buffer:
+            yield '\n'.join(buffer) + '\n'
+
+    return(StreamingResponse(_lines(), media_type=NDJSON_MEDIA_TYPE))
+# --------------------
+
+# --------------------
+def ndjson_async_response(items:AsyncIterable[BaseModel]):
+    ''' Build a response that sends each item in its own line as soon
+    as it is produced.\n
+    `items` (AsyncIterable[BaseModel]): The schemas to send.\n
+    return (StreamingResponse): The NDJSON response.\n
+    '''
+    async def _lines():
+        async for item in items:
+            yield item.json() + '\n'
+
+    return(StreamingResponse(_lines(), media_type=NDJSON_MEDIA_TYPE))
+# --------------------
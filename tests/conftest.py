@@ -0,0 +1,44 @@
+'''
+Shared fixtures of the tests.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* sqlalchemy
+* pytest
+'''
+
+# Import system libs
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Import custom libs
+from src.database import Base
+
+#######################################
+
+# --------------------
+@pytest.fixture
+def engine():
+    ''' Engine of a new in memory database with every table of the models.
+    Its single connection is shared by every thread.\n
+    '''
+    engine = create_engine('sqlite://', connect_args={'check_same_thread': False},
+        poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+
+    yield engine
+    engine.dispose()
+# --------------------
+
+# --------------------
+@pytest.fixture
+def session(engine):
+    ''' Database session on the `engine` database, configured as the
+    application ones.\n
+    '''
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+    yield session
+    session.close()
+# --------------------
@@ -0,0 +1,109 @@
+'''
+Tests for the conflict handling of the bulk
+creation of datapoints.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* sqlalchemy
+* pytest
+'''
+
+# Import system libs
+import pytest
+
+# Import custom libs
+from src import models
+from src.crud import Tdatapoint
+from src.plc_datapoint import schemas
+
+#######################################
+
+# --------------------
+@pytest.fixture
+def db(session):
+    ''' Session with a Modbus and a Siemens datasource, and the
+    `ds_modbus` datapoint `dp_0`.\n
+    '''
+    session.add(models.DataSource(name='ds_modbus', plc_ip='10.0.0.1', plc_port=502,
+        cycletime=1000, timeout=1000, active=True, pending=False))
+    session.add(models.ProtModbus(datasource_name='ds_modbus', slave_id=1))
+    session.add(models.DataSource(name='ds_siemens', plc_ip='10.0.0.2', plc_port=102,
+        cycletime=1000, timeout=1000, active=True, pending=False))
+    session.add(models.ProtSiemens(datasource_name='ds_siemens', rack=0, slot=1, plc='S7-300'))
+    session.add(models.DataModbus(name='dp_0', description='old', num_type='REAL', active=True,
+        pending=False, upload=False, datasource_name='ds_modbus', func_code=4, address=0))
+    session.commit()
+
+    return(session)
+# --------------------
+
+# --------------------
+def _info(name:str, description:str='test', datasource_name:str='ds_modbus', access:dict=None):
+    ''' Build the information of a Modbus datapoint.\n
+    '''
+    if (access is None):
+        access = {'name':'Modbus', 'data':{'func_code':3, 'address':10}}
+    return(schemas.dataPointInfo(name=name, description=description, num_type='REAL',
+        datasource_name=datasource_name, access=access))
+# --------------------
+
+def test_existing_name_is_an_error_without_upsert(db):
+    status = Tdatapoint.bulk_create_datapoints(db, [_info('dp_0', 'new'), _info('dp_1')])
+
+    assert [ (item.name, item.status) for item in status ]==[('dp_0','error'), ('dp_1','created')]
+    assert status[0].detail=='Already exists.'
+    assert Tdatapoint.get_datapoint_by_name(db, 'dp_0').description=='old'
+    assert Tdatapoint.get_datapoint_by_name(db, 'dp_1') is not None
+
+def test_upsert_updates_existing_name(db):
+    status = Tdatapoint.bulk_create_datapoints(db, [_info('dp_0', 'new'), _info('dp_1')], upsert=True)
+
+    assert [ item.status for item in status ]==['updated', 'created']
+    db.expire_all()
+    dp = Tdatapoint.get_datapoint_by_name(db, 'dp_0')
+    assert dp.description=='new' and dp.pending
+    assert dp.access.data=={'func_code':3, 'address':'10'}
+    assert db.query(models.DataPoint).count()==2
+
+def test_duplicated_name_keeps_first_item(db):
+    status = Tdatapoint.bulk_create_datapoints(db, [_info('dp_1', 'first'), _info('dp_1', 'second')], upsert=True)
+
+    assert [ item.status for item in status ]==['created', 'error']
+    assert status[1].detail=='Duplicated name in request.'
+    assert Tdatapoint.get_datapoint_by_name(db, 'dp_1').description=='first'
+
+def test_upsert_rejects_protocol_mismatch(db):
+    access = {'name':'Siemens', 'data':{'address':'DB1.DBD0'}}
+    status = Tdatapoint.bulk_create_datapoints(db, [_info('dp_0', 'new', access=access)], upsert=True)
+
+    assert status[0].status=='error'
+    assert "does not match Data Source 'ds_modbus'" in status[0].detail
+    db.expire_all()
+    dp = Tdatapoint.get_datapoint_by_name(db, 'dp_0')
+    assert dp.description=='old' and dp.access.data=={'func_code':4, 'address':'0'}
+
+def test_upsert_moves_datapoint_to_other_protocol(db):
+    access = {'name':'Siemens', 'data':{'address':'DB1.DBD0'}}
+    status = Tdatapoint.bulk_create_datapoints(db,
+        [_info('dp_0', 'new', datasource_name='ds_siemens', access=access)], upsert=True)
+
+    assert status[0].status=='updated'
+    db.expire_all()
+    row = db.query(models.DataPoint.__table__).filter_by(name='dp_0').one()
+    assert (row.access, row.datasource_name, row.address)==('Siemens', 'ds_siemens', 'DB1.DBD0')
+    assert row.func_code is None
+
+def test_upsert_touches_old_and_new_collectors(db, monkeypatch):
+    pytest.importorskip('pyfboot')
+    from src.plc_datapoint import routes
+    touched = []
+    monkeypatch.setattr(routes.fb_routes.auto_deployer, 'touch', lambda ids: touched.extend(ids))
+    for col_id, ds_name in ((1, 'ds_modbus'), (2, 'ds_siemens')):
+        db.add(models.Collector(id=col_id, name=f'col_{col_id}', ssh_user='test', ssh_pass='test', prj_path='/gw'))
+        db.query(models.DataSource).filter_by(name=ds_name).update({'collector_id': col_id})
+    db.commit()
+
+    access = {'name':'Siemens', 'data':{'address':'DB1.DBD0'}}
+    routes.bulk_create_datapoints([_info('dp_0', 'new', datasource_name='ds_siemens', access=access)],
+        upsert=True, db=db, usr=None)
+
+    assert sorted(touched)==[1, 2]
@@ -0,0 +1,66 @@
+'''
+Tests for the connection pool and pragmas of
+the SQLite engine.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* sqlalchemy
+* pytest
+'''
+
+# Import system libs
+import pytest
+from sqlalchemy import create_engine, event, exc, text
+from sqlalchemy.engine import make_url
+
+# Import custom libs
+from src import database
+from src.env import Enviroment as Env
+
+#######################################
+
+# --------------------
+@pytest.fixture
+def file_engine(tmp_path):
+    ''' Build engines of a database file as the application does.\n
+    return (callable): Creates the engine, keeping it to dispose it.\n
+    '''
+    engines = []
+    def _build():
+        url = f'sqlite:///{tmp_path/"test.db"}'
+        engines.append(create_engine(url, connect_args={'check_same_thread': False},
+            **database.get_pool_args(make_url(url))))
+        event.listen(engines[-1], 'connect',
+            lambda dbapi_conn, record: database.set_sqlite_pragmas(dbapi_conn, database.SQLITE_PRAGMAS))
+        return(engines[-1])
+
+    yield _build
+    for engine in engines:
+        engine.dispose()
+# --------------------
+
+def test_default_pool_does_not_wait(file_engine, monkeypatch):
+    monkeypatch.setattr(Env, 'DB_POOL_TIMEOUT', '0.1')
+    engine = file_engine()
+
+    # More sessions than the request threads of the server at once
+    conns = [ engine.connect() for _ in range(60) ]
+    assert engine.pool.size()==int(Env.DB_POOL_SIZE)
+    for conn in conns:
+        conn.close()
+    assert engine.pool.checkedin()==int(Env.DB_POOL_SIZE)
+
+def test_limited_pool_fails_after_timeout(file_engine, monkeypatch):
+    monkeypatch.setattr(Env, 'DB_POOL_SIZE', '1')
+    monkeypatch.setattr(Env, 'DB_MAX_OVERFLOW', '0')
+    monkeypatch.setattr(Env, 'DB_POOL_TIMEOUT', '0.1')
+    engine = file_engine()
+
+    with engine.connect():
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+    engine.connect().close()
+
+def test_foreign_keys_are_not_enforced_by_default(file_engine):
+    with file_engine().connect() as conn:
+        assert conn.execute(text('PRAGMA foreign_keys')).scalar()==0
+        assert conn.execute(text('PRAGMA journal_mode')).scalar()==Env.DB_JOURNAL_MODE.lower()
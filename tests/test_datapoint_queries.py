@@ -0,0 +1,95 @@
+'''
+Regression tests for the number of statements issued
+by the DataPoint listings, which must not depend on
+how many datapoints are listed.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* sqlalchemy
+* pytest
+'''
+
+# Import system libs
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Import custom libs
+from src import models
+from src.database import Base
+from src.crud import Tdatapoint
+
+#######################################
+
+PROTOCOLS = {
+    'Siemens': (models.ProtSiemens, {'rack':0, 'slot':1, 'plc':'S7-300'},
+        models.DataSiemens, lambda i: {'address':f'DB1.DBD{4*i}'}),
+    'Rockwell': (models.ProtRockwell, {'path':'1,0', 'slot':0, 'connection':'Ethernet'},
+        models.DataRockwell, lambda i: {'tag_name':f'Tag[{i}]'}),
+    'Modbus': (models.ProtModbus, {'slave_id':1},
+        models.DataModbus, lambda i: {'func_code':4, 'address':2*i}),
+}
+'''`PROTOCOLS` (dict): Protocol model, its data, datapoint model and access data by index.'''
+
+LISTINGS = {
+    'get_datapoints': Tdatapoint.get_datapoints,
+    'get_datapoints_active': Tdatapoint.get_datapoints_active,
+    'get_datapoints_pending': Tdatapoint.get_datapoints_pending,
+    'get_datapoints_by_range': lambda db: Tdatapoint.get_datapoints_by_range(db, 1, 1000),
+}
+'''`LISTINGS` (dict): The listings under test, called with a session only.'''
+
+# --------------------
+def _populate(db, size:int):
+    ''' Create a collector with one datasource of each protocol and `size`
+    active and pending datapoints on each one.\n
+    `db` (Session): Database session instance.\n
+    `size` (int): Datapoints of each datasource.\n
+    '''
+    col = models.Collector(name='test', ip='127.0.0.1', ssh_port=22, ssh_user='test',
+        ssh_pass='test', prj_path='/gw', opcua_port=4840, health_port=8080, valid=True,
+        update_period=1, timeout=2)
+    db.add(col)
+    db.commit()
+
+    for prot_name, (prot_cls, prot_data, dp_cls, dp_access) in PROTOCOLS.items():
+        ds_name = f'ds_{prot_name}'
+        db.add(models.DataSource(name=ds_name, plc_ip='10.0.0.1', plc_port=102,
+            cycletime=1000, timeout=1000, active=True, pending=True, collector_id=col.id))
+        db.add(prot_cls(datasource_name=ds_name, **prot_data))
+        for i in range(size):
+            db.add(dp_cls(name=f'{prot_name}_{i}', description='test', num_type='REAL',
+                active=True, pending=True, upload=False, datasource_name=ds_name, **dp_access(i)))
+    db.commit()
+# --------------------
+
+# --------------------
+def _count_statements(size:int, listing):
+    ''' Run a listing over a new in memory database and count its statements.\n
+    `size` (int): Datapoints of each datasource.\n
+    `listing` (callable): The listing, called with the session.\n
+    return `count` (int): Statements executed by the listing.\n
+    '''
+    engine = create_engine('sqlite://', connect_args={'check_same_thread': False},
+        poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    _populate(db, size)
+    db.expunge_all()
+
+    count = [0]
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _count(*args):
+        count[0] += 1
+
+    result = listing(db)
+    assert len(result)==size*len(PROTOCOLS)
+
+    db.close()
+    engine.dispose()
+    return(count[0])
+# --------------------
+
+@pytest.mark.parametrize('name', LISTINGS)
+def test_listing_query_count_is_constant(name):
+    assert _count_statements(1, LISTINGS[name])==_count_statements(50, LISTINGS[name])
@@ -0,0 +1,91 @@
+'''
+Tests for the consistency of the datapoints
+full text search index after changes.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* sqlalchemy
+* pytest
+'''
+
+# Import system libs
+import pytest
+from sqlalchemy import text
+
+# Import custom libs
+from src import models
+from src.migrations import run_migrations
+from src.crud import Tdatapoint
+from src.plc_datapoint import schemas
+
+#######################################
+
+# --------------------
+@pytest.fixture
+def db(engine, session):
+    ''' Session on the migrated database with a Modbus datasource and the
+    datapoints `pump_speed` and `valve_state`.\n
+    '''
+    run_migrations(engine)
+
+    session.add(models.DataSource(name='ds_modbus', plc_ip='10.0.0.1', plc_port=502,
+        cycletime=1000, timeout=1000, active=True, pending=False))
+    session.add(models.ProtModbus(datasource_name='ds_modbus', slave_id=1))
+    for i, (name, description) in enumerate([('pump_speed','Motor rotation'), ('valve_state','Outlet valve')]):
+        session.add(models.DataModbus(name=name, description=description, num_type='REAL', active=True,
+            pending=False, upload=False, datasource_name='ds_modbus', func_code=4, address=i))
+    session.commit()
+
+    return(session)
+# --------------------
+
+# --------------------
+def _search(db, words:str):
+    ''' Names of the datapoints found by a search.\n
+    '''
+    return(sorted( dp.name for dp in Tdatapoint.search_datapoints(db, words, 10) ))
+# --------------------
+
+# --------------------
+def _check_index(db):
+    ''' Fail if the search index does not match the `datapoints` table.\n
+    '''
+    db.execute(text("INSERT INTO datapoints_fts(datapoints_fts, rank) VALUES ('integrity-check', 1)"))
+# --------------------
+
+def test_index_follows_update(db):
+    dp = Tdatapoint.get_datapoint_by_name(db, 'pump_speed')
+    dp.description = 'Conveyor belt'
+    Tdatapoint.update_datapoint(db, dp)
+
+    _check_index(db)
+    assert _search(db, 'motor')==[]
+    assert _search(db, 'conv')==['pump_speed']
+
+def test_index_follows_delete(db):
+    Tdatapoint.delete_datapoint(db, 'valve_state')
+
+    _check_index(db)
+    assert _search(db, 'valve')==[]
+    assert _search(db, 'ds_mod')==['pump_speed']
+
+def test_index_follows_bulk_changes(db):
+    items = [ schemas.dataPointInfo(name=name, description=description, num_type='REAL',
+        datasource_name='ds_modbus', access={'name':'Modbus', 'data':{'func_code':3, 'address':10}})
+        for name, description in [('pump_speed','Tank level'), ('flow_rate','Inlet flow')] ]
+    Tdatapoint.bulk_create_datapoints(db, items, upsert=True)
+
+    _check_index(db)
+    assert _search(db, 'motor')==[]
+    assert _search(db, 'tank')==['pump_speed']
+    assert _search(db, 'inlet')==['flow_rate']
+
+    Tdatapoint.bulk_delete_datapoints(db, schemas.dataPointFilter(names=['pump_speed', 'flow_rate']))
+
+    _check_index(db)
+    assert _search(db, 'ds_modbus')==['valve_state']
+
+def test_non_indexed_change_keeps_index(db):
+    Tdatapoint.bulk_set_datapoints(db, schemas.dataPointFilter(names=['valve_state']), {'active': False})
+
+    _check_index(db)
+    assert _search(db, 'outlet')==['valve_state']
@@ -0,0 +1,134 @@
+'''
+Tests for the atomic upload of the gateway files,
+run over the local filesystem.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* fsspec
+* pytest
+'''
+
+# Import system libs
+import os
+import threading
+import pytest
+from fsspec.implementations.local import LocalFileSystem
+
+# Import custom libs
+from src.fboot_gen import deploy
+
+#######################################
+
+# --------------------
+def _make_files(folder, **files):
+    ''' Write the current gateway files.\n
+    `folder` (Path): The gateway folder.\n
+    `files` (dict): The content of each file name.\n
+    return `paths` (dict): The path of each file name.\n
+    '''
+    paths = {}
+    for name, content in files.items():
+        paths[name] = str(folder/name)
+        if (content is not None):
+            with open(paths[name], 'wb') as fid:
+                fid.write(content)
+    return(paths)
+# --------------------
+
+# --------------------
+def _read(path:str):
+    ''' Read a file, `None` if it does not exist.\n
+    '''
+    if not os.path.exists(path):
+        return(None)
+    with open(path, 'rb') as fid:
+        return(fid.read())
+# --------------------
+
+# --------------------
+def _temp_files(folder):
+    ''' List the temporary files left in the gateway folder.\n
+    '''
+    return([ name for name in os.listdir(folder) if name.endswith('.tmp') ])
+# --------------------
+
+def test_failed_stage_leaves_destinations_untouched(tmp_path, monkeypatch):
+    fs = LocalFileSystem()
+    paths = _make_files(tmp_path, fboot=b'old fboot', opcua=b'old opcua')
+    open_file = fs.open
+    def _open(path, mode='rb', **kwargs):
+        if ('opcua' in os.path.basename(path) and 'w' in mode):
+            raise IOError('disk full')
+        return(open_file(path, mode, **kwargs))
+    monkeypatch.setattr(fs, 'open', _open)
+
+    with pytest.raises(IOError):
+        with deploy.Deployment(fs) as deployment:
+            deployment.stage(paths['fboot'], b'new fboot', b'old fboot')
+            deployment.stage(paths['opcua'], b'new opcua', b'old opcua')
+            deployment.commit()
+
+    assert _read(paths['fboot'])==b'old fboot'
+    assert _read(paths['opcua'])==b'old opcua'
+    assert _temp_files(tmp_path)==[]
+
+def test_failed_rename_restores_renamed_files(tmp_path, monkeypatch):
+    fs = LocalFileSystem()
+    paths = _make_files(tmp_path, fboot=b'old fboot', opcua=b'old opcua')
+    replace_file = deploy.replace_file
+    calls = [0]
+    def _replace_file(fs, src, dst):
+        calls[0] += 1
+        if (calls[0]==2):
+            raise IOError('rename failed')
+        replace_file(fs, src, dst)
+    monkeypatch.setattr(deploy, 'replace_file', _replace_file)
+
+    with deploy.Deployment(fs) as deployment:
+        deployment.stage(paths['fboot'], b'new fboot', b'old fboot')
+        deployment.stage(paths['opcua'], b'new opcua', b'old opcua')
+        with pytest.raises(IOError):
+            deployment.commit()
+
+    assert _read(paths['fboot'])==b'old fboot'
+    assert _read(paths['opcua'])==b'old opcua'
+    assert _temp_files(tmp_path)==[]
+
+def test_revert_puts_back_previous_content(tmp_path):
+    fs = LocalFileSystem()
+    paths = _make_files(tmp_path, fboot=b'old fboot', opcua=None)
+
+    with deploy.Deployment(fs) as deployment:
+        deployment.stage(paths['fboot'], b'new fboot', b'old fboot')
+        deployment.stage(paths['opcua'], b'new opcua')
+        deployment.commit()
+        assert _read(paths['fboot'])==b'new fboot'
+        assert _read(paths['opcua'])==b'new opcua'
+        deployment.revert()
+
+    assert _read(paths['fboot'])==b'old fboot'
+    assert _read(paths['opcua']) is None
+    assert _temp_files(tmp_path)==[]
+
+def test_files_are_uploaded_at_the_same_time(tmp_path, monkeypatch):
+    fs = LocalFileSystem()
+    paths = _make_files(tmp_path, fboot=None, opcua=None)
+    # Each upload waits for the other one, so serial uploads would time out
+    barrier = threading.Barrier(2, timeout=5)
+    open_file = fs.open
+    def _open(path, mode='rb', **kwargs):
+        if ('w' in mode and path.endswith('.tmp')):
+            barrier.wait()
+        return(open_file(path, mode, **kwargs))
+    monkeypatch.setattr(fs, 'open', _open)
+
+    uploaded = []
+    with deploy.Deployment(fs) as deployment:
+        deployment.stage(paths['fboot'], b'new fboot')
+        deployment.stage(paths['opcua'], b'new opcua')
+        deployment.wait(uploaded.append)
+        deployment.commit()
+
+    assert uploaded==[1, 2]
+    assert _read(paths['fboot'])==b'new fboot'
+    assert _read(paths['opcua'])==b'new opcua'
+    assert _temp_files(tmp_path)==[]
@@ -0,0 +1,124 @@
+'''
+Tests for the exported versions of a collector
+and their files in the artifact store.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* sqlalchemy
+* paramiko
+* pyfboot
+* pytest
+'''
+
+# Import system libs
+import os
+import json
+import yaml
+import pytest
+
+# Import custom libs
+from src import models
+from src import ssh_pool
+from src.env import Enviroment as Env
+from src.crud import export as export_crud
+from src.crud import Tcollector, Texport
+from src.fboot_gen.store import ArtifactStore
+from utils.sftp_standin import SFTPStandIn
+
+#######################################
+
+# --------------------
+@pytest.fixture
+def db(session, tmp_path, monkeypatch):
+    ''' Session with two collectors, and a new artifact store used
+    by the CRUD module, kept in `db.info['store']`.\n
+    '''
+    for col_id in (1, 2):
+        session.add(models.Collector(id=col_id, name=f'col_{col_id}', ip='127.0.0.1',
+            ssh_port=22, ssh_user='user', ssh_pass='pass', prj_path='/gw', opcua_port=4840,
+            health_port=8080, valid=True, update_period=1, timeout=2))
+    session.commit()
+
+    store = ArtifactStore(str(tmp_path/'artifacts'))
+    monkeypatch.setattr(export_crud, 'store', store)
+    session.info['store'] = store
+
+    return(session)
+# --------------------
+
+# --------------------
+def _save_bundle(db, col_id:int, version:str):
+    ''' Store the files of a bundle, each one marked with `version`.\n
+    return `db_bundle` (models.ExportBundle): The saved bundle.\n
+    '''
+    store = db.info['store']
+    prometheus_job = {'job_name':f'col_{col_id}', 'scrape_interval':'1s',
+        'static_configs':[{'labels':{'group':f'col_{col_id}'}, 'targets':['127.0.0.1:4840']}]}
+    digests = {
+        'fboot': store.put(f'fboot {version}\n'.encode('utf-8')),
+        'opcua': store.put(f'opcua {version}\n'.encode('utf-8')),
+        'prometheus': store.put(yaml.dump({'scrape_configs':[prometheus_job]}).encode('utf-8')),
+        'datapoints': store.put(json.dumps([]).encode('utf-8')),
+        'source': version
+    }
+    return(Texport.save_bundle(db, col_id, digests))
+# --------------------
+
+def test_delete_collector_removes_unused_files(db):
+    store = db.info['store']
+    shared = _save_bundle(db, 1, 'shared')
+    own = _save_bundle(db, 1, 'own')
+    _save_bundle(db, 2, 'shared')
+    Texport.save_artifact(db, 1, 'fboot', '/gw/forte.fboot', own.fboot)
+    shared = [shared.fboot, shared.opcua, shared.datapoints]
+    own = [own.fboot, own.opcua]
+
+    Tcollector.delete_collector(db, 1)
+
+    assert not any( store.exists(digest) for digest in own )
+    assert all( store.exists(digest) for digest in shared )
+
+def test_remove_unused_files_keeps_artifact_references(db):
+    store = db.info['store']
+    digest = store.put(b'uploaded')
+    Texport.save_artifact(db, 2, 'fboot', '/gw/forte.fboot', digest)
+    unused = store.put(b'unused')
+
+    assert Texport.remove_unused_files(db, {digest, unused})=={unused}
+    assert store.exists(digest) and not store.exists(unused)
+
+def test_rollback_restores_files(db, tmp_path, monkeypatch):
+    pytest.importorskip('pyfboot')
+    from src.fboot_gen import routes
+
+    monkeypatch.setattr(routes, 'store', db.info['store'])
+    monkeypatch.setattr(ssh_pool, 'pool', ssh_pool.SSHPool())
+    monkeypatch.setattr(Env, 'PROMETHEUS_FILEURL', str(tmp_path/'prometheus.yml'))
+    monkeypatch.setattr(Env, 'PROMETHEUS_WRITE_DELAY', '0')
+    gw_path = tmp_path/'root'/'gw'
+    for location in (Env.GATEWAY_FBOOT_LOCATION, Env.EXPORTER_CONFIG_LOCATION):
+        os.makedirs(os.path.dirname(gw_path/location), exist_ok=True)
+
+    v1 = _save_bundle(db, 1, 'v1')
+    v2 = _save_bundle(db, 1, 'v2')
+    with SFTPStandIn(str(tmp_path/'root')) as server:
+        col = db.get(models.Collector, 1)
+        col.ssh_port = server.port
+        db.commit()
+        progress = lambda *args: None
+
+        routes.run_export(db, col, progress, 'deploy', v1.id)
+        routes.run_export(db, col, progress, 'deploy', v2.id)
+        assert (gw_path/Env.GATEWAY_FBOOT_LOCATION).read_bytes()==b'fboot v2\n'
+
+        db_bundle = routes._get_rollback_bundle(db, col.id)
+        assert db_bundle.id==v1.id
+        report = routes.run_export(db, col, progress, 'rollback', db_bundle.id)
+        ssh_pool.pool.close_all()
+
+    assert report.artifacts['fboot']=='uploaded' and report.artifacts['opcua']=='uploaded'
+    assert (gw_path/Env.GATEWAY_FBOOT_LOCATION).read_bytes()==db.info['store'].get(v1.fboot)
+    assert (gw_path/Env.EXPORTER_CONFIG_LOCATION).read_bytes()==db.info['store'].get(v1.opcua)
+
+    versions = routes.get_collector_versions(col.id, db, None)
+    assert [ (version.bundle.id, version.current) for version in versions ]==[(v1.id, True), (v2.id, False), (v1.id, False)]
+    assert versions[0].rollback and not versions[1].rollback
@@ -0,0 +1,113 @@
+'''
+Tests for the versioned schema migrations
+applied on startup.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* sqlalchemy
+* pytest
+'''
+
+# Import system libs
+import pytest
+from sqlalchemy import create_engine, text
+
+# Import custom libs
+from src.database import Base
+from src.migrations import MIGRATIONS, run_migrations, check_search_index
+
+#######################################
+
+VERSIONS = [ version for version, _, _ in MIGRATIONS ]
+'''`VERSIONS` (list): Every migration version, in order.'''
+
+# --------------------
+@pytest.fixture
+def engine(tmp_path):
+    ''' Engine of an empty database file.\n
+    '''
+    engine = create_engine(f'sqlite:///{tmp_path/"test.db"}')
+    yield engine
+    engine.dispose()
+# --------------------
+
+# --------------------
+def _schema(engine):
+    ''' The indexes, triggers and tables of the database.\n
+    return `schema` (list): `(type, name, sql)` of each object.\n
+    '''
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT type, name, sql FROM sqlite_master ORDER BY type, name"))
+        return([ tuple(row) for row in rows ])
+# --------------------
+
+# --------------------
+def _insert_datapoint(conn, name:str):
+    ''' Add a Modbus datapoint, and its datasource if needed.\n
+    '''
+    conn.execute(text("INSERT OR IGNORE INTO datasources (name) VALUES ('ds_modbus')"))
+    conn.execute(text("""INSERT INTO datapoints (name, description, access, datasource_name)
+        VALUES (:name, 'test', 'Modbus', 'ds_modbus')"""), {'name':name})
+# --------------------
+
+# --------------------
+def _search(engine, word:str):
+    ''' Names found by the search index.\n
+    '''
+    with engine.connect() as conn:
+        rows = conn.execute(text("""SELECT datapoints.name FROM datapoints_fts
+            JOIN datapoints ON datapoints.rowid = datapoints_fts.rowid
+            WHERE datapoints_fts MATCH :word ORDER BY datapoints.name"""), {'word':word})
+        return([ row.name for row in rows ])
+# --------------------
+
+def test_migrated_database_is_not_changed(engine):
+    assert run_migrations(engine)==VERSIONS
+    schema = _schema(engine)
+    with engine.begin() as conn:
+        _insert_datapoint(conn, 'dp_0')
+
+    assert run_migrations(engine)==[]
+    assert _schema(engine)==schema
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT version FROM schema_migrations ORDER BY version")).scalars().all()==VERSIONS
+    assert _search(engine, 'dp_0')==['dp_0']
+
+def test_steps_run_again_on_migrated_database(engine):
+    run_migrations(engine)
+    schema = _schema(engine)
+    with engine.begin() as conn:
+        _insert_datapoint(conn, 'dp_0')
+        # As if the registry was lost, every step runs over its own changes
+        conn.execute(text("DELETE FROM schema_migrations"))
+
+    assert run_migrations(engine)==VERSIONS
+    assert _schema(engine)==schema
+    assert _search(engine, 'dp_0')==['dp_0']
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO datapoints_fts(datapoints_fts, rank) VALUES ('integrity-check', 1)"))
+
+def test_rows_before_migrations_are_indexed(engine):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        _insert_datapoint(conn, 'dp_0')
+
+    assert run_migrations(engine)==VERSIONS
+    with engine.begin() as conn:
+        _insert_datapoint(conn, 'dp_1')
+    assert _search(engine, 'test')==['dp_0', 'dp_1']
+
+def test_search_index_is_rebuilt_after_renumbered_rows(engine):
+    run_migrations(engine)
+    with engine.begin() as conn:
+        _insert_datapoint(conn, 'dp_0')
+        _insert_datapoint(conn, 'dp_1')
+    assert not check_search_index(engine)
+
+    # As a VACUUM may do, the rows change their rowid without the triggers
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE datapoints SET rowid = rowid + 10"))
+    assert _search(engine, 'dp_0')==[]
+
+    assert check_search_index(engine)
+    assert _search(engine, 'dp_0')==['dp_0']
+    assert not check_search_index(engine)
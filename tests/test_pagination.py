@@ -0,0 +1,94 @@
+'''
+Tests for the keyset pagination of the
+DataPoint and DataSource listings.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* sqlalchemy
+* pytest
+'''
+
+# Import system libs
+import pytest
+
+# Import custom libs
+from src import models
+from src.crud import Tdatapoint, Tdatasource
+from src.crud.pagination import keyset_page, encode_cursor
+
+#######################################
+
+DATASOURCES = [ ('ds_0',1), ('ds_1',None), ('ds_2',2), ('ds_3',None), ('ds_4',1), ('ds_5',None) ]
+'''`DATASOURCES` (list): Name and collector id of each datasource.'''
+
+DATAPOINTS = [ ('dp_0','ds_0',True), ('dp_1',None,None), ('dp_2','ds_2',False), ('dp_3',None,True),
+    ('dp_4','ds_0',None), ('dp_5','ds_1',False), ('dp_6',None,None) ]
+'''`DATAPOINTS` (list): Name, datasource name and active state of each datapoint.'''
+
+# --------------------
+@pytest.fixture
+def db(session):
+    ''' Session with the `DATASOURCES` and `DATAPOINTS`.\n
+    '''
+    for col_id in (1, 2):
+        session.add(models.Collector(id=col_id, name=f'col_{col_id}', ssh_user='test',
+            ssh_pass='test', prj_path='/gw'))
+    for name, col_id in DATASOURCES:
+        session.add(models.DataSource(name=name, collector_id=col_id))
+    for name, ds_name, active in DATAPOINTS:
+        session.add(models.DataModbus(name=name, datasource_name=ds_name, active=active,
+            func_code=4, address=0))
+    session.commit()
+    # The model default replaces an empty active state on insert
+    session.query(models.DataPoint).filter(models.DataPoint.name.in_(
+        [ name for name, _, active in DATAPOINTS if active is None ])).update({'active': None})
+    session.commit()
+
+    return(session)
+# --------------------
+
+# --------------------
+def _expected(items:list, desc:bool):
+    ''' Sort `(name, value)` pairs as the pages must come, empty values first.\n
+    '''
+    names = [ name for name, value in sorted(items, key=lambda item: (item[1] is not None, item[1] or 0, item[0])) ]
+    return(names[::-1] if desc else names)
+# --------------------
+
+# --------------------
+def _walk(dbq, sort_col, key_col, limit:int, desc:bool):
+    ''' Read every page of a query.\n
+    return `names` (list): The primary key of each row, in page order.\n
+    '''
+    names, after = [], None
+    while True:
+        rows, after = keyset_page(dbq, sort_col, key_col, after, limit, desc)
+        names.extend( getattr(row, key_col.key) for row in rows )
+        if (after is None):
+            return(names)
+# --------------------
+
+@pytest.mark.parametrize('desc', [False, True])
+@pytest.mark.parametrize('limit', [1, 2, 3, 10])
+def test_datasources_pages_over_empty_collector(db, limit, desc):
+    names = _walk(db.query(models.DataSource), Tdatasource.SORT_COLUMNS['collector'],
+        models.DataSource.name, limit, desc)
+
+    assert names==_expected(DATASOURCES, desc)
+    assert len(names)==Tdatasource.count_datasources(db)
+
+@pytest.mark.parametrize('desc', [False, True])
+@pytest.mark.parametrize('limit', [1, 2, 3, 10])
+@pytest.mark.parametrize('sort,index', [('datasource',1), ('active',2)])
+def test_datapoints_pages_over_empty_values(db, sort, index, limit, desc):
+    names = _walk(db.query(models.DataPoint), Tdatapoint.SORT_COLUMNS[sort],
+        models.DataPoint.name, limit, desc)
+
+    assert names==_expected([ (dp[0], dp[index]) for dp in DATAPOINTS ], desc)
+    assert len(names)==Tdatapoint.count_datapoints(db)
+
+def test_page_after_empty_value(db):
+    after = encode_cursor([None, 'ds_1'])
+    rows, _ = keyset_page(db.query(models.DataSource), models.DataSource.collector_id,
+        models.DataSource.name, after, 10)
+
+    assert [ row.name for row in rows ]==['ds_3', 'ds_5', 'ds_0', 'ds_4', 'ds_2']
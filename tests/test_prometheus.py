@@ -0,0 +1,117 @@
+'''
+Tests for the cached Prometheus configuration
+file and its background writes.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* fsspec
+* pyyaml
+* pytest
+'''
+
+# Import system libs
+import time
+import threading
+import contextlib
+import yaml
+import pytest
+
+# Import custom libs
+from src.env import Enviroment as Env
+from src.fboot_gen import prometheus
+
+#######################################
+
+class _GatedFS:
+    ''' Filesystem whose writes wait for `gate`, setting `entered` first.\n
+    '''
+    def __init__(self, fs, entered:threading.Event, gate:threading.Event):
+        self._fs = fs
+        self._entered = entered
+        self._gate = gate
+    def open(self, path, mode='rb', **kwargs):
+        if ('w' in mode):
+            self._entered.set()
+            self._gate.wait(5)
+        return(self._fs.open(path, mode, **kwargs))
+    def __getattr__(self, name):
+        return(getattr(self._fs, name))
+
+# --------------------
+@pytest.fixture
+def prom_file(tmp_path, monkeypatch):
+    ''' A new `PrometheusFile` on a local file, written without delay.\n
+    '''
+    monkeypatch.setattr(Env, 'PROMETHEUS_WRITE_DELAY', '0')
+    return(prometheus.PrometheusFile(str(tmp_path/'prometheus.yml'), {}))
+# --------------------
+
+# --------------------
+def _jobs(prom_file):
+    ''' Names of the scrape jobs in the written file.\n
+    '''
+    with open(prom_file.url, 'r', encoding="utf-8") as fid:
+        conf = yaml.safe_load(fid)
+    return([ job['job_name'] for job in conf['scrape_configs'] ])
+# --------------------
+
+def test_write_without_wait_returns_before_the_delay(prom_file, monkeypatch):
+    monkeypatch.setattr(Env, 'PROMETHEUS_WRITE_DELAY', '0.5')
+    prom_file.set_job(None, {'job_name': 'a'})
+
+    start = time.monotonic()
+    assert prom_file.write(wait=False) is None
+    assert time.monotonic()-start<0.5
+
+    prom_file.set_job(None, {'job_name': 'b'})
+    # Joins the same write
+    assert prom_file.write() is True
+    assert time.monotonic()-start>=0.5
+    assert _jobs(prom_file)[-2:]==['a', 'b']
+
+def test_changes_do_not_wait_for_the_upload(prom_file, monkeypatch):
+    entered, gate = threading.Event(), threading.Event()
+    open_filesystem = prometheus.open_filesystem
+    @contextlib.contextmanager
+    def _gated(url, **options):
+        with open_filesystem(url, **options) as (fs, path):
+            yield (_GatedFS(fs, entered, gate), path)
+    monkeypatch.setattr(prometheus, 'open_filesystem', _gated)
+
+    prom_file.set_job(None, {'job_name': 'a'})
+    prom_file.write(wait=False)
+    assert entered.wait(5)
+
+    start = time.monotonic()
+    prom_file.set_job(None, {'job_name': 'b'})
+    assert time.monotonic()-start<1
+    gate.set()
+
+    assert prom_file.write() is True
+    assert _jobs(prom_file)[-2:]==['a', 'b']
+
+def test_failed_write_is_raised_and_forgotten(prom_file, monkeypatch):
+    def _broken(url, **options):
+        raise OSError('unreachable')
+    monkeypatch.setattr(prometheus, 'open_filesystem', _broken)
+
+    prom_file.set_job(None, {'job_name': 'a'})
+    with pytest.raises(OSError):
+        prom_file.write()
+    assert prom_file.conf is None
+
+def test_failed_background_write_is_saved_on_next_write(prom_file, monkeypatch):
+    open_filesystem = prometheus.open_filesystem
+    def _broken(url, **options):
+        raise OSError('unreachable')
+    monkeypatch.setattr(prometheus, 'open_filesystem', _broken)
+    monkeypatch.setattr(Env, 'PROMETHEUS_WRITE_DELAY', '0.2')
+
+    prom_file.set_job(None, {'job_name': 'a'})
+    prom_file.write(wait=False)
+    pending = prom_file._pending
+    assert pending.done.wait(5) and pending.error is not None
+
+    monkeypatch.setattr(prometheus, 'open_filesystem', open_filesystem)
+    prom_file.set_job(None, {'job_name': 'b'})
+    assert prom_file.write() is True
+    assert _jobs(prom_file)[-2:]==['a', 'b']
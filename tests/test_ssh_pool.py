@@ -0,0 +1,154 @@
+'''
+Tests for the pool of SSH connections
+to the collectors.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* paramiko
+* sqlalchemy
+* pytest
+'''
+
+# Import system libs
+import pytest
+
+# Import custom libs
+from src import models
+from src import ssh_pool
+from src.env import Enviroment as Env
+from src.crud import collector as col_crud
+from src.crud import Tcollector
+from src.collector import schemas
+from utils.sftp_standin import SFTPStandIn
+
+#######################################
+
+class _Transport:
+    ''' Stand-in for the `Transport` of a `_Client`.\n
+    '''
+    def __init__(self):
+        self.active = True
+    def is_active(self):
+        return(self.active)
+
+class _Client:
+    ''' Stand-in for a connected `SSHClient`.\n
+    '''
+    def __init__(self, host:str):
+        self.host = host
+        self.transport = _Transport()
+    def get_transport(self):
+        return(self.transport)
+    def close(self):
+        self.transport.active = False
+
+# --------------------
+@pytest.fixture
+def pool(monkeypatch):
+    ''' A new pool whose connections are `_Client`, kept in `pool.connected`.\n
+    '''
+    pool = ssh_pool.SSHPool()
+    pool.connected = []
+    def _connect(host, port, username, password, timeout):
+        pool.connected.append(_Client(host))
+        return(pool.connected[-1])
+    monkeypatch.setattr(pool, '_connect', _connect)
+    monkeypatch.setattr(ssh_pool, 'pool', pool)
+    monkeypatch.setattr(col_crud, 'pool', pool)
+    return(pool)
+# --------------------
+
+def test_acquire_reuses_the_connection(pool):
+    first = pool.acquire('10.0.0.1', 22, 'user', 'pass')
+    second = pool.acquire('10.0.0.1', '22', 'user', 'pass')
+    assert first is second
+    assert len(pool.connected)==1
+
+    pool.release('10.0.0.1', 22, 'user', first)
+    pool.release('10.0.0.1', 22, 'user', second)
+    assert pool.acquire('10.0.0.1', 22, 'user', 'pass') is first
+    assert len(pool.connected)==1
+
+def test_password_change_replaces_the_connection(pool):
+    old = pool.acquire('10.0.0.1', 22, 'user', 'old')
+    new = pool.acquire('10.0.0.1', 22, 'user', 'new')
+    assert new is not old
+    assert old.get_transport().is_active()
+
+    pool.release('10.0.0.1', 22, 'user', old)
+    assert not old.get_transport().is_active()
+    assert new.get_transport().is_active()
+
+def test_eviction_closes_least_recently_used_idle(pool, monkeypatch):
+    monkeypatch.setattr(Env, 'SSH_POOL_SIZE', '2')
+    clients = {}
+    for host in ('10.0.0.1', '10.0.0.2', '10.0.0.3'):
+        clients[host] = pool.acquire(host, 22, 'user', 'pass')
+        pool.release(host, 22, 'user', clients[host])
+
+    assert not clients['10.0.0.1'].get_transport().is_active()
+    assert clients['10.0.0.2'].get_transport().is_active()
+    assert clients['10.0.0.3'].get_transport().is_active()
+
+def test_eviction_closes_expired_idle_only(pool, monkeypatch):
+    monkeypatch.setattr(Env, 'SSH_IDLE_TIMEOUT', '-1')
+    idle = pool.acquire('10.0.0.1', 22, 'user', 'pass')
+    pool.release('10.0.0.1', 22, 'user', idle)
+    busy = pool.acquire('10.0.0.2', 22, 'user', 'pass')
+    pool.acquire('10.0.0.3', 22, 'user', 'pass')
+
+    assert not idle.get_transport().is_active()
+    assert busy.get_transport().is_active()
+
+def test_invalidate_in_use_reconnects_on_next_acquire(pool):
+    old = pool.acquire('10.0.0.1', 22, 'user', 'pass')
+    pool.invalidate('10.0.0.1', 22, 'user')
+    assert old.get_transport().is_active()
+
+    new = pool.acquire('10.0.0.1', 22, 'user', 'pass')
+    assert new is not old
+    pool.release('10.0.0.1', 22, 'user', old)
+    assert not old.get_transport().is_active()
+    pool.release('10.0.0.1', 22, 'user', new)
+    assert new.get_transport().is_active()
+
+def test_collector_update_invalidates_its_connection(pool, session):
+    db = session
+    col = models.Collector(name='test', ip='10.0.0.1', ssh_port=22, ssh_user='user',
+        ssh_pass='pass', prj_path='/gw', opcua_port=4840, health_port=8080, valid=True,
+        update_period=1, timeout=2)
+    db.add(col)
+    db.commit()
+
+    client = pool.acquire('10.0.0.1', 22, 'user', 'pass')
+    pool.release('10.0.0.1', 22, 'user', client)
+    Tcollector.update(db, col.id, schemas.collectorUpdate(ip='10.0.0.2', name='test',
+        ssh_port=22, ssh_user='user', ssh_pass='', prj_path='/gw', opcua_port=4840,
+        health_port=8080, update_period=1, timeout=2))
+
+    assert not client.get_transport().is_active()
+    assert pool._entries=={}
+
+def test_open_filesystem_releases_on_exit(tmp_path, monkeypatch):
+    pool = ssh_pool.SSHPool()
+    monkeypatch.setattr(ssh_pool, 'pool', pool)
+    (tmp_path/'gw').mkdir()
+
+    with SFTPStandIn(str(tmp_path)) as server:
+        opts = {'host':'127.0.0.1', 'port':server.port, 'username':'user', 'password':'pass'}
+        with ssh_pool.open_filesystem('ssh:///gw/test.txt', **opts) as (fs, path):
+            with fs.open(path, 'wb') as fid:
+                fid.write(b'test')
+            entry = pool._entries[('127.0.0.1', server.port, 'user')]
+            assert entry.refs==1
+        # Released while the filesystem is still referenced
+        assert entry.refs==0 and entry.holders=={}
+        assert fs.client.get_transport().is_active()
+        fs.close()
+        assert entry.refs==0
+
+        with ssh_pool.open_filesystem('ssh:///gw/test.txt', **opts) as (other, path):
+            assert other.client is fs.client
+            assert other.cat_file(path)==b'test'
+        pool.close_all()
+
+    assert (tmp_path/'gw'/'test.txt').read_bytes()==b'test'
@@ -0,0 +1,98 @@
+'''
+This program compares the SQLite write
+throughput with the default connection settings
+and with the backend engine profile.\n
+Run it from the repository root with:
+`python -m utils.bench_db_profile [commits] [writers]`\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* sqlalchemy
+'''
+
+# Import system libs
+import os
+import sys
+import json
+import time
+import sqlite3
+import tempfile
+import threading
+
+# Import custom libs
+from src.database import SQLITE_PRAGMAS, set_sqlite_pragmas
+
+#######################################
+
+PROFILES = {
+    'default': {},
+    'backend': SQLITE_PRAGMAS,
+}
+
+# --------------------
+def _connect(path:str, pragmas:dict):
+    ''' Open a connection the same way the backend engine does.\n
+    `path` (str): Database file.\n
+    `pragmas` (dict): Pragmas to apply.\n
+    return `conn` (sqlite3.Connection): The connection.\n
+    '''
+    conn = sqlite3.connect(path, check_same_thread=False)
+    set_sqlite_pragmas(conn, pragmas)
+    return(conn)
+# --------------------
+
+# --------------------
+def run_profile(pragmas:dict, commits:int, writers:int):
+    ''' Insert one row per transaction, like `create_datapoint`, from
+    several concurrent writers.\n
+    `pragmas` (dict): Pragmas to apply on each connection.\n
+    `commits` (int): Transactions per writer.\n
+    `writers` (int): Number of concurrent writer threads.\n
+    return `result` (dict): Throughput and lock errors.\n
+    '''
+    folder = tempfile.mkdtemp()
+    path = os.path.join(folder, 'bench.db')
+    conn = _connect(path, pragmas)
+    conn.execute('CREATE TABLE datapoints (name VARCHAR PRIMARY KEY, description VARCHAR, address VARCHAR)')
+    conn.commit()
+    conn.close()
+
+    errors = []
+    def _writer(wid:int):
+        wconn = _connect(path, pragmas)
+        for i in range(commits):
+            try:
+                wconn.execute('INSERT INTO datapoints VALUES (?,?,?)', (f'w{wid}_{i}','bench','DB1.DBD0'))
+                wconn.commit()
+            except sqlite3.OperationalError as exc:
+                errors.append(str(exc))
+        wconn.close()
+
+    threads = [ threading.Thread(target=_writer, args=(w,)) for w in range(writers) ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    result = {
+        'commits': commits*writers,
+        'seconds': round(elapsed,3),
+        'commits_per_second': round(commits*writers/elapsed,1),
+        'lock_errors': len(errors),
+    }
+    return(result)
+# --------------------
+
+
+# Execute
+if __name__=='__main__':
+
+    commits = int(sys.argv[1]) if len(sys.argv)>1 else 500
+    writers = int(sys.argv[2]) if len(sys.argv)>2 else 4
+
+    report = {}
+    for name, pragmas in PROFILES.items():
+        report[name] = run_profile(pragmas, commits, writers)
+
+    print(json.dumps(report, indent=2))
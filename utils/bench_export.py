@@ -0,0 +1,217 @@
+'''
+This program measures each stage of a collector
+export over synthetic gateways with Siemens, Rockwell
+and Modbus datapoints, uploading to a local SFTP
+stand-in. The result is printed as JSON, so runs of
+different releases can be compared.\n
+Run it from the repository root with:
+`python -m utils.bench_export [sizes] [repeat] [output]`\n
+`sizes` is a comma separated list of datapoints per
+collector, default `1000,10000,100000`.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* sqlalchemy
+* pyfboot
+* paramiko
+* fsspec
+'''
+
+# Import system libs
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import posixpath
+import statistics
+import tempfile
+from datetime import datetime
+
+# The benchmark fills its own database, so it is set before the backend
+# reads its configuration
+BENCH_FOLDER = tempfile.mkdtemp(prefix='bench_export_')
+os.environ['CONF_DATABASE_URL'] = 'sqlite:///'+os.path.join(BENCH_FOLDER, 'bench.db')
+
+import fsspec
+
+# Import custom libs
+from src import AppInfo
+from src import models
+from src import migrations
+from src.env import Enviroment as Env
+from src.database import SessionManager, engine
+from src.crud import Tdatasource
+from src.ssh_pool import pool
+from src.fboot_gen import builder
+from src.fboot_gen.deploy import Deployment
+from utils.sftp_standin import SFTPStandIn
+
+#######################################
+
+DATAPOINTS_PER_SOURCE = 500
+'''`DATAPOINTS_PER_SOURCE` (int): Datapoints of each synthetic datasource.'''
+
+PROTOCOLS = {
+    'Siemens': (models.ProtSiemens, {'rack':0, 'slot':1, 'plc':'S7-300'},
+        models.DataSiemens, lambda i: {'address':f'DB1.DBD{4*i}'}),
+    'Rockwell': (models.ProtRockwell, {'path':'1,0', 'slot':0, 'connection':'Ethernet'},
+        models.DataRockwell, lambda i: {'tag_name':f'Tag[{i}]'}),
+    'Modbus': (models.ProtModbus, {'slave_id':1},
+        models.DataModbus, lambda i: {'func_code':4, 'address':2*i}),
+}
+'''`PROTOCOLS` (dict): Protocol model, its data, datapoint model and access data by index.'''
+
+# --------------------
+def populate(db, size:int):
+    ''' Create a collector with `size` confirmed datapoints, spread over
+    datasources of each protocol in turn.\n
+    `db` (Session): Database session instance.\n
+    `size` (int): Number of datapoints.\n
+    return `col_id` (int): The collector id.\n
+    '''
+    col = models.Collector(name=f'bench_{size}', ip='127.0.0.1', ssh_port=22, ssh_user='bench',
+        ssh_pass='bench', prj_path='/gw', opcua_port=4840, health_port=8080, valid=True,
+        update_period=1, timeout=2)
+    db.add(col)
+    db.commit()
+
+    objects = []
+    prot_names = list(PROTOCOLS)
+    for first in range(0, size, DATAPOINTS_PER_SOURCE):
+        n_src = first//DATAPOINTS_PER_SOURCE
+        prot_name = prot_names[n_src%len(prot_names)]
+        prot_cls, prot_data, dp_cls, dp_access = PROTOCOLS[prot_name]
+        ds_name = f'{col.name}_ds{n_src}'
+
+        objects.append(models.DataSource(name=ds_name, plc_ip='10.0.0.1', plc_port=102,
+            cycletime=1000, timeout=1000, active=True, pending=False, collector_id=col.id))
+        objects.append(prot_cls(datasource_name=ds_name, **prot_data))
+        for i in range(first, min(first+DATAPOINTS_PER_SOURCE, size)):
+            objects.append(dp_cls(name=f'{col.name}_dp{i}', description=f'Synthetic {prot_name} {i}',
+                num_type='REAL', active=True, pending=False, upload=False,
+                datasource_name=ds_name, **dp_access(i)))
+
+    db.bulk_save_objects(objects)
+    db.commit()
+
+    return(col.id)
+# --------------------
+
+# --------------------
+def _timed(func, *args):
+    ''' Run a function measuring its duration.\n
+    return `result`: The function result.\n
+    return `seconds` (float): The duration.\n
+    '''
+    start = time.perf_counter()
+    result = func(*args)
+    return(result, time.perf_counter()-start)
+# --------------------
+
+# --------------------
+def _upload(port:int, fboot:bytes, opcua:bytes):
+    ''' Deploy the gateway files to the stand-in the same way an export does.\n
+    `port` (int): The stand-in SFTP port.\n
+    `fboot` (bytes): The fboot file.\n
+    `opcua` (bytes): The OPC-UA exporter configuration.\n
+    '''
+    fs = fsspec.filesystem('ssh', host='127.0.0.1', port=port, username='bench', password='bench')
+    with Deployment(fs) as deployment:
+        deployment.stage(posixpath.join('/gw', Env.GATEWAY_FBOOT_LOCATION), fboot)
+        deployment.stage(posixpath.join('/gw', Env.EXPORTER_CONFIG_LOCATION), opcua)
+        deployment.commit()
+# --------------------
+
+# --------------------
+def run_size(col_id:int, port:int, repeat:int):
+    ''' Run the export stages of a collector `repeat` times.\n
+    `col_id` (int): The collector id.\n
+    `port` (int): The stand-in SFTP port.\n
+    `repeat` (int): Runs of each stage.\n
+    return `result` (dict): Minimum and median seconds of each stage and the file sizes.\n
+    '''
+    fboot_name = os.path.basename(Env.GATEWAY_FBOOT_LOCATION)
+    samples = {}
+    def _add(stage:str, seconds:float):
+        samples.setdefault(stage, []).append(seconds)
+
+    for _ in range(repeat):
+        with SessionManager() as db:
+            export_list, seconds = _timed(Tdatasource.get_export_datapoints, db, col_id)
+        _add('db_fetch', seconds)
+
+        export_data, seconds = _timed(lambda: [ (ds.dict(), [ dp.dict() for dp in dp_list ])
+            for ds, dp_list in export_list ])
+        _add('serialize', seconds)
+
+        prj_4diac, seconds = _timed(builder.build_project, 1000, export_data)
+        _add('comm_blocks', seconds)
+
+        fboot, seconds = _timed(builder.render_fboot, prj_4diac, fboot_name)
+        _add('fboot', seconds)
+
+        opcua, seconds = _timed(builder.render_opcua, export_data)
+        _add('yaml', seconds)
+
+        _, seconds = _timed(_upload, port, fboot, opcua)
+        _add('upload', seconds)
+
+    result = {
+        'datapoints': sum(len(dp_list) for _, dp_list in export_list),
+        'datasources': len(export_list),
+        'bytes': {'fboot': len(fboot), 'opcua': len(opcua)},
+        'stages': { stage: {'min': round(min(values),4), 'median': round(statistics.median(values),4)}
+            for stage, values in samples.items() },
+    }
+    return(result)
+# --------------------
+
+# --------------------
+def main(sizes:list, repeat:int):
+    ''' Create the synthetic collectors and measure their exports.\n
+    `sizes` (list): Datapoints of each collector.\n
+    `repeat` (int): Runs of each stage.\n
+    return `report` (dict): The benchmark environment and results.\n
+    '''
+    migrations.run_migrations(engine)
+
+    report = {
+        'version': AppInfo.version,
+        'date': datetime.utcnow().isoformat(timespec='seconds')+'Z',
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'results': [],
+    }
+
+    with SFTPStandIn(os.path.join(BENCH_FOLDER, 'sftp')) as standin:
+        os.makedirs(standin.root, exist_ok=True)
+        for size in sizes:
+            with SessionManager() as db:
+                col_id, seconds = _timed(populate, db, size)
+            result = run_size(col_id, standin.port, repeat)
+            result['populate_seconds'] = round(seconds,3)
+            report['results'].append(result)
+        pool.close_all()
+
+    engine.dispose()
+    shutil.rmtree(BENCH_FOLDER, ignore_errors=True)
+    return(report)
+# --------------------
+
+
+# Execute
+if __name__=='__main__':
+
+    sizes = [ int(s) for s in sys.argv[1].split(',') ] if len(sys.argv)>1 else [1000, 10000, 100000]
+    repeat = int(sys.argv[2]) if len(sys.argv)>2 else 3
+    output = sys.argv[3] if len(sys.argv)>3 else None
+
+    report = main(sizes, repeat)
+
+    text = json.dumps(report, indent=2)
+    if (output is not None):
+        with open(output, 'w') as fid:
+            fid.write(text)
+    print(text)
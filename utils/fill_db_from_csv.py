@@ -40,12 +40,13 @@ def db_set(data:dict, backend_url:str):
             print(response.json())
             raise RuntimeError(f'Could not create DataSource "{ds["name"]}".')
 
-        # Get all DataPoints in this DataSource
-        for dp in dplist:
-            # A POST request to the API
-            response = requests.post(backend_url+'/datapoint',json=dp,headers=headers)
-            if (response.status_code!=200):
-                raise RuntimeError(f'Could not create DataPoint"{dp["name"]}".')
+        # Create all DataPoints in this DataSource at once
+        response = requests.post(backend_url+'/datapoints/bulk',json=dplist,headers=headers)
+        if (response.status_code!=200):
+            raise RuntimeError(f'Could not create DataPoints of "{ds["name"]}".')
+        for status in response.json():
+            if (status['status']=='error'):
+                raise RuntimeError(f'Could not create DataPoint"{status["name"]}": {status["detail"]}')
                 
     return()
 # --------------------
@@ -0,0 +1,191 @@
+'''
+This module runs a local SFTP server over
+a temporary folder, to stand in for a collector
+on benchmarks.\n
+Copyright (c) 2017 Aimirim STI.\n
+## Dependencies are:
+* paramiko
+'''
+
+# Import system libs
+import os
+import socket
+import threading
+import paramiko
+
+#######################################
+
+class _Server(paramiko.ServerInterface):
+    ''' Accept any password and session channels.\n
+    '''
+
+    def get_allowed_auths(self, username):
+        return('password')
+
+    def check_auth_password(self, username, password):
+        return(paramiko.AUTH_SUCCESSFUL)
+
+    def check_channel_request(self, kind, chanid):
+        if (kind=='session'):
+            return(paramiko.OPEN_SUCCEEDED)
+        return(paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED_FAILED)
+
+class _Handle(paramiko.SFTPHandle):
+    ''' An open file.\n
+    '''
+
+    def stat(self):
+        try:
+            return(paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno())))
+        except OSError as exc:
+            return(paramiko.SFTPServer.convert_errno(exc.errno))
+
+    def chattr(self, attr):
+        return(paramiko.SFTP_OK)
+
+class _Folder(paramiko.SFTPServerInterface):
+    ''' SFTP operations on the stand-in folder. The remote `/` is the folder.\n
+    '''
+    root = None
+
+    # --------------------
+    def _path(self, path:str):
+        return(os.path.join(self.root, self.canonicalize(path).lstrip('/')))
+    # --------------------
+
+    # --------------------
+    def _call(self, func, *args):
+        ''' Run a filesystem call and convert its error to a SFTP code.\n
+        '''
+        try:
+            func(*args)
+        except OSError as exc:
+            return(paramiko.SFTPServer.convert_errno(exc.errno))
+        return(paramiko.SFTP_OK)
+    # --------------------
+
+    def list_folder(self, path):
+        try:
+            folder = self._path(path)
+            return([ paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(folder, name)), name)
+                for name in os.listdir(folder) ])
+        except OSError as exc:
+            return(paramiko.SFTPServer.convert_errno(exc.errno))
+
+    def stat(self, path):
+        try:
+            return(paramiko.SFTPAttributes.from_stat(os.stat(self._path(path))))
+        except OSError as exc:
+            return(paramiko.SFTPServer.convert_errno(exc.errno))
+
+    def lstat(self, path):
+        try:
+            return(paramiko.SFTPAttributes.from_stat(os.lstat(self._path(path))))
+        except OSError as exc:
+            return(paramiko.SFTPServer.convert_errno(exc.errno))
+
+    def open(self, path, flags, attr):
+        path = self._path(path)
+        try:
+            fd = os.open(path, flags | getattr(os, 'O_BINARY', 0), 0o644)
+        except OSError as exc:
+            return(paramiko.SFTPServer.convert_errno(exc.errno))
+
+        if (flags & os.O_WRONLY):
+            mode = 'ab' if (flags & os.O_APPEND) else 'wb'
+        elif (flags & os.O_RDWR):
+            mode = 'a+b' if (flags & os.O_APPEND) else 'r+b'
+        else:
+            mode = 'rb'
+        fobj = os.fdopen(fd, mode)
+
+        handle = _Handle(flags)
+        handle.filename = path
+        handle.readfile = fobj
+        handle.writefile = fobj
+        return(handle)
+
+    def remove(self, path):
+        return(self._call(os.remove, self._path(path)))
+
+    def rename(self, oldpath, newpath):
+        return(self._call(os.rename, self._path(oldpath), self._path(newpath)))
+
+    def posix_rename(self, oldpath, newpath):
+        return(self._call(os.replace, self._path(oldpath), self._path(newpath)))
+
+    def mkdir(self, path, attr):
+        return(self._call(os.mkdir, self._path(path)))
+
+    def rmdir(self, path):
+        return(self._call(os.rmdir, self._path(path)))
+
+    def chattr(self, path, attr):
+        return(paramiko.SFTP_OK)
+
+class SFTPStandIn:
+    ''' SFTP server on `127.0.0.1` serving `root`, accepting any user and
+    password. Use it as a context manager.\n
+    '''
+
+    def __init__(self, root:str):
+        self.root = root
+        '''`root` (str): The served folder.'''
+        self.port = None
+        '''`port` (int): The listening port, set on `start`.'''
+        self._host_key = paramiko.RSAKey.generate(2048)
+        self._sock = None
+        self._transports = []
+        self._thread = None
+
+    # --------------------
+    def __enter__(self):
+        self.start()
+        return(self)
+
+    def __exit__(self, *exc):
+        self.stop()
+    # --------------------
+
+    # --------------------
+    def start(self):
+        ''' Listen on a free port and serve the connections in background.\n
+        '''
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(('127.0.0.1', 0))
+        self._sock.listen(8)
+        self.port = self._sock.getsockname()[1]
+
+        self._thread = threading.Thread(target=self._accept, daemon=True)
+        self._thread.start()
+    # --------------------
+
+    # --------------------
+    def _accept(self):
+        ''' Start a SSH transport with the SFTP subsystem for each connection.\n
+        '''
+        folder = type('Folder', (_Folder,), {'root': self.root})
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                break
+            transport = paramiko.Transport(conn)
+            transport.add_server_key(self._host_key)
+            transport.set_subsystem_handler('sftp', paramiko.SFTPServer, folder)
+            transport.start_server(server=_Server())
+            self._transports.append(transport)
+    # --------------------
+
+    # --------------------
+    def stop(self):
+        ''' Stop listening and close the connections.\n
+        '''
+        if (self._sock is not None):
+            self._sock.close()
+            self._sock = None
+        for transport in self._transports:
+            transport.close()
+        self._transports = []
+    # --------------------